@@ -271,8 +271,10 @@ from datetime import datetime
 from typing import Optional
 
 # Fix: import from modules.predictor (not predicator)
-from modules.predicator import predict_tire_degradation, recommend_pit_stop, compare_strategies
+from config import PROMPT_MODE
+from modules.predicator import predict_tire_degradation, stream_tire_degradation, recommend_pit_stop, compare_strategies
 from modules.visualizer import create_degradation_chart
+from modules.catalog import load_catalog, list_races, find_race, race_file
 
 # ---------------------------------------------------------------------
 # Page config: wide layout
@@ -429,33 +431,36 @@ st.markdown("---")
 # ---------------------------------------------------------------------
 with st.sidebar:
     st.markdown('<div class="card"><h3 style="margin-bottom:6px;">⚙️ Race Settings</h3></div>', unsafe_allow_html=True)
+    race_catalog = load_catalog()
     track = st.selectbox(
         "Select Track",
-        options=["Bahrain GP 2024", "Monaco GP 2024", "British GP 2024 (Silverstone)"],
+        options=list_races(race_catalog),
         index=0
     )
 
-    # map track -> csv
-    track_map = {
-        "Bahrain GP 2024": "data/bahrain_2024_hamilton.csv",
-        "Monaco GP 2024": "data/monaco_2024_hamilton.csv",
-        "British GP 2024 (Silverstone)": "data/silverstone_2024_hamilton.csv",
-    }
-    csv_file = track_map.get(track)
-
-    current_lap = st.slider("Select Current Lap", min_value=1, max_value=57, value=15)
+    # track -> catalog entry (csv file, laps, circuit details)
+    race = find_race(track, race_catalog) if track else None
+    if race is None:
+        st.error("❌ No races found. Run download_all_data.py to fill the FastF1 cache and data/ first.")
+        st.stop()
+    csv_file = race_file(track, catalog=race_catalog)
+
+    total_laps = race["total_laps"] or 57
+    current_lap = st.slider("Select Current Lap", min_value=1, max_value=total_laps, value=min(15, total_laps))
+    engine_label = st.radio("Prediction Engine", ["Gemini AI", "Local model (instant)"], index=0)
+    engine = "local" if engine_label.startswith("Local") else "gemini"
+    bypass_cache = st.checkbox("🔄 Fresh Gemini answer (skip response cache)", disabled=engine == "local")
+    compact_prompt = st.checkbox("✂️ Compact Gemini prompt (fewer tokens)", value=PROMPT_MODE == "compact",
+                                 disabled=engine == "local")
+    prompt_mode = "compact" if compact_prompt else "verbose"
     show_strategy = st.checkbox("📊 Show strategy comparison")
 
     st.markdown("---")
 
-    # Track info card (static details can be customized per track)
-    # For demo, some values are hard-coded; replace with real values if available
-    if track == "Bahrain GP 2024":
-        flag = "🇧🇭"; total_laps = 57; length_km = 5.412; tyre_wear = "High"
-    elif track == "Monaco GP 2024":
-        flag = "🇲🇨"; total_laps = 78; length_km = 3.337; tyre_wear = "Low"
-    else:
-        flag = "🏁"; total_laps = 52; length_km = 5.891; tyre_wear = "Medium"
+    # Track info card (laps from the cached session, circuit details from the catalog)
+    flag = race["flag"]
+    length_km = race["length_km"] if race["length_km"] is not None else "—"
+    tyre_wear = race["tyre_wear"]
 
     st.markdown(f"""
         <div class="card">
@@ -508,7 +513,24 @@ progress.progress(20)
 
 try:
     # call core prediction function (keeps your existing logic)
-    result = predict_tire_degradation(track, current_lap=current_lap, target_laps=15)
+    if engine == "gemini":
+        # Stream Gemini's answer: show laps and a provisional pit lap as they arrive
+        status_text.info("Getting AI prediction... (20%)")
+        for event in stream_tire_degradation(track, current_lap=current_lap, target_laps=15,
+                                             bypass_cache=bypass_cache, prompt_mode=prompt_mode):
+            if event["type"] == "done":
+                result = {k: v for k, v in event.items() if k != "type"}
+                break
+            partial = event["predictions"]
+            provisional = recommend_pit_stop(partial, threshold=2.0).get("recommended_lap")
+            progress.progress(min(40, 20 + len(partial)))
+            status_text.info(
+                f"Received {len(partial)}/15 laps (lap {partial[-1]['lap']}: "
+                f"{partial[-1]['predicted_time']:.3f}s) — provisional pit lap: {provisional or '—'}"
+            )
+    else:
+        result = predict_tire_degradation(track, current_lap=current_lap, target_laps=15, engine=engine,
+                                          bypass_cache=bypass_cache)
     progress.progress(40)
     status_text.info("Analyzing patterns... (40%)")
 
@@ -621,6 +643,12 @@ try:
         # AI reasoning expanded area
         st.subheader("🧠 AI Analysis Summary")
         st.write(reasoning)
+        timings = result.get("timings") or {}
+        if timings:
+            st.caption("⏱️ " + " · ".join(f"{stage} {ms:.1f} ms" for stage, ms in timings.items()))
+        tokens = result.get("tokens")
+        if tokens:
+            st.caption(f"🔢 ~{tokens['prompt']} prompt tokens · ~{tokens['response']} response tokens")
 
         st.markdown("---")
 
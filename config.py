@@ -15,3 +15,49 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 # Optional: helper check
 if not API_KEY:
     print("[WARN] GEMINI_API_KEY not found in environment. Please set it in your .env file.")
+
+# Shared FastF1 cache used by every downloader and reader.
+# Point F1_CACHE_DIR at a common location to share one cache between checkouts.
+CACHE_DIR = os.getenv("F1_CACHE_DIR", "cache")
+
+# Byte budget of the shared cache; least recently used sessions are evicted beyond it
+CACHE_MAX_BYTES = int(os.getenv("F1_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Byte budget of the in-process cache of parsed race CSVs (shared by all app sessions)
+RACE_CACHE_MAX_BYTES = int(os.getenv("F1_RACE_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+# On-disk cache of Gemini responses (SQLite): location, time to live and byte budget
+RESPONSE_CACHE_PATH = os.getenv("F1_RESPONSE_CACHE_PATH", "data/gemini_cache.sqlite")
+RESPONSE_CACHE_TTL = int(os.getenv("F1_RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("F1_RESPONSE_CACHE_MAX_BYTES", str(50 * 1024 ** 2)))
+
+# Gemini client: per-request deadline (s), retries on transient errors, backoff base (s), concurrent requests
+GEMINI_TIMEOUT = float(os.getenv("F1_GEMINI_TIMEOUT", "60"))
+GEMINI_MAX_RETRIES = int(os.getenv("F1_GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE = float(os.getenv("F1_GEMINI_BACKOFF_BASE", "1.0"))
+GEMINI_CONCURRENCY = int(os.getenv("F1_GEMINI_CONCURRENCY", "8"))
+
+# Gemini quotas enforced by the process-wide scheduler (requests / tokens per minute)
+GEMINI_RPM = int(os.getenv("F1_GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.getenv("F1_GEMINI_TPM", "1000000"))
+
+# Model provider behind the Gemini client: "gemini" (the API) or "standin" (offline, see standin_gemini.py)
+GEMINI_PROVIDER = os.getenv("F1_GEMINI_PROVIDER", "gemini")
+STANDIN_LATENCY_MS = float(os.getenv("F1_STANDIN_LATENCY_MS", "800"))
+STANDIN_LATENCY_SIGMA = float(os.getenv("F1_STANDIN_LATENCY_SIGMA", "0.5"))
+STANDIN_ERROR_RATE = float(os.getenv("F1_STANDIN_ERROR_RATE", "0.0"))
+STANDIN_REASONING_CHARS = int(os.getenv("F1_STANDIN_REASONING_CHARS", "400"))
+STANDIN_SEED = int(os.getenv("F1_STANDIN_SEED", "0"))
+
+# Record / replay of Gemini traffic (providers "record" and "replay", see cassette.py)
+CASSETTE_PATH = os.getenv("F1_GEMINI_CASSETTE", "data/gemini.cassette.gz")
+CASSETTE_SOURCE = os.getenv("F1_CASSETTE_SOURCE", "gemini")
+CASSETTE_LATENCY = os.getenv("F1_CASSETTE_LATENCY", "recorded")
+
+# Prediction prompt format: "verbose" (prose + lap lines) or "compact" (dense lap table,
+# stint statistics, array output), and the token budget a compact prompt is truncated to
+PROMPT_MODE = os.getenv("F1_PROMPT_MODE", "verbose")
+PROMPT_TOKEN_BUDGET = int(os.getenv("F1_PROMPT_TOKEN_BUDGET", "300"))
+
+# Token budget of one batched multi-driver Gemini request (prompt + expected answer)
+BATCH_TOKEN_BUDGET = int(os.getenv("F1_BATCH_TOKEN_BUDGET", "8000"))
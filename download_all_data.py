@@ -1,21 +1,73 @@
 # download_all_data.py
+import argparse
 import fastf1
 import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import CACHE_DIR
+from modules import lap_store, manifest
+from modules.weather import merge_weather
+from modules.shared_cache import default_cache
 
-def download_race_data(year: int, grand_prix: str, driver_code: str, output_path: str):
+# Only request the feeds we keep (laps + weather); skip telemetry and race control messages
+LEAN_LOAD = dict(laps=True, telemetry=False, weather=True, messages=False)
+
+# Columns of the per-driver CSV files
+CSV_COLUMNS = ['lap_number', 'lap_time', 'tire_compound', 'tire_age']
+
+# (FastF1 event name, file prefix) for every race we ship data for
+RACES = [
+    ("Bahrain", "bahrain"),
+    ("Monaco", "monaco"),
+    ("Silverstone", "silverstone"),
+]
+
+# Official event name -> file prefix for the races above
+EXISTING_PREFIXES = {
+    "Bahrain Grand Prix": "bahrain",
+    "Monaco Grand Prix": "monaco",
+    "British Grand Prix": "silverstone",
+}
+
+
+def _clean_laps(laps):
+    """
+    Build the clean lap DataFrame (lap number, lap time, tire compound, tire age,
+    plus the lap end time in seconds of session time) from a FastF1 Laps object.
+    Works for a single driver or the whole grid.
+    """
+    df = pd.DataFrame({
+        'driver': laps['Driver'],
+        'time': laps['Time'].dt.total_seconds(),
+        'lap_number': laps['LapNumber'],
+        'lap_time': laps['LapTime'].dt.total_seconds(),
+        'tire_compound': laps['Compound'],
+        'tire_age': laps['TyreLife'],
+    })
+
+    # Drop invalid/missing values
+    df = df.dropna(subset=['lap_time'])
+    df = df[(df['lap_time'] > 50) & (df['lap_time'] < 200)]
+    return df
+
+
+def download_race_data(year: int, grand_prix: str, driver_code: str, file_prefix: str,
+                       output_dir: str = "data"):
     """
     Download F1 race lap data for a specific Grand Prix and driver.
-    Saves data to CSV file with lap number, lap time, tire compound, and tire age.
+    Saves data to CSV file with lap number, lap time, tire compound, and tire age,
+    named like the full-grid files (``<output_dir>/<file_prefix>_<year>_<lastname>.csv``).
     """
     try:
         # Enable FastF1 caching
-        fastf1.Cache.enable_cache('data/cache')
+        fastf1.Cache.enable_cache(CACHE_DIR)
 
         # Load session (R = Race)
         print(f"\n🏁 Loading {grand_prix} {year} Race...")
         session = fastf1.get_session(year, grand_prix, 'R')
-        session.load()
+        default_cache().unshare(session_cache_dir(session))
+        session.load(**LEAN_LOAD)
+        default_cache().sync()
 
         # Filter laps for the specific driver
         driver_laps = session.laps.pick_driver(driver_code)
@@ -24,19 +76,11 @@ def download_race_data(year: int, grand_prix: str, driver_code: str, output_path
             raise ValueError(f"No lap data found for driver {driver_code} in {grand_prix}")
 
         # Create clean DataFrame
-        df = pd.DataFrame({
-            'lap_number': driver_laps['LapNumber'],
-            'lap_time': driver_laps['LapTime'].dt.total_seconds(),
-            'tire_compound': driver_laps['Compound'],
-            'tire_age': driver_laps['TyreLife'],
-        })
-
-        # Drop invalid/missing values
-        df = df.dropna(subset=['lap_time'])
-        df = df[(df['lap_time'] > 50) & (df['lap_time'] < 200)]
+        df = _clean_laps(driver_laps)[CSV_COLUMNS]
+        output_path = os.path.join(output_dir, f"{file_prefix}_{year}_{driver_key(driver_keys(session), driver_code)}.csv")
 
         # Save to CSV
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
         df.to_csv(output_path, index=False)
 
         print(f"✅ Saved {len(df)} laps for {driver_code} ({grand_prix} {year}) → {output_path}")
@@ -45,15 +89,184 @@ def download_race_data(year: int, grand_prix: str, driver_code: str, output_path
     except Exception as e:
         print(f"❌ Failed to download {grand_prix}: {e}")
 
+
+def driver_keys(session):
+    """
+    Driver keys used in file names, built once per session: driver code ->
+    lower-case last name with spaces as underscores (e.g. "HAM" -> "hamilton",
+    "DEV" -> "de_vries"). Look codes up with driver_key.
+    """
+    last_names = session.results.set_index('Abbreviation')['LastName'].str.lower().str.replace(' ', '_')
+    return last_names.to_dict()
+
+
+def driver_key(keys, driver_code):
+    """Key of one driver from driver_keys(session); the lower-case code if unknown."""
+    return keys.get(driver_code, driver_code.lower())
+
+
+def session_cache_dir(session):
+    """
+    FastF1 cache directory of a session, e.g.
+    cache/2024/2024-03-02_Bahrain_Grand_Prix/2024-03-02_Race
+    """
+    # api_path looks like /static/2024/<event>/<session>/
+    parts = session.api_path.strip('/').split('/')[1:]
+    return os.path.join(CACHE_DIR, *parts)
+
+
+def download_race_grid(year: int, grand_prix: str, file_prefix: str, output_dir: str = "data",
+                       known=None):
+    """
+    Download lap data for every driver of a Grand Prix with a single session load.
+
+    The session is loaded once (laps only) and ``session.laps`` is split per driver
+    with one groupby, instead of reloading the full session for each driver.
+    Files are written as ``<output_dir>/<file_prefix>_<year>_<lastname>.csv``
+    (e.g. ``data/bahrain_2024_hamilton.csv``) and into the partitioned lap store.
+
+    If ``known`` (the download manifest) shows the session was already ingested
+    from the same cache content, nothing is loaded or written.
+
+    Args:
+        year (int): Season year
+        grand_prix (str): FastF1 event name (e.g. "Bahrain")
+        file_prefix (str): Prefix for the output file names (e.g. "bahrain")
+        output_dir (str): Directory the CSV files are written to
+        known (dict): Download manifest used to skip up-to-date sessions
+
+    Returns:
+        dict: {
+            "skipped": bool,
+            "source_hash": str | None,
+            "partitions": [{"driver": str, "code": str, "path": str, "rows": int}, ...]
+        }
+    """
+    # Each worker process needs its own cache handle
+    fastf1.Cache.enable_cache(CACHE_DIR)
+
+    session = fastf1.get_session(year, grand_prix, 'R')
+    cache_dir = session_cache_dir(session)
+
+    source_hash = manifest.source_cache_hash(cache_dir)
+    if known and manifest.is_up_to_date(known, year, file_prefix, 'R', source_hash):
+        entries = manifest.session_entries(known, year, file_prefix, 'R')
+        if all(os.path.isdir(lap_store.partition_path(year, file_prefix, e["driver"])) for e in entries):
+            print(f"⏭️  {grand_prix} {year} is up to date, skipping")
+            return {"skipped": True, "source_hash": source_hash, "partitions": []}
+
+    print(f"\n🏁 Loading {grand_prix} {year} Race (full grid, laps + weather)...")
+    # FastF1 rewrites cache files in place; give this session private copies first
+    default_cache().unshare(cache_dir)
+    session.load(**LEAN_LOAD)
+
+    df = _clean_laps(session.laps)
+    if df.empty:
+        raise ValueError(f"No lap data found in {grand_prix} {year}")
+
+    # Weather at the end of every lap, joined once for the whole grid and
+    # persisted in the lap store so predictions don't redo the join
+    df = merge_weather(df, session.weather_data)
+
+    os.makedirs(output_dir, exist_ok=True)
+    partitions = []
+    # Last names, so file names match the existing ones (one lookup table per session)
+    keys = driver_keys(session)
+    for driver_code, driver_df in df.groupby('driver', sort=False):
+        name = driver_key(keys, driver_code)
+        output_path = os.path.join(output_dir, f"{file_prefix}_{year}_{name}.csv")
+        driver_df[CSV_COLUMNS].to_csv(output_path, index=False)
+        lap_store.write_laps(driver_df, season=year, event=file_prefix, driver=name)
+        partitions.append({"driver": name, "code": driver_code, "path": output_path, "rows": len(driver_df)})
+
+    print(f"✅ Saved {len(df)} laps for {len(partitions)} drivers ({grand_prix} {year}) → {output_dir}")
+    return {
+        "skipped": False,
+        # Hash after loading, since the load may have filled the cache
+        "source_hash": manifest.source_cache_hash(cache_dir),
+        "partitions": partitions,
+    }
+
+
+def season_rounds(year: int):
+    """
+    (FastF1 event name, file prefix) pairs for every round of a season that has
+    already taken place. Races we already ship keep their existing file prefix.
+    """
+    fastf1.Cache.enable_cache(CACHE_DIR)
+    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    schedule = schedule[schedule['EventDate'] <= pd.Timestamp.now()]
+
+    rounds = []
+    for name in schedule['EventName']:
+        prefix = EXISTING_PREFIXES.get(name) or name.replace(' Grand Prix', '').lower().replace(' ', '_')
+        rounds.append((name, prefix))
+    return rounds
+
+
+def download_season_grid(year: int, races=RACES, output_dir: str = "data", workers: int = None):
+    """
+    Download the full grid for several races in parallel across a process pool.
+
+    Sessions already ingested from the same cache content (per the download
+    manifest) are skipped; the manifest is updated once all workers finish.
+
+    Args:
+        year (int): Season year
+        races (list): (FastF1 event name, file prefix) pairs
+        output_dir (str): Directory the CSV files are written to
+        workers (int): Number of worker processes (default: one per CPU)
+
+    Returns:
+        dict: {grand_prix: result of download_race_grid} for every race that succeeded
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    known = manifest.load_manifest()
+    prefixes = dict(races)
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(download_race_grid, year, gp_name, prefix, output_dir, known): gp_name
+            for gp_name, prefix in races
+        }
+        for future in as_completed(futures):
+            gp_name = futures[future]
+            try:
+                results[gp_name] = future.result()
+            except Exception as e:
+                print(f"❌ Failed to download {gp_name}: {e}")
+
+    # Only the parent process writes the manifest
+    for gp_name, result in results.items():
+        for part in result["partitions"]:
+            manifest.record_partition(
+                known, year, prefixes[gp_name], 'R', part["driver"], result["source_hash"], part["rows"]
+            )
+    manifest.save_manifest(known)
+
+    # Deduplicate what the workers fetched and keep the cache within its budget
+    default_cache().sync()
+
+    return results
+
+
 def main():
-    races = [
-        ("Bahrain", "data/bahrain_2024_hamilton.csv"),
-        ("Monaco", "data/monaco_2024_hamilton.csv"),
-        ("Silverstone", "data/silverstone_2024_hamilton.csv"),
-    ]
-
-    for gp_name, file_path in races:
-        download_race_data(2024, gp_name, "HAM", file_path)
+    parser = argparse.ArgumentParser(description="Download F1 race lap data with FastF1.")
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--driver", help="Only download this driver (e.g. HAM) instead of the full grid")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for full-grid mode")
+    parser.add_argument("--all-rounds", action="store_true",
+                        help="Ingest every completed round of the season (new rounds only)")
+    args = parser.parse_args()
+
+    if args.driver:
+        for gp_name, prefix in RACES:
+            download_race_data(args.year, gp_name, args.driver.upper(), prefix)
+        return
+
+    races = season_rounds(args.year) if args.all_rounds else RACES
+    download_season_grid(args.year, races=races, workers=args.workers)
 
 if __name__ == "__main__":
     main()
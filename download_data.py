@@ -5,8 +5,9 @@ download_data.py
 Downloads Formula 1 race telemetry using the FastF1 library.
 
 Steps:
-1. Enables data caching to data/cache/
-2. Downloads the Bahrain GP 2024 Race session
+1. Enables data caching in the shared cache (config.CACHE_DIR)
+2. Downloads the Bahrain GP 2024 Race session (laps only), unless the
+   download manifest shows the CSV is already built from the cached data
 3. Extracts lap data for driver "HAM" (Lewis Hamilton)
 4. Creates a DataFrame with:
    - Lap Number
@@ -21,29 +22,44 @@ import os
 import sys
 import pandas as pd
 import fastf1
+from config import CACHE_DIR
+from modules import manifest
+from modules.shared_cache import default_cache
+from download_all_data import LEAN_LOAD, session_cache_dir
 
 def main():
     try:
         # ---------------------------------------------------------------------
         # 1. Enable FastF1 caching
         # ---------------------------------------------------------------------
-        cache_dir = "data/cache"
-        os.makedirs(cache_dir, exist_ok=True)
-        fastf1.Cache.enable_cache(cache_dir)
-        print(f"✅ FastF1 cache enabled at: {cache_dir}")
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fastf1.Cache.enable_cache(CACHE_DIR)
+        print(f"✅ FastF1 cache enabled at: {CACHE_DIR}")
 
         # ---------------------------------------------------------------------
         # 2. Load Bahrain GP 2024 Race session
         # ---------------------------------------------------------------------
-        print("⏳ Loading Bahrain GP 2024 Race session...")
+        driver_code = "HAM"
+        output_path = "data/bahrain_2024_hamilton.csv"
         session = fastf1.get_session(2024, "Bahrain", "R")
-        session.load()
+
+        known = manifest.load_manifest()
+        source_hash = manifest.source_cache_hash(session_cache_dir(session))
+        if os.path.exists(output_path) and manifest.is_up_to_date(
+            known, 2024, "bahrain", "R", source_hash, driver="hamilton"
+        ):
+            print(f"⏭️  {output_path} is up to date with the cache, nothing to do.")
+            return
+
+        print("⏳ Loading Bahrain GP 2024 Race session (laps only)...")
+        default_cache().unshare(session_cache_dir(session))
+        session.load(**LEAN_LOAD)
+        default_cache().sync()
         print("✅ Session loaded successfully!")
 
         # ---------------------------------------------------------------------
         # 3. Extract laps for driver 'HAM' (Lewis Hamilton)
         # ---------------------------------------------------------------------
-        driver_code = "HAM"
         laps = session.laps.pick_driver(driver_code)
 
         if laps.empty:
@@ -68,10 +84,15 @@ def main():
         # ---------------------------------------------------------------------
         # 5. Save results to CSV
         # ---------------------------------------------------------------------
-        output_path = "data/bahrain_2024_hamilton.csv"
         df.to_csv(output_path, index=False)
         print(f"💾 Data saved to: {output_path}")
 
+        manifest.record_partition(
+            known, 2024, "bahrain", "R", "hamilton",
+            manifest.source_cache_hash(session_cache_dir(session)), len(df)
+        )
+        manifest.save_manifest(known)
+
         # ---------------------------------------------------------------------
         # 6. Print summary information
         # ---------------------------------------------------------------------
@@ -0,0 +1,160 @@
+"""
+Record / replay of Gemini traffic for reproducible benchmarks.
+
+Two model providers for gemini_client.py (see there):
+
+- "record" wraps a real provider (F1_CASSETTE_SOURCE, default "gemini") and
+  appends every answer to a cassette: the prompt key, the response text and
+  when each streamed chunk arrived.
+- "replay" serves answers back from the cassette, with the recorded timing
+  or with zero latency (F1_CASSETTE_LATENCY=recorded|zero). A prompt that is
+  not on the cassette fails instead of reaching the network.
+
+A cassette is gzip-compressed JSON Lines, one entry per answer, keyed like the
+response cache by sha256(model + normalized prompt). Prompts themselves are
+not stored. Recording appends one gzip member per entry, so an interrupted
+run keeps everything recorded so far.
+
+    F1_GEMINI_PROVIDER=record F1_GEMINI_CASSETTE=data/bahrain.cassette.gz python test/benchmark_predictors.py
+    F1_GEMINI_PROVIDER=replay F1_GEMINI_CASSETTE=data/bahrain.cassette.gz python test/benchmark_predictors.py
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+
+from config import CASSETTE_LATENCY, CASSETTE_PATH
+from modules.response_cache import cache_key
+
+LATENCY_MODES = ("recorded", "zero")
+
+
+class CassetteMiss(LookupError):
+    """Replay was asked for a prompt the cassette does not contain."""
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class Cassette:
+    """
+    Recorded answers: {key: [[seconds_since_request, text], ...]}.
+
+    Args:
+        path (str): Cassette file (.gz JSON Lines); missing means empty
+    """
+
+    def __init__(self, path=CASSETTE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry["chunks"]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, model_name, prompt):
+        """Recorded chunks for a prompt, None if it was never recorded."""
+        return self.entries.get(cache_key(model_name, prompt))
+
+    def record(self, model_name, prompt, chunks):
+        """Append one answer (later recordings of the same prompt win on load)."""
+        key = cache_key(model_name, prompt)
+        line = json.dumps({"key": key, "model": model_name, "chunks": chunks}, separators=(",", ":"))
+        with self._lock:
+            self.entries[key] = chunks
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def open_cassette(path=CASSETTE_PATH):
+    """Shared Cassette per path (loaded once per process)."""
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = _cassettes[path] = Cassette(path)
+        return cassette
+
+
+class RecordingModel:
+    """
+    Wraps a model and records every successful answer with its timing.
+
+    Args:
+        model_name (str): Model name (part of the cassette key)
+        inner: Model of the real provider
+        cassette (Cassette): Where answers are appended
+    """
+
+    def __init__(self, model_name, inner, cassette):
+        self.model_name = model_name
+        self.inner = inner
+        self.cassette = cassette
+
+    async def generate_content_async(self, prompt, stream=False):
+        started = time.perf_counter()
+        response = await self.inner.generate_content_async(prompt, stream=stream)
+        if not stream:
+            self.cassette.record(self.model_name, prompt,
+                                 [[round(time.perf_counter() - started, 4), response.text]])
+            return response
+        return self._record_stream(prompt, response, started)
+
+    async def _record_stream(self, prompt, response, started):
+        chunks = []
+        async for chunk in response:
+            chunks.append([round(time.perf_counter() - started, 4), chunk.text])
+            yield chunk
+        self.cassette.record(self.model_name, prompt, chunks)
+
+
+class ReplayModel:
+    """
+    Serves answers from a cassette.
+
+    Args:
+        model_name (str): Model name (part of the cassette key)
+        cassette (Cassette): Recorded answers
+        latency (str): "recorded" (sleep like the original call) or "zero"
+    """
+
+    def __init__(self, model_name, cassette, latency=CASSETTE_LATENCY):
+        if latency not in LATENCY_MODES:
+            raise ValueError(f"Unknown cassette latency mode: {latency}")
+        self.model_name = model_name
+        self.cassette = cassette
+        self.latency = latency
+
+    async def generate_content_async(self, prompt, stream=False):
+        chunks = self.cassette.get(self.model_name, prompt)
+        if chunks is None:
+            raise CassetteMiss(f"Prompt not on cassette {self.cassette.path} "
+                               f"(key {cache_key(self.model_name, prompt)[:12]})")
+        if not stream:
+            if self.latency == "recorded":
+                await asyncio.sleep(chunks[-1][0])
+            return _Response("".join(text for _, text in chunks))
+        return self._replay_stream(chunks)
+
+    async def _replay_stream(self, chunks):
+        elapsed = 0.0
+        for offset, text in chunks:
+            if self.latency == "recorded":
+                await asyncio.sleep(max(0.0, offset - elapsed))
+                elapsed = offset
+            yield _Response(text)
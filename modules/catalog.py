@@ -0,0 +1,237 @@
+"""
+Offline catalog of the races we have data for.
+
+The catalog is built by scanning the FastF1 cache once (session_info, lap_count
+and driver_info of every cached session) plus the per-driver CSV files and lap
+store partitions. It is persisted to ``data/catalog.json`` and only rebuilt when
+one of the scanned directories changes (mtime), so the app and the predictor
+can discover races without hard-coded maps and without unpickling anything on
+a warm start.
+"""
+
+import glob
+import json
+import os
+import re
+
+from modules import ff1_cache, lap_store
+
+CATALOG_PATH = "data/catalog.json"
+CATALOG_VERSION = 2
+DATA_DIR = "data"
+DEFAULT_DRIVER = "hamilton"
+
+# Circuit details that are not part of the FastF1 cache, keyed by circuit short name
+CIRCUIT_DETAILS = {
+    "Sakhir": {"flag": "🇧🇭", "length_km": 5.412, "tyre_wear": "High"},
+    "Monte Carlo": {"flag": "🇲🇨", "length_km": 3.337, "tyre_wear": "Low"},
+    "Silverstone": {"flag": "🇬🇧", "length_km": 5.891, "tyre_wear": "Medium"},
+}
+DEFAULT_CIRCUIT_DETAILS = {"flag": "🏁", "length_km": None, "tyre_wear": "Unknown"}
+
+# <key>_<season>_<driver>.csv; the season anchors the split, so keys and
+# drivers may contain "_" (abu_dhabi_2024_de_vries.csv)
+_CSV_NAME = re.compile(r"^(?P<key>.+?)_(?P<season>\d{4})_(?P<driver>.+)\.csv$")
+
+# In-process copy, reused while the scanned directories are unchanged
+_loaded = None
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "_", str(text).lower()).strip("_")
+
+
+def _directory_mtimes(cache_roots, data_dir, store_dir):
+    """mtime of every directory (and CSV file) whose contents the catalog depends on."""
+    # CSV files are checked one by one: the catalog itself lives in data_dir
+    patterns = [os.path.join(data_dir, "*.csv")]
+    for root in cache_roots:
+        patterns += [root, os.path.join(root, "*"), os.path.join(root, "*", "*"),
+                     os.path.join(root, "*", "*", "*")]
+    patterns += [store_dir, os.path.join(store_dir, "season=*"),
+                 os.path.join(store_dir, "season=*", "event=*"),
+                 os.path.join(store_dir, "season=*", "event=*", "session=*")]
+
+    mtimes = {}
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            if os.path.isdir(path) or path.endswith(".csv"):
+                mtimes[path] = os.stat(path).st_mtime_ns
+    return mtimes
+
+
+def _total_laps(lap_count):
+    """Scheduled race distance from the cached lap_count feed."""
+    if not lap_count:
+        return None
+    totals = [n for n in lap_count.get("TotalLaps", []) if n]
+    if totals:
+        return int(totals[-1])
+    current = [n for n in lap_count.get("CurrentLap", []) if n]
+    return int(max(current)) if current else None
+
+
+def _race_entry(session_dir, csv_files, store_partitions):
+    """Build the catalog entry of one cached session."""
+    info = ff1_cache.read_session_file(session_dir, "session_info") or {}
+    meeting = info.get("Meeting", {})
+    name = meeting.get("Name", os.path.basename(os.path.dirname(session_dir)))
+    location = meeting.get("Location", "")
+    circuit = meeting.get("Circuit", {}).get("ShortName", location)
+    start = info.get("StartDate")
+    season = int(start.year) if start else int(os.path.basename(os.path.dirname(os.path.dirname(session_dir))))
+
+    # Event key: reuse the prefix of existing data files (e.g. "silverstone"
+    # for the British GP), otherwise derive it from the event name
+    candidates = {_slug(name.replace("Grand Prix", "")), _slug(location), _slug(circuit)}
+    keys = sorted({key for key, s, _ in csv_files if s == season and key in candidates})
+    keys += sorted({p["event"] for p in store_partitions if p["season"] == season and p["event"] in candidates})
+    key = keys[0] if keys else _slug(name.replace("Grand Prix", ""))
+
+    label = f"{name.replace('Grand Prix', 'GP')} {season}"
+    if key not in _slug(name):
+        label += f" ({circuit})"
+
+    drivers = []
+    for number, d in sorted((ff1_cache.read_session_file(session_dir, "driver_info") or {}).items(),
+                            key=lambda item: item[1].get("Line", 99)):
+        drivers.append({
+            "code": d.get("Tla"),
+            "number": str(number),
+            "name": d.get("FullName"),
+            "key": _slug(d.get("LastName", d.get("Tla", number))),
+            "team": d.get("TeamName"),
+        })
+
+    details = {**DEFAULT_CIRCUIT_DETAILS, **CIRCUIT_DETAILS.get(circuit, {})}
+    return {
+        "key": key,
+        "label": label,
+        "season": season,
+        "event": name,
+        "location": location,
+        "circuit": circuit,
+        "country": meeting.get("Country", {}).get("Name"),
+        "session": info.get("Name", os.path.basename(session_dir).split("_", 1)[-1]),
+        "date": start.date().isoformat() if start else None,
+        "total_laps": _total_laps(ff1_cache.read_session_file(session_dir, "lap_count")),
+        "cache_dir": session_dir,
+        "files": {drv: path for (k, s, drv), path in csv_files.items() if k == key and s == season},
+        "store_drivers": sorted(p["driver"] for p in store_partitions
+                                if p["season"] == season and p["event"] == key),
+        "drivers": drivers,
+        **details,
+    }
+
+
+def build_catalog(cache_roots=ff1_cache.CACHE_ROOTS, data_dir=DATA_DIR, store_dir=lap_store.STORE_DIR):
+    """
+    Scan the FastF1 cache, CSV files and lap store and build the catalog.
+
+    Returns:
+        dict: {"version": int, "mtimes": {dir: mtime_ns}, "races": [entry, ...]}
+    """
+    csv_files = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        match = _CSV_NAME.match(os.path.basename(path))
+        if match:
+            csv_files[(match["key"], int(match["season"]), match["driver"])] = path
+
+    store_partitions = lap_store.list_partitions(store_dir)
+
+    races = []
+    for session_dir in ff1_cache.find_session_dirs(cache_roots):
+        try:
+            races.append(_race_entry(session_dir, csv_files, store_partitions))
+        except Exception as e:
+            print(f"[WARN] Skipping unreadable cached session {session_dir}: {e}")
+
+    races.sort(key=lambda r: (r["season"], r["date"] or "", r["key"]))
+    return {
+        "version": CATALOG_VERSION,
+        "mtimes": _directory_mtimes(cache_roots, data_dir, store_dir),
+        "races": races,
+    }
+
+
+def _index(catalog):
+    """Add lookup tables (by label and by key) to a loaded catalog."""
+    catalog["by_label"] = {r["label"]: r for r in catalog["races"]}
+    catalog["by_key"] = {}
+    for r in catalog["races"]:
+        catalog["by_key"].setdefault(r["key"], r)
+    return catalog
+
+
+def load_catalog(path=CATALOG_PATH, cache_roots=ff1_cache.CACHE_ROOTS, data_dir=DATA_DIR,
+                 store_dir=lap_store.STORE_DIR):
+    """
+    Return the race catalog, rebuilding it only if a scanned directory changed.
+
+    Args:
+        path (str): Where the catalog is persisted
+        cache_roots (list): FastF1 cache roots to scan
+        data_dir (str): Directory with the per-driver CSV files
+        store_dir (str): Root of the lap store
+
+    Returns:
+        dict: Catalog with "races" plus "by_label" / "by_key" indexes
+    """
+    global _loaded
+
+    mtimes = _directory_mtimes(cache_roots, data_dir, store_dir)
+    if _loaded is not None and _loaded["mtimes"] == mtimes:
+        return _loaded
+
+    catalog = None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+        if catalog.get("version") != CATALOG_VERSION or catalog.get("mtimes") != mtimes:
+            catalog = None
+    except (OSError, json.JSONDecodeError):
+        catalog = None
+
+    if catalog is None:
+        catalog = build_catalog(cache_roots, data_dir, store_dir)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(catalog, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARN] Could not persist race catalog to {path}: {e}")
+
+    _loaded = _index(catalog)
+    return _loaded
+
+
+def list_races(catalog=None):
+    """Display labels of every cataloged race, e.g. "Bahrain GP 2024"."""
+    catalog = catalog or load_catalog()
+    return [r["label"] for r in catalog["races"]]
+
+
+def find_race(name, catalog=None):
+    """
+    Look a race up by display label or event key.
+
+    Returns:
+        dict | None: The catalog entry
+    """
+    catalog = catalog or load_catalog()
+    return catalog["by_label"].get(name) or catalog["by_key"].get(name)
+
+
+def race_file(name, driver=DEFAULT_DRIVER, catalog=None):
+    """
+    Path of the per-driver CSV for a race.
+
+    Returns:
+        str | None: CSV path, or None if the race or driver file is unknown
+    """
+    race = find_race(name, catalog)
+    if race is None:
+        return None
+    return race["files"].get(driver)
@@ -0,0 +1,316 @@
+"""
+One-time conversion of cached FastF1 sessions into memory-mappable columnar files.
+
+Unpickling ``_extended_timing_data.ff1pkl`` / ``timing_app_data.ff1pkl`` and
+building FastF1's object model dominates cold-start time. This module converts
+each cached session once into uncompressed Arrow IPC files:
+
+    data/sessions/2024/2024-03-02_Bahrain_Grand_Prix/2024-03-02_Race/
+        laps.arrow  stints.arrow  track_status.arrow  weather.arrow  _source.json
+
+which are then opened with ``pyarrow.memory_map`` (zero-copy column access,
+milliseconds per race). Times are stored as float seconds of session time.
+Laps are tagged with track status and pit flags and carry the weather sample
+at their end (track_temp, ... see weather.py) from conversion time on, so
+loaders don't redo the as-of merge on every read. A session is re-converted when the hash of its cache files
+or the converter version changes.
+
+CLI:
+    python -m modules.columnar_sessions            # convert every cached session
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from modules import ff1_cache, manifest, track_status as track_status_flags
+from modules.weather import merge_weather
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pc = ipc = None
+
+COLUMNAR_DIR = "data/sessions"
+TABLES = ["laps", "stints", "track_status", "weather"]
+SOURCE_FILE = "_source.json"
+# Bump when the converted tables change shape, to re-convert existing sessions
+CONVERTER_VERSION = 4
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for columnar sessions. Run: pip install pyarrow")
+
+
+def _seconds(values):
+    """timedelta-like Series/list -> float seconds (NaN for missing)."""
+    return pd.to_timedelta(pd.Series(values)).dt.total_seconds().to_numpy(dtype="float64", copy=True)
+
+
+def session_key(session_dir):
+    """Relative session path, e.g. 2024/2024-03-02_Bahrain_Grand_Prix/2024-03-02_Race."""
+    parts = os.path.normpath(session_dir).split(os.sep)
+    return "/".join(parts[-3:])
+
+
+def output_dir(session_dir, out_root=COLUMNAR_DIR):
+    """Directory holding the converted files of one cached session."""
+    return os.path.join(out_root, *session_key(session_dir).split("/"))
+
+
+# -------------------------------------------------------------------------
+# Building tables from the raw cache payloads
+# -------------------------------------------------------------------------
+def _stints_table(timing_app, driver_codes):
+    """One row per (driver, stint): compound, new/used and tyre age at stint start."""
+    app = timing_app[["Driver", "Stint", "TotalLaps", "Compound", "New", "Time"]].copy()
+    app["Compound"] = app["Compound"].where(app["Compound"] != "UNKNOWN")
+    app["New"] = app["New"].where(app["Compound"].notna())
+
+    # Tyre age at the stint start is TotalLaps where the compound becomes known
+    # (carried forward within the stint), as in FastF1: a pit stop first sends
+    # an UNKNOWN row with TotalLaps 0, and the fitted set may report 1 already
+    app["TotalLaps"] = app.groupby(["Driver", "Stint"], sort=False)["TotalLaps"].ffill()
+    fitted = app[app["Compound"].notna()].groupby(["Driver", "Stint"], sort=True)["TotalLaps"].first()
+
+    grouped = app.groupby(["Driver", "Stint"], sort=True)
+    stints = pd.DataFrame({
+        "compound": grouped["Compound"].first(),
+        "new": grouped["New"].first(),
+        "start_age": fitted.reindex(grouped.size().index).fillna(grouped["TotalLaps"].first()),
+        "start_time": grouped["Time"].min(),
+    }).reset_index()
+
+    return pd.DataFrame({
+        "driver": stints["Driver"].map(driver_codes).fillna(stints["Driver"]).astype("string"),
+        "driver_number": stints["Driver"].astype("string"),
+        "stint": stints["Stint"].astype("int8"),
+        "compound": stints["compound"].astype("string"),
+        "fresh_tyre": stints["new"].map({True: True, False: False, "True": True, "False": False}).astype("boolean"),
+        "start_age": stints["start_age"].fillna(0).astype("int16"),
+        "start_time": _seconds(stints["start_time"]),
+    })
+
+
+def _laps_table(timing, timing_app, stints, driver_codes):
+    """One row per (driver, lap) with lap/sector times, pit flags, stint and tyre info."""
+    laps = timing.sort_values(["Driver", "NumberOfLaps"], kind="stable").reset_index(drop=True)
+
+    time = _seconds(laps["Time"])
+    lap_time = _seconds(laps["LapTime"])
+    number = laps["NumberOfLaps"].to_numpy()
+    driver = laps["Driver"].astype(str).to_numpy()
+
+    # Lap 1 has no timed LapTime in the timing feed; the app feed may have it
+    # (otherwise it stays NaN and is dropped by the loaders' cleaning step)
+    if np.isnan(lap_time).any() and "LapTime" in timing_app:
+        app_times = timing_app.dropna(subset=["LapNumber", "LapTime"])
+        lookup = dict(zip(zip(app_times["Driver"].astype(str), app_times["LapNumber"].astype(int)),
+                          _seconds(app_times["LapTime"])))
+        missing = np.flatnonzero(np.isnan(lap_time))
+        lap_time[missing] = [lookup.get((driver[i], int(number[i])), np.nan) for i in missing]
+
+    # Lap start = previous lap's end for the same driver; lap 1 falls back to end - lap time
+    prev_time = np.r_[np.nan, time[:-1]]
+    first_of_driver = np.r_[True, driver[1:] != driver[:-1]]
+    lap_start = np.where(first_of_driver, time - lap_time, prev_time)
+
+    # Stint = pit exits after the start (lap 1 always has a PitOutTime from the grid)
+    pit_out = laps["PitOutTime"].notna().to_numpy() & (number > 1)
+    stint = pd.Series(pit_out.astype("int8")).groupby(driver).cumsum().to_numpy()
+
+    df = pd.DataFrame({
+        "driver_number": driver,
+        "lap_number": number.astype("int16"),
+        "lap_time": lap_time,
+        "time": time,
+        "lap_start_time": lap_start,
+        "stint": stint.astype("int8"),
+        "pit_in_time": _seconds(laps["PitInTime"]),
+        "pit_out_time": _seconds(laps["PitOutTime"]),
+        "sector1_time": _seconds(laps["Sector1Time"]),
+        "sector2_time": _seconds(laps["Sector2Time"]),
+        "sector3_time": _seconds(laps["Sector3Time"]),
+        "is_personal_best": laps["IsPersonalBest"].astype(bool).to_numpy(),
+    })
+
+    df = df.merge(
+        stints[["driver_number", "stint", "compound", "fresh_tyre", "start_age"]]
+        .astype({"driver_number": str}),
+        on=["driver_number", "stint"], how="left",
+    )
+    first_lap_of_stint = df.groupby(["driver_number", "stint"])["lap_number"].transform("min")
+    df["tyre_life"] = (df["start_age"].fillna(0) + df["lap_number"] - first_lap_of_stint + 1).astype("int16")
+    df["driver"] = df["driver_number"].map(driver_codes).fillna(df["driver_number"])
+    df = df.drop(columns="start_age")
+
+    ordered = ["driver", "driver_number", "lap_number", "lap_time", "time", "lap_start_time",
+               "stint", "compound", "fresh_tyre", "tyre_life", "pit_in_time", "pit_out_time",
+               "sector1_time", "sector2_time", "sector3_time", "is_personal_best"]
+    return df[ordered].astype({"driver": "string", "driver_number": "string", "compound": "string"})
+
+
+def _series_table(payload):
+    """Dict-of-lists feed (track status, weather) -> DataFrame with time in seconds."""
+    if not payload:
+        return pd.DataFrame({"time": pd.Series(dtype="float64")})
+    df = pd.DataFrame(payload)
+    df.insert(0, "time", _seconds(df.pop("Time")))
+    df.columns = ["time"] + [
+        "".join("_" + c.lower() if c.isupper() and i else c.lower() for i, c in enumerate(name))
+        for name in df.columns[1:]
+    ]
+    return df
+
+
+def build_session_tables(session_dir):
+    """
+    Build the laps / stints / track_status / weather tables of one cached session
+    straight from its .ff1pkl payloads (no FastF1 needed).
+
+    Returns:
+        dict[str, pandas.DataFrame]: One DataFrame per table name
+    """
+    timing = ff1_cache.read_session_file(session_dir, "_extended_timing_data")
+    timing_app = ff1_cache.read_session_file(session_dir, "timing_app_data")
+    if timing is None or timing_app is None:
+        raise FileNotFoundError(f"No timing data cached in {session_dir}")
+    if isinstance(timing, tuple):
+        timing = timing[0]
+
+    driver_info = ff1_cache.read_session_file(session_dir, "driver_info") or {}
+    driver_codes = {str(number): d.get("Tla", str(number)) for number, d in driver_info.items()}
+
+    stints = _stints_table(timing_app, driver_codes)
+    track_status = _series_table(ff1_cache.read_session_file(session_dir, "track_status_data"))
+    if "status" in track_status:
+        track_status["status"] = track_status["status"].astype("string")
+    weather = _series_table(ff1_cache.read_session_file(session_dir, "weather_data"))
+    laps = _laps_table(timing, timing_app, stints, driver_codes)
+    laps = merge_weather(track_status_flags.tag_laps(laps, track_status), weather)
+    return {
+        "laps": laps,
+        "stints": stints,
+        "track_status": track_status,
+        "weather": weather,
+    }
+
+
+# -------------------------------------------------------------------------
+# Conversion and memory-mapped access
+# -------------------------------------------------------------------------
+def _source_info(session_dir, out_root=COLUMNAR_DIR):
+    """Internal: the _source.json of a converted session ({} if missing or unreadable)."""
+    try:
+        with open(os.path.join(output_dir(session_dir, out_root), SOURCE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def is_converted(session_dir, out_root=COLUMNAR_DIR):
+    """True if the converted files exist and match the current cache content."""
+    source = _source_info(session_dir, out_root)
+    return (source.get("converter_version") == CONVERTER_VERSION
+            and source.get("source_hash") == manifest.source_cache_hash(session_dir))
+
+
+def convert_session(session_dir, out_root=COLUMNAR_DIR, force=False):
+    """
+    Convert one cached session into memory-mappable Arrow IPC files.
+
+    Args:
+        session_dir (str): Cached FastF1 session directory
+        out_root (str): Root directory for converted sessions
+        force (bool): Convert even if the existing files are up to date
+
+    Returns:
+        str: Directory holding the converted files
+    """
+    _require_pyarrow()
+    out_dir = output_dir(session_dir, out_root)
+    if not force and is_converted(session_dir, out_root):
+        return out_dir
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in build_session_tables(session_dir).items():
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp_path = os.path.join(out_dir, f"{name}.arrow.tmp")
+        # Uncompressed IPC file format so readers can memory-map it
+        with pa.OSFile(tmp_path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, os.path.join(out_dir, f"{name}.arrow"))
+
+    with open(os.path.join(out_dir, SOURCE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"session_dir": session_dir, "converter_version": CONVERTER_VERSION,
+                   "source_hash": manifest.source_cache_hash(session_dir)}, f)
+    return out_dir
+
+
+def convert_all(cache_roots=ff1_cache.CACHE_ROOTS, out_root=COLUMNAR_DIR, force=False):
+    """
+    Convert every cached session that is new or changed.
+
+    Returns:
+        list[str]: Output directories of all converted sessions
+    """
+    converted = []
+    for session_dir in ff1_cache.find_session_dirs(cache_roots):
+        try:
+            converted.append(convert_session(session_dir, out_root, force))
+        except Exception as e:
+            print(f"[WARN] Could not convert {session_dir}: {e}")
+    return converted
+
+
+def open_table(session_dir, name, out_root=COLUMNAR_DIR):
+    """
+    Memory-map one converted table (converting the session first if needed).
+
+    Args:
+        session_dir (str): Cached FastF1 session directory
+        name (str): One of "laps", "stints", "track_status", "weather"
+        out_root (str): Root directory for converted sessions
+
+    Returns:
+        pyarrow.Table: Table backed by the memory-mapped file (zero-copy)
+    """
+    _require_pyarrow()
+    path = os.path.join(output_dir(session_dir, out_root), f"{name}.arrow")
+    # Cheap staleness check (no cache hashing): missing file or older converter
+    if not os.path.exists(path) or _source_info(session_dir, out_root).get("converter_version") != CONVERTER_VERSION:
+        convert_session(session_dir, out_root)
+    # The table's buffers keep the mapping alive; nothing is copied here
+    return ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def read_table(session_dir, name, columns=None, driver=None, out_root=COLUMNAR_DIR):
+    """
+    Read one converted table as a pandas DataFrame.
+
+    Args:
+        session_dir (str): Cached FastF1 session directory
+        name (str): Table name
+        columns (list): Only these columns
+        driver (str): Only rows of this driver code (tables with a "driver" column)
+        out_root (str): Root directory for converted sessions
+
+    Returns:
+        pandas.DataFrame
+    """
+    table = open_table(session_dir, name, out_root)
+    if driver is not None:
+        table = table.filter(pc.field("driver") == driver)
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+if __name__ == "__main__":
+    for path in convert_all():
+        print(f"✅ {path}")
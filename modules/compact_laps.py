@@ -0,0 +1,115 @@
+"""
+Compact in-memory lap table for season-scale data.
+
+Lap frames as loaded from CSV use float64 lap numbers / tire ages and object
+strings for compounds, drivers and events. For strategy simulation over every
+driver of every race we keep laps in a compact table instead:
+
+    season        int16
+    event         category  (small integer codes)
+    session       category
+    driver        category
+    lap_number    int16
+    lap_time_ms   Int32     (milliseconds, exact for the 3-decimal source data)
+    tire_compound category  (fixed set of compounds)
+    tire_age      int16
+
+Categorical columns make groupbys run on integer codes. to_compact /
+from_compact convert from and to the existing shapes (raw lap store / CSV
+columns or the canonical LapNumber / LapTime_seconds / Compound / TyreLife).
+"""
+
+import numpy as np
+import pandas as pd
+
+from modules.data_processor import normalize_lap_columns
+
+COMPOUNDS = ["SOFT", "MEDIUM", "HARD", "INTERMEDIATE", "WET", "UNKNOWN"]
+COMPOUND_DTYPE = pd.CategoricalDtype(COMPOUNDS)
+KEY_COLUMNS = ["season", "event", "session", "driver"]
+COMPACT_COLUMNS = KEY_COLUMNS + ["lap_number", "lap_time_ms", "tire_compound", "tire_age"]
+
+
+def to_compact(df):
+    """
+    Convert a lap DataFrame to the compact representation.
+
+    Args:
+        df (DataFrame): Laps with raw (lap_number, lap_time, ...) or canonical
+                        (LapNumber, LapTime_seconds, ...) columns, plus any of
+                        season / event / session / driver
+
+    Returns:
+        DataFrame: Compact lap table (only the columns listed in COMPACT_COLUMNS)
+    """
+    df = normalize_lap_columns(df)
+    out = {}
+
+    if "season" in df.columns:
+        out["season"] = df["season"].astype("int16").to_numpy()
+    for col in ("event", "session", "driver"):
+        if col in df.columns:
+            out[col] = df[col].astype("category").array
+
+    out["lap_number"] = df["LapNumber"].astype("int16").to_numpy()
+    # Nullable Int32 keeps missing lap times as <NA> instead of a sentinel
+    lap_ms = np.round(df["LapTime_seconds"].to_numpy(dtype=float) * 1000.0)
+    out["lap_time_ms"] = pd.array(lap_ms, dtype="Int32")
+    if "Compound" in df.columns:
+        compound = df["Compound"].astype("string").str.upper()
+        out["tire_compound"] = compound.where(compound.isin(COMPOUNDS), "UNKNOWN").astype(COMPOUND_DTYPE).array
+    if "TyreLife" in df.columns:
+        out["tire_age"] = df["TyreLife"].fillna(0).astype("int16").to_numpy()
+
+    return pd.DataFrame(out, index=pd.RangeIndex(len(df)))
+
+
+def from_compact(compact, canonical=True):
+    """
+    Convert a compact lap table back to the regular DataFrame shape.
+
+    Args:
+        compact (DataFrame): Output of to_compact
+        canonical (bool): Canonical column names (LapNumber, LapTime_seconds, ...)
+                          instead of the raw lap store / CSV names
+
+    Returns:
+        DataFrame: int64 lap numbers / tire ages, float64 seconds, string keys
+    """
+    out = {}
+    for col in KEY_COLUMNS:
+        if col in compact.columns:
+            out[col] = compact[col].astype(int if col == "season" else object)
+
+    out["lap_number"] = compact["lap_number"].astype("int64")
+    out["lap_time"] = compact["lap_time_ms"].astype("float64") / 1000.0
+    if "tire_compound" in compact.columns:
+        out["tire_compound"] = compact["tire_compound"].astype(object)
+    if "tire_age" in compact.columns:
+        out["tire_age"] = compact["tire_age"].astype("int64")
+
+    df = pd.DataFrame(out)
+    return normalize_lap_columns(df) if canonical else df
+
+
+def concat_compact(frames):
+    """
+    Concatenate compact tables, keeping key columns categorical.
+
+    Plain pd.concat falls back to object dtype when categories differ between
+    races (e.g. different driver sets), so the categories are unified first.
+    """
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=COMPACT_COLUMNS)
+
+    for col in ("event", "session", "driver"):
+        if all(col in f.columns for f in frames):
+            categories = pd.api.types.union_categoricals([f[col] for f in frames]).categories
+            frames = [f.assign(**{col: f[col].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_bytes(df):
+    """Resident size of a DataFrame in bytes (including string payloads)."""
+    return int(df.memory_usage(deep=True, index=False).sum())
@@ -1,5 +1,69 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 
+from config import RACE_CACHE_MAX_BYTES
+from modules import columnar_sessions, lap_store
+from modules.degradation import lap_flags
+
+# get_race_data hands out shallow copies of one cached frame; copy-on-write
+# (always on from pandas 3) keeps a caller's writes out of the shared data
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Canonical lap schema used by every function below
+CANONICAL_COLUMNS = ["LapNumber", "LapTime_seconds", "Compound", "TyreLife"]
+
+# Race CSV / lap store column names -> names used by the processing functions below
+STORE_COLUMN_MAP = {
+    "lap_number": "LapNumber",
+    "lap_time": "LapTime_seconds",
+    "tire_compound": "Compound",
+    "tire_age": "TyreLife",
+}
+
+# Converted session columns -> names used by the processing functions below
+SESSION_COLUMN_MAP = {
+    "lap_number": "LapNumber",
+    "lap_time": "LapTime_seconds",
+    "compound": "Compound",
+    "tyre_life": "TyreLife",
+}
+
+# Weather columns (lap store / converted session) -> names used by create_ai_context
+WEATHER_COLUMN_MAP = {
+    "track_temp": "TrackTemp",
+    "air_temp": "AirTemp",
+    "humidity": "Humidity",
+    "rainfall": "Rainfall",
+}
+
+# Converted session flags honoured by calculate_degradation (see track_status.py)
+SESSION_FLAG_COLUMNS = ["pit_in", "pit_out", "exclude_from_fit"]
+
+# Process-wide cache of parsed race CSVs: abs path -> (mtime_ns, size, df, nbytes)
+_race_cache = OrderedDict()
+_race_cache_lock = threading.Lock()
+_race_cache_bytes = 0
+
+# Cache of AI contexts: (dataset version, driver, lap, window) -> text
+AI_CONTEXT_WINDOW = 10
+AI_CONTEXT_CACHE_SIZE = 4096
+_context_cache = OrderedDict()
+_context_cache_lock = threading.Lock()
+
+
+def normalize_lap_columns(df):
+    """
+    Rename any known lap schema (race CSV / lap store, converted session) to the
+    canonical one: LapNumber, LapTime_seconds, Compound, TyreLife.
+    """
+    return df.rename(columns={**STORE_COLUMN_MAP, **SESSION_COLUMN_MAP, **WEATHER_COLUMN_MAP})
+
+
 def load_race_data(csv_file):
     """
     Load F1 race data from CSV and clean it
@@ -13,24 +77,7 @@ def load_race_data(csv_file):
     try:
         # 1. Load CSV file using pandas
         df = pd.read_csv(csv_file)
-
-        # 2. Remove rows with missing lap times
-        df = df.dropna(subset=["LapTime_seconds"])
-
-        # 3. Convert lap time to float
-        df["LapTime_seconds"] = df["LapTime_seconds"].astype(float)
-
-        # 4. Ensure tire age is integer
-        if "TyreLife" in df.columns:
-            df["TyreLife"] = df["TyreLife"].fillna(0).astype(int)
-        elif "tire_age" in df.columns:
-            df["tire_age"] = df["tire_age"].fillna(0).astype(int)
-
-        # 5. Remove invalid lap times (< 60s or > 150s)
-        df = df[(df["LapTime_seconds"] >= 60) & (df["LapTime_seconds"] <= 150)]
-
-        df = df.reset_index(drop=True)
-        return df
+        return _clean_race_data(normalize_lap_columns(df))
 
     except FileNotFoundError:
         print(f"❌ Error: File not found — {csv_file}")
@@ -43,6 +90,211 @@ def load_race_data(csv_file):
         return pd.DataFrame()
 
 
+def load_race_data_from_store(event, driver, season=2024, session="R", max_lap=None,
+                              store_dir=lap_store.STORE_DIR):
+    """
+    Load F1 race data from the partitioned lap store and clean it
+
+    Only the partition of the requested driver is opened and, when max_lap is
+    given, only the row groups covering laps 1..max_lap are read. Weather
+    stored with the laps comes back as TrackTemp / AirTemp / Humidity / Rainfall.
+
+    Args:
+        event (str): Event key (e.g. "bahrain")
+        driver (str): Driver key (e.g. "hamilton")
+        season (int): Season year
+        session (str): Session identifier
+        max_lap (int): Last lap to load (inclusive); None loads the whole race
+        store_dir (str): Root directory of the lap store
+
+    Returns:
+        pandas.DataFrame: Cleaned DataFrame with valid lap data
+    """
+    try:
+        df = lap_store.read_laps(
+            season=season,
+            event=event,
+            driver=driver,
+            session=session,
+            lap_range=(None, max_lap),
+            columns=lap_store.LAP_COLUMNS + lap_store.WEATHER_COLUMNS,
+            store_dir=store_dir,
+        )
+        # Partitions written before weather was stored have it all null
+        df = df.dropna(axis=1, how="all")
+        if df.empty:
+            print(f"❌ Error: No laps in store for {driver} at {event} {season}")
+            return pd.DataFrame()
+
+        return _clean_race_data(normalize_lap_columns(df))
+
+    except Exception as e:
+        print(f"❌ Unexpected error while loading {event}/{driver} from lap store: {e}")
+        return pd.DataFrame()
+
+
+def load_race_data_from_session(session_dir, driver="HAM"):
+    """
+    Load F1 race data for one driver straight from a cached FastF1 session and clean it
+
+    Uses the memory-mapped columnar copy of the session (converted once from the
+    .ff1pkl files on first use), so no pickle or FastF1 loading happens here.
+    The laps carry the weather joined at conversion (TrackTemp, ...) and the
+    pit / SC / VSC flags used by calculate_degradation.
+
+    Args:
+        session_dir (str): Cached session directory (see catalog "cache_dir")
+        driver (str): Three-letter driver code (e.g. "HAM")
+
+    Returns:
+        pandas.DataFrame: Cleaned DataFrame with valid lap data
+    """
+    try:
+        df = columnar_sessions.read_table(
+            session_dir, "laps",
+            columns=list(SESSION_COLUMN_MAP) + list(WEATHER_COLUMN_MAP) + SESSION_FLAG_COLUMNS,
+            driver=driver,
+        )
+        if df.empty:
+            print(f"❌ Error: No laps for {driver} in {session_dir}")
+            return pd.DataFrame()
+
+        return _clean_race_data(normalize_lap_columns(df))
+
+    except Exception as e:
+        print(f"❌ Unexpected error while loading {driver} from {session_dir}: {e}")
+        return pd.DataFrame()
+
+
+def session_data_version(session_dir):
+    """
+    Version tag of a converted session (laps file path + mtime), like
+    race_data_version for CSVs. Returns None if it isn't converted yet.
+    """
+    path = os.path.join(columnar_sessions.output_dir(session_dir), "laps.arrow")
+    try:
+        return f"{os.path.abspath(path)}@{os.stat(path).st_mtime_ns}"
+    except OSError:
+        return None
+
+
+def load_driver_laps(race, driver):
+    """
+    One driver's laps of a catalog race, for predictions.
+
+    Prefers the converted FastF1 session, whose laps carry weather and track
+    status flags, and falls back to the driver's race CSV (lap times and tyres
+    only) when the session isn't cached or can't be read.
+
+    Args:
+        race (dict): Catalog race entry (see catalog.find_race)
+        driver (str): Driver code or key (e.g. "HAM" or "hamilton")
+
+    Returns:
+        tuple: (DataFrame, version) where version keys cached contexts
+               (see race_data_version); an empty DataFrame if nothing loads
+    """
+    entry = next((d for d in race.get("drivers") or [] if driver in (d["code"], d["key"])), None)
+    if entry and race.get("cache_dir") and os.path.isdir(race["cache_dir"]):
+        df = load_race_data_from_session(race["cache_dir"], entry["code"])
+        if not df.empty:
+            return df, session_data_version(race["cache_dir"])
+
+    csv_file = race.get("files", {}).get(entry["key"] if entry else driver)
+    if csv_file and os.path.exists(csv_file):
+        return get_race_data(csv_file), race_data_version(csv_file)
+    return pd.DataFrame(), None
+
+
+def _clean_race_data(df):
+    """
+    Internal: clean a lap DataFrame in the canonical schema (shared by all loaders).
+    """
+    # 1. Remove rows with missing lap times
+    df = df.dropna(subset=["LapTime_seconds"])
+
+    # 2. Convert lap time to float and lap number to integer
+    df["LapTime_seconds"] = df["LapTime_seconds"].astype(float)
+    df["LapNumber"] = df["LapNumber"].astype(int)
+
+    # 3. Ensure tire age is integer
+    if "TyreLife" in df.columns:
+        df["TyreLife"] = df["TyreLife"].fillna(0).astype(int)
+
+    # 4. Remove invalid lap times (< 60s or > 150s)
+    df = df[(df["LapTime_seconds"] >= 60) & (df["LapTime_seconds"] <= 150)]
+
+    df = df.reset_index(drop=True)
+    return df
+
+
+def get_race_data(csv_file):
+    """
+    Memoized load_race_data: every caller in the process shares one parsed copy.
+
+    Entries are keyed by absolute path and re-read when the file's mtime or
+    size changes. The least recently used frames are evicted once the cache
+    exceeds RACE_CACHE_MAX_BYTES (config / F1_RACE_CACHE_MAX_BYTES).
+
+    The returned frame is a shallow copy of the cached one. Copy-on-write is
+    enabled for the process when this module is imported (it is the only
+    mode from pandas 3 on), so writes (including new columns) only ever
+    affect the caller's copy, never the shared data.
+
+    Args:
+        csv_file (str): Path to the CSV file
+
+    Returns:
+        pandas.DataFrame: Cleaned DataFrame in the canonical schema
+    """
+    global _race_cache_bytes
+
+    path = os.path.abspath(csv_file)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return load_race_data(csv_file)  # reports the error, nothing to cache
+
+    with _race_cache_lock:
+        cached = _race_cache.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            _race_cache.move_to_end(path)
+            return cached[2].copy(deep=False)
+
+    df = load_race_data(csv_file)
+    if df.empty:
+        return df
+
+    nbytes = int(df.memory_usage(deep=True).sum())
+    with _race_cache_lock:
+        previous = _race_cache.pop(path, None)
+        if previous is not None:
+            _race_cache_bytes -= previous[3]
+        if nbytes <= RACE_CACHE_MAX_BYTES:
+            _race_cache[path] = (stat.st_mtime_ns, stat.st_size, df, nbytes)
+            _race_cache_bytes += nbytes
+            while _race_cache_bytes > RACE_CACHE_MAX_BYTES:
+                _, evicted = _race_cache.popitem(last=False)
+                _race_cache_bytes -= evicted[3]
+
+    return df.copy(deep=False)
+
+
+def race_cache_info():
+    """Number of cached race frames and their total size in bytes."""
+    with _race_cache_lock:
+        return {"entries": len(_race_cache), "bytes": _race_cache_bytes,
+                "max_bytes": RACE_CACHE_MAX_BYTES}
+
+
+def clear_race_cache():
+    """Drop every cached race frame."""
+    global _race_cache_bytes
+    with _race_cache_lock:
+        _race_cache.clear()
+        _race_cache_bytes = 0
+
+
 # -------------------------------------------------------------------------
 # NEW FUNCTION
 # -------------------------------------------------------------------------
@@ -50,13 +302,17 @@ def calculate_degradation(df):
     """
     Calculate tire degradation metrics
     
+    Pit in/out laps and SC/VSC laps (exclude_from_fit, see track_status.py)
+    are left out, and the metrics restart at every stint, so pit stops and
+    neutralised laps don't show up as huge lap-to-lap jumps.
+
     Args:
         df (DataFrame): Must contain 'LapTime_seconds' column
         
     Returns:
-        DataFrame with added columns:
-        - degradation: seconds slower than previous lap
-        - cumulative_degradation: total time lost over laps
+        DataFrame with added columns (NaN on excluded laps):
+        - degradation: seconds slower than previous clean lap of the stint
+        - cumulative_degradation: total time lost over the stint
         - degradation_rate: rolling average degradation over 5 laps
     """
     if df.empty:
@@ -69,58 +325,67 @@ def calculate_degradation(df):
 
     df = df.copy()  # Avoid mutating original
 
-    # 1. Calculate lap-to-lap degradation (difference from previous lap)
-    df["degradation"] = df["LapTime_seconds"].diff()
+    # 1. Mask pit and SC/VSC laps, group the rest by stint
+    stint, excluded = lap_flags(df)
+    used = ~excluded
+    by_stint = df.loc[used, "LapTime_seconds"].groupby(stint[used])
 
-    # 2. Handle first lap (no previous lap)
-    df.loc[df["LapNumber"] == df["LapNumber"].min(), "degradation"] = 0.0
+    # 2. Calculate lap-to-lap degradation (difference from previous clean lap);
+    #    the first clean lap of every stint has no previous lap
+    degradation = by_stint.diff().fillna(0.0)
 
-    # 3. Calculate cumulative degradation (sum of degradation over laps)
-    df["cumulative_degradation"] = df["degradation"].cumsum()
+    # 3. Calculate cumulative degradation (sum of degradation over the stint)
+    by_stint = degradation.groupby(stint[used])
+    cumulative = by_stint.cumsum()
 
     # 4. Calculate rolling average degradation (5-lap window)
-    df["degradation_rate"] = df["degradation"].rolling(window=5, min_periods=1).mean()
+    rate = by_stint.rolling(window=5, min_periods=1).mean().reset_index(level=0, drop=True)
 
     # 5. Ensure numeric consistency
-    df[["degradation", "cumulative_degradation", "degradation_rate"]] = (
-        df[["degradation", "cumulative_degradation", "degradation_rate"]].astype(float)
-    )
+    df["degradation"] = degradation.astype(float)
+    df["cumulative_degradation"] = cumulative.astype(float)
+    df["degradation_rate"] = rate.astype(float)
 
     return df
 
-def create_ai_context(df, current_lap):
+def race_data_version(csv_file):
     """
-    Format race data into text context for Gemini AI
-    
-    Args:
-        df (pandas.DataFrame): DataFrame with lap and degradation data
-        current_lap (int): Current lap number
-        
-    Returns:
-        str: Formatted text context describing tire performance trends
+    Version tag of a race CSV (path + mtime), for keying cached results such as
+    AI contexts. Returns None if the file doesn't exist.
     """
-    if df.empty:
-        return "No race data available."
+    try:
+        return f"{os.path.abspath(csv_file)}@{os.stat(csv_file).st_mtime_ns}"
+    except OSError:
+        return None
 
-    if current_lap not in df["LapNumber"].values:
-        return f"Lap {current_lap} not found in dataset."
 
-    # ---------------------------------------------------------------------
-    # 1. Extract the last 10 laps up to the current lap
-    # ---------------------------------------------------------------------
-    last_laps = df[df["LapNumber"] <= current_lap].tail(10)
+def _format_lap_lines(df):
+    """
+    Internal: "Lap NN: time=..s, deg=..s" line for every row ("deg=excluded" on
+    pit and SC/VSC laps), formatted with vectorized NumPy string operations
+    instead of a Python loop.
+    """
+    numbers = np.char.mod("%2d", df["LapNumber"].to_numpy(dtype=int))
+    times = np.char.mod("%.3f", df["LapTime_seconds"].to_numpy(dtype=float))
+    deg = df["degradation"].to_numpy(dtype=float)
+    degs = np.where(np.isnan(deg), "excluded", np.char.add(np.char.mod("%.3f", deg), "s"))
+    lines = np.char.add(np.char.add(np.char.add("Lap ", numbers), ": time="), times)
+    return np.char.add(np.char.add(lines, "s, deg="), degs).tolist()
 
+
+def _build_context(last_laps, lap_lines, current_lap, window):
+    """Internal: assemble the context text for one lap from its window of laps."""
     # ---------------------------------------------------------------------
-    # 2. Gather general info
+    # 1. Gather general info
     # ---------------------------------------------------------------------
     latest = last_laps.iloc[-1]
     tire_compound = latest.get("Compound", "Unknown")
     tire_age = int(latest.get("TyreLife", 0))
     avg_degradation = round(last_laps["degradation_rate"].mean(), 3) if "degradation_rate" in last_laps else None
-    track_temp = latest.get("TrackTemp", None) if "TrackTemp" in df.columns else None
+    track_temp = latest.get("TrackTemp", None) if "TrackTemp" in last_laps.columns else None
 
     # ---------------------------------------------------------------------
-    # 3. Analyze pattern (acceleration/deceleration of degradation)
+    # 2. Analyze pattern (acceleration/deceleration of degradation)
     # ---------------------------------------------------------------------
     pattern = "stable"
     if "degradation_rate" in last_laps:
@@ -132,26 +397,14 @@ def create_ai_context(df, current_lap):
                 pattern = "degradation slowing down"
 
     # ---------------------------------------------------------------------
-    # 4. Format the recent laps into readable text
-    # ---------------------------------------------------------------------
-    lap_lines = []
-    for _, row in last_laps.iterrows():
-        lap_lines.append(
-            f"Lap {int(row['LapNumber']):>2}: "
-            f"time={row['LapTime_seconds']:.3f}s, "
-            f"deg={row['degradation']:.3f}s"
-        )
-    laps_text = "\n".join(lap_lines)
-
-    # ---------------------------------------------------------------------
-    # 5. Build final AI-readable structured context
+    # 3. Build final AI-readable structured context
     # ---------------------------------------------------------------------
     context = [
         "=== F1 Tire Performance Context ===",
         f"Current Lap: {current_lap}",
         f"Tire Compound: {tire_compound}",
         f"Tire Age (laps): {tire_age}",
-        f"Average Degradation Rate (last 10 laps): {avg_degradation} s/lap",
+        f"Average Degradation Rate (last {window} laps): {avg_degradation} s/lap",
     ]
 
     if track_temp is not None and not pd.isna(track_temp):
@@ -159,7 +412,146 @@ def create_ai_context(df, current_lap):
 
     context.append(f"Performance Pattern: {pattern}")
     context.append("\nRecent Lap Data:")
-    context.append(laps_text)
+    context.append("\n".join(lap_lines))
     context.append("\nSummary: Tire degradation appears to be " + pattern + ".")
 
     return "\n".join(context)
+
+
+def create_ai_contexts(df, laps=None, window=AI_CONTEXT_WINDOW, version=None, driver=None):
+    """
+    Build the AI context of many laps in one call
+
+    Lap lines are formatted once for the whole frame; each context then only
+    slices its window. With a version (e.g. race_data_version(csv_file)),
+    contexts are cached under (version, driver, lap, window), so slider moves
+    and batch jobs reuse them.
+
+    Args:
+        df (pandas.DataFrame): DataFrame with lap and degradation data, in lap order
+        laps (list): Lap numbers to build contexts for (default: every lap in df)
+        window (int): Number of recent laps described in each context
+        version (str): Dataset version; enables caching when given
+        driver (str): Driver the frame belongs to (part of the cache key)
+
+    Returns:
+        dict: {lap number: context text}
+    """
+    if laps is None:
+        laps = df["LapNumber"].tolist() if not df.empty else []
+
+    contexts = {}
+    missing = []
+    with _context_cache_lock:
+        for lap in laps:
+            key = (version, driver, int(lap), window)
+            if version is not None and key in _context_cache:
+                _context_cache.move_to_end(key)
+                contexts[int(lap)] = _context_cache[key]
+            else:
+                missing.append(int(lap))
+    if not missing:
+        return contexts
+
+    if df.empty:
+        return {**contexts, **{lap: "No race data available." for lap in missing}}
+
+    lap_numbers = df["LapNumber"].to_numpy()
+    lap_lines = None
+    present = set(lap_numbers.tolist())
+    # Laps up to L = rows before the first lap number above L (df is in lap order)
+    ends = np.searchsorted(lap_numbers, missing, side="right")
+
+    built = {}
+    for lap, end in zip(missing, ends):
+        if lap not in present:
+            built[lap] = f"Lap {lap} not found in dataset."
+            continue
+        if lap_lines is None:
+            lap_lines = _format_lap_lines(df)
+        start = max(0, end - window)
+        built[lap] = _build_context(df.iloc[start:end], lap_lines[start:end], lap, window)
+
+    if version is not None:
+        with _context_cache_lock:
+            for lap, text in built.items():
+                _context_cache[(version, driver, lap, window)] = text
+            while len(_context_cache) > AI_CONTEXT_CACHE_SIZE:
+                _context_cache.popitem(last=False)
+
+    return {**contexts, **built}
+
+
+def create_ai_context(df, current_lap, window=AI_CONTEXT_WINDOW, version=None, driver=None):
+    """
+    Format race data into text context for Gemini AI
+    
+    Args:
+        df (pandas.DataFrame): DataFrame with lap and degradation data
+        current_lap (int): Current lap number
+        window (int): Number of recent laps to describe
+        version (str): Dataset version; enables caching when given
+        driver (str): Driver the frame belongs to (part of the cache key)
+        
+    Returns:
+        str: Formatted text context describing tire performance trends
+    """
+    if df.empty:
+        return "No race data available."
+
+    return create_ai_contexts(df, [current_lap], window, version, driver)[int(current_lap)]
+
+
+def current_stint_summary(df, current_lap):
+    """
+    Summary statistics of the current stint, for compact prompts
+
+    The stint starts after the last compound change or tire age reset (as in
+    local_model.predict_local). The slope is a least-squares fit of lap time
+    against tire age over the clean laps (no lap 1, no out-lap, no SC/VSC
+    lap); the spread is the standard deviation of its residuals.
+
+    Args:
+        df (pandas.DataFrame): One driver's laps in the canonical schema, in lap order
+        current_lap (int): Current lap number (only laps up to it are used)
+
+    Returns:
+        dict | None: {"laps": DataFrame of the stint, "compound", "age", "slope",
+                      "spread", "best", "last", "track_temp"}, None without laps
+    """
+    history = df[df["LapNumber"] <= current_lap]
+    if history.empty:
+        return None
+
+    compounds = history["Compound"].to_numpy(dtype=object) if "Compound" in history else None
+    tire_age = history["TyreLife"].to_numpy(dtype=float) if "TyreLife" in history else None
+    start = 0
+    if compounds is not None and tire_age is not None:
+        boundary = np.flatnonzero((compounds[1:] != compounds[:-1]) | (tire_age[1:] <= tire_age[:-1]))
+        start = int(boundary[-1]) + 1 if len(boundary) else 0
+    stint = history.iloc[start:]
+
+    clean = stint.iloc[1:] if start > 0 else stint
+    clean = clean[clean["LapNumber"] > 1]
+    if "exclude_from_fit" in clean.columns:
+        clean = clean[~clean["exclude_from_fit"].astype(bool)]
+    x = clean["TyreLife"].to_numpy(dtype=float) if "TyreLife" in clean else clean["LapNumber"].to_numpy(dtype=float)
+    y = clean["LapTime_seconds"].to_numpy(dtype=float)
+    slope, spread = None, None
+    if len(clean) >= 2 and np.ptp(x) > 0:
+        xd, yd = x - x.mean(), y - y.mean()
+        slope = float(xd @ yd / (xd @ xd))
+        spread = float(np.std(yd - slope * xd))
+
+    latest = stint.iloc[-1]
+    track_temp = latest.get("TrackTemp") if "TrackTemp" in stint.columns else None
+    return {
+        "laps": stint,
+        "compound": str(latest.get("Compound", "Unknown")),
+        "age": int(latest.get("TyreLife", len(stint))),
+        "slope": slope,
+        "spread": spread,
+        "best": float(y.min()) if len(y) else float(stint["LapTime_seconds"].min()),
+        "last": float(latest["LapTime_seconds"]),
+        "track_temp": None if track_temp is None or pd.isna(track_temp) else float(track_temp),
+    }
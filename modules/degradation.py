@@ -0,0 +1,343 @@
+"""
+Tire degradation engines beyond data_processor.calculate_degradation.
+
+Incremental (live / replay mode): calculate_degradation recomputes diff,
+cumsum and a 5-lap rolling mean over the whole DataFrame, which makes every
+new lap O(n). The accumulators below take one lap at a time and update the
+same three metrics in constant time (the rolling window is a fixed-size ring
+buffer), producing exactly the values calculate_degradation returns when fed
+the stints and excluded laps of lap_flags.
+
+Batch (whole seasons): stint_degradation segments every driver's race into
+stints and computes per-stint metrics for all drivers of all races at once,
+with vectorized NumPy / groupby operations instead of a loop per driver.
+"""
+
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from modules import lap_store
+
+ROLLING_WINDOW = 5  # Same window as data_processor.calculate_degradation
+DEGRADATION_COLUMNS = ["degradation", "cumulative_degradation", "degradation_rate"]
+
+# Lap time gained per lap of fuel burned, used by the optional fuel correction
+FUEL_EFFECT_S_PER_LAP = 0.03
+RACE_KEYS = ["season", "event", "session"]
+
+# Converted session lap columns -> lap store names used by stint_degradation
+SESSION_LAP_COLUMNS = {"compound": "tire_compound", "tyre_life": "tire_age"}
+
+
+class DegradationAccumulator:
+    """Degradation state of one driver (or one stint), updated lap by lap."""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """Forget all laps, e.g. at the start of a new stint."""
+        self.laps = 0
+        self.last_lap_time = None
+        self.cumulative_degradation = 0.0
+        self._recent = deque(maxlen=self.window)
+
+    def update(self, lap_time, excluded=False):
+        """
+        Add one lap.
+
+        Args:
+            lap_time (float): Lap time in seconds
+            excluded (bool): Pit or SC/VSC lap; left out of the metrics (all NaN)
+
+        Returns:
+            dict: degradation, cumulative_degradation and degradation_rate after this lap
+        """
+        if excluded:
+            return dict.fromkeys(DEGRADATION_COLUMNS, np.nan)
+
+        lap_time = float(lap_time)
+        # First lap has no previous lap to compare against
+        degradation = 0.0 if self.last_lap_time is None else lap_time - self.last_lap_time
+
+        self.laps += 1
+        self.last_lap_time = lap_time
+        self.cumulative_degradation += degradation
+        self._recent.append(degradation)
+
+        return {
+            "degradation": degradation,
+            "cumulative_degradation": self.cumulative_degradation,
+            # Summing the (fixed-size) window keeps the result identical to pandas' rolling mean
+            "degradation_rate": sum(self._recent) / len(self._recent),
+        }
+
+
+class DegradationTracker:
+    """One accumulator per driver, or per (driver, stint) when stints are given."""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self._states = {}
+
+    def update(self, driver, lap_time, stint=None, excluded=False):
+        """
+        Add one lap of one driver.
+
+        Args:
+            driver (str): Driver code or key
+            lap_time (float): Lap time in seconds
+            stint (int): Stint number; a new stint starts a fresh accumulator
+            excluded (bool): Pit or SC/VSC lap; left out of the metrics
+
+        Returns:
+            dict: Degradation metrics after this lap
+        """
+        key = driver if stint is None else (driver, stint)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = DegradationAccumulator(self.window)
+        return state.update(lap_time, excluded)
+
+    def state(self, driver, stint=None):
+        """Current accumulator of a driver (None if no laps yet)."""
+        return self._states.get(driver if stint is None else (driver, stint))
+
+
+def accumulate_degradation(df, window=ROLLING_WINDOW):
+    """
+    Batch mode: run the accumulator over a whole DataFrame.
+
+    Gives the same columns and values as calculate_degradation (fresh
+    accumulator per stint, excluded laps left out), so the streaming and batch
+    paths can be cross-checked.
+
+    Args:
+        df (DataFrame): Must contain 'LapTime_seconds', one driver in lap order
+
+    Returns:
+        DataFrame with added degradation, cumulative_degradation and degradation_rate columns
+    """
+    if df.empty or "LapTime_seconds" not in df.columns:
+        return df
+
+    stint, excluded = lap_flags(df)
+    acc = DegradationAccumulator(window)
+    rows = []
+    for i, t in enumerate(df["LapTime_seconds"].to_numpy(dtype=float)):
+        if i and stint[i] != stint[i - 1]:
+            acc.reset()
+        rows.append(acc.update(t, excluded[i]))
+
+    df = df.copy()
+    df[DEGRADATION_COLUMNS] = pd.DataFrame(rows, index=df.index, columns=DEGRADATION_COLUMNS)
+    return df
+
+
+def _pit_stops(new_driver, compound, age):
+    """
+    Internal: stint boundaries of consecutive laps.
+
+    A new stint starts with a new driver, a compound change or a tire age that
+    does not increase; its first lap is the out-lap and the lap before it the
+    in-lap (not for a driver's first stint).
+
+    Returns:
+        tuple: (new_stint, in_lap, out_lap) boolean arrays
+    """
+    new_stint = new_driver.copy()
+    new_stint[1:] |= (compound[1:] != compound[:-1]) | (age[1:] <= age[:-1])
+    out_lap = new_stint & ~new_driver
+    in_lap = np.r_[out_lap[1:], False]
+    return new_stint, in_lap, out_lap
+
+
+def lap_flags(df):
+    """
+    Stint number and excluded flag of every lap of one driver's race.
+
+    Same rules as stint_degradation: pit in-laps and out-laps (from compound /
+    tyre age changes and the pit_in / pit_out columns) and laps flagged
+    exclude_from_fit (SC / VSC, see track_status.py) are excluded.
+
+    Args:
+        df (DataFrame): Canonical schema (Compound, TyreLife), in lap order
+
+    Returns:
+        tuple: (stint, excluded) NumPy arrays, stints numbered from 1
+    """
+    n = len(df)
+    compound = df["Compound"].astype(str).to_numpy() if "Compound" in df.columns else np.zeros(n)
+    # Without tyre ages the whole race is one stint
+    age = df["TyreLife"].to_numpy(dtype=float) if "TyreLife" in df.columns else np.arange(n, dtype=float)
+
+    new_driver = np.r_[True, np.zeros(max(n - 1, 0), dtype=bool)][:n]
+    new_stint, in_lap, out_lap = _pit_stops(new_driver, compound, age)
+
+    excluded = in_lap | out_lap
+    for col in ("pit_in", "pit_out", "exclude_from_fit"):
+        if col in df.columns:
+            excluded |= df[col].to_numpy(dtype=bool)
+    return np.cumsum(new_stint), excluded
+
+
+# -------------------------------------------------------------------------
+# Batch, stint-aware degradation for many drivers and races
+# -------------------------------------------------------------------------
+def load_season_laps(season=None, store_dir=lap_store.STORE_DIR):
+    """
+    Read every lap of a season (or of the whole store) with its partition keys.
+
+    Returns:
+        pandas.DataFrame: season, event, session, driver + lap columns
+    """
+    return lap_store.read_laps(season=season, columns=RACE_KEYS + ["driver"] + lap_store.LAP_COLUMNS,
+                               store_dir=store_dir)
+
+
+def stint_degradation(laps, fuel_effect=None, exclude_pit_laps=True, window=ROLLING_WINDOW):
+    """
+    Per-stint degradation for every driver of every race in one vectorized pass.
+
+    A new stint starts when the driver (or race) changes, the compound changes
+    or the tire age does not increase. Degradation, cumulative degradation and
+    the rolling rate restart at every stint, so pit stops no longer show up as
+    huge lap-to-lap jumps.
+
+    Args:
+        laps (DataFrame): lap_number, lap_time (or lap_time_ms), tire_compound,
+                          tire_age, plus any of season / event / session / driver;
+                          compact tables (see compact_laps.py) and converted
+                          session laps (see columnar_sessions.py) work as-is;
+                          pit_in / pit_out / exclude_from_fit flags (see
+                          track_status.py) are honoured when present
+        fuel_effect (float): Seconds per lap of fuel load to remove from lap times
+                             (e.g. FUEL_EFFECT_S_PER_LAP); None disables the correction
+        exclude_pit_laps (bool): Leave in-laps and out-laps out of the metrics
+        window (int): Rolling window for degradation_rate
+
+    Returns:
+        DataFrame sorted by race, driver and lap, with added columns:
+        - stint: stint number per driver (1, 2, ...)
+        - is_pit_lap: in-lap or out-lap of a pit stop
+        - excluded: left out of the metrics (pit lap or flagged exclude_from_fit)
+        - fuel_corrected_lap_time: lap time minus the fuel effect (lap_time if disabled)
+        - degradation, cumulative_degradation, degradation_rate: within the stint
+          (NaN on excluded laps)
+    """
+    laps = laps.rename(columns={k: v for k, v in SESSION_LAP_COLUMNS.items() if v not in laps.columns})
+    keys = [k for k in RACE_KEYS + ["driver"] if k in laps.columns]
+    df = laps.sort_values(keys + ["lap_number"], kind="stable").reset_index(drop=True)
+    n = len(df)
+    if n == 0:
+        return df.assign(stint=pd.Series(dtype="int16"), is_pit_lap=pd.Series(dtype=bool),
+                         excluded=pd.Series(dtype=bool),
+                         fuel_corrected_lap_time=pd.Series(dtype=float),
+                         **{col: pd.Series(dtype=float) for col in DEGRADATION_COLUMNS})
+
+    # ---------------------------------------------------------------------
+    # 1. Segment drivers and stints
+    # ---------------------------------------------------------------------
+    group = df.groupby(keys, sort=False, observed=True).ngroup().to_numpy() if keys else np.zeros(n, dtype=int)
+    compound = df["tire_compound"]
+    # Compare integer codes when the compound is categorical (compact tables)
+    compound = compound.cat.codes.to_numpy() if isinstance(compound.dtype, pd.CategoricalDtype) \
+        else compound.astype(str).to_numpy()
+    age = df["tire_age"].to_numpy(dtype=float)
+
+    new_driver = np.r_[True, group[1:] != group[:-1]]
+    new_stint, in_lap, out_lap = _pit_stops(new_driver, compound, age)
+
+    stint_id = np.cumsum(new_stint) - 1
+    first_stint_of_driver = np.maximum.accumulate(np.where(new_driver, stint_id, 0))
+    df["stint"] = (stint_id - first_stint_of_driver + 1).astype("int16")
+
+    is_pit_lap = in_lap | out_lap
+    for col in ("pit_in", "pit_out"):
+        if col in df.columns:
+            is_pit_lap |= df[col].to_numpy(dtype=bool)
+    df["is_pit_lap"] = is_pit_lap
+
+    excluded = is_pit_lap.copy() if exclude_pit_laps else np.zeros(n, dtype=bool)
+    if "exclude_from_fit" in df.columns:
+        excluded |= df["exclude_from_fit"].to_numpy(dtype=bool)
+    df["excluded"] = excluded
+
+    # ---------------------------------------------------------------------
+    # 2. Optional fuel correction (cars get lighter every lap)
+    # ---------------------------------------------------------------------
+    if "lap_time" in df.columns:
+        lap_time = df["lap_time"].to_numpy(dtype=float)
+    else:
+        lap_time = df["lap_time_ms"].to_numpy(dtype=float, na_value=np.nan) / 1000.0
+    if fuel_effect:
+        race_keys = [k for k in RACE_KEYS if k in df.columns]
+        race_laps = (df.groupby(race_keys, sort=False, observed=True)["lap_number"].transform("max")
+                     if race_keys else df["lap_number"].max())
+        laps_to_go = np.asarray(race_laps, dtype=float) - df["lap_number"].to_numpy(dtype=float)
+        lap_time = lap_time - fuel_effect * laps_to_go
+    df["fuel_corrected_lap_time"] = lap_time
+
+    # ---------------------------------------------------------------------
+    # 3. Degradation metrics within each stint
+    # ---------------------------------------------------------------------
+    used = ~excluded & ~np.isnan(lap_time)
+    seg = stint_id[used]
+    times = lap_time[used]
+    m = len(times)
+
+    seg_start = np.r_[True, seg[1:] != seg[:-1]] if m else np.zeros(0, dtype=bool)
+    degradation = np.r_[0.0, np.diff(times)] if m else np.zeros(0)
+    degradation[seg_start] = 0.0
+
+    cumulative = pd.Series(degradation).groupby(seg).cumsum().to_numpy()
+
+    # Rolling mean from prefix sums: window sum = csum[i] - csum[max(i - window, start - 1)]
+    idx = np.arange(m)
+    start = np.maximum.accumulate(np.where(seg_start, idx, 0))
+    csum = np.r_[0.0, np.cumsum(degradation)]
+    lower = np.maximum(idx + 1 - window, start)
+    rate = (csum[idx + 1] - csum[lower]) / (idx + 1 - lower)
+
+    for col, values in zip(DEGRADATION_COLUMNS, (degradation, cumulative, rate)):
+        full = np.full(n, np.nan)
+        full[used] = values
+        df[col] = full
+
+    return df
+
+
+def stint_summary(df):
+    """
+    One row per stint from the output of stint_degradation.
+
+    Returns:
+        DataFrame with compound, laps, start/end tire age, mean fuel-corrected
+        lap time and degradation_per_lap (least-squares slope of fuel-corrected
+        lap time against tire age, excluded laps left out)
+    """
+    keys = [k for k in RACE_KEYS + ["driver"] if k in df.columns] + ["stint"]
+    clean = df[~df["excluded"]].assign(
+        x=lambda d: d["tire_age"].astype(float),
+        y=lambda d: d["fuel_corrected_lap_time"],
+    )
+    clean = clean.assign(xy=clean["x"] * clean["y"], xx=clean["x"] ** 2)
+
+    grouped = clean.groupby(keys, sort=False, observed=True)
+    sums = grouped[["x", "y", "xy", "xx"]].sum()
+    count = grouped.size()
+    denom = count * sums["xx"] - sums["x"] ** 2
+    slope = (count * sums["xy"] - sums["x"] * sums["y"]) / denom.where(denom != 0)
+
+    stints = df.groupby(keys, sort=False, observed=True)
+    return pd.DataFrame({
+        "compound": stints["tire_compound"].first().astype(str),
+        "laps": stints.size(),
+        "start_age": stints["tire_age"].first(),
+        "end_age": stints["tire_age"].last(),
+        "mean_lap_time": grouped["y"].mean(),
+        "degradation_per_lap": slope,
+    }).reset_index()
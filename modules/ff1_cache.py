@@ -0,0 +1,74 @@
+"""
+Helpers for reading the FastF1 on-disk cache without FastF1.
+
+Every ``.ff1pkl`` file is a pickled ``{"version": ..., "data": ...}`` dict whose
+payload is plain Python / pandas data, so session metadata can be read offline
+(and much faster than through a full FastF1 session load).
+"""
+
+import glob
+import os
+import pickle
+
+from config import CACHE_DIR
+from modules.shared_cache import default_cache
+
+# Cache roots searched in order (one shared cache, see modules/shared_cache.py)
+CACHE_ROOTS = [CACHE_DIR]
+
+
+def read_ff1pkl(path):
+    """
+    Load the payload of one cached FastF1 file.
+
+    Args:
+        path (str): Path to a ``.ff1pkl`` file
+
+    Returns:
+        object: The cached data (dict, DataFrame, tuple, ...)
+    """
+    with open(path, "rb") as f:
+        cached = pickle.load(f)
+    if isinstance(cached, dict) and "data" in cached:
+        return cached["data"]
+    return cached
+
+
+def read_session_file(session_dir, name):
+    """
+    Load ``<session_dir>/<name>.ff1pkl``.
+
+    Returns:
+        object | None: The cached data, or None if the file doesn't exist
+    """
+    path = os.path.join(session_dir, f"{name}.ff1pkl")
+    # Counts as a hit/miss and keeps the session warm in the LRU order
+    default_cache().touch_path(path)
+    if not os.path.exists(path):
+        return None
+    return read_ff1pkl(path)
+
+
+def find_session_dirs(cache_roots=CACHE_ROOTS):
+    """
+    Find every cached session directory (one that has a session_info file).
+
+    Sessions present under several roots are only returned once, from the
+    first root that has them.
+
+    Returns:
+        list[str]: Session directories, e.g.
+                   cache/2024/2024-03-02_Bahrain_Grand_Prix/2024-03-02_Race
+    """
+    seen = set()
+    session_dirs = []
+    for root in cache_roots:
+        pattern = os.path.join(root, "[0-9][0-9][0-9][0-9]", "*", "*", "session_info.ff1pkl")
+        for info_path in sorted(glob.glob(pattern)):
+            session_dir = os.path.dirname(info_path)
+            rel = os.path.relpath(session_dir, root)
+            if rel in seen:
+                continue
+            seen.add(rel)
+            session_dirs.append(session_dir)
+    return session_dirs
@@ -0,0 +1,333 @@
+"""
+Shared async Gemini client.
+
+The API key is configured once and GenerativeModel handles are reused per
+model name. Every request gets a deadline, transient failures (rate limits,
+5xx, timeouts) are retried with exponential backoff and full jitter.
+generate_many fans many prompts out concurrently under a semaphore, and
+stream_async yields the response text chunk by chunk as the model produces it.
+
+The coroutines here must all run on one event loop: the cached model handles
+(and the gRPC channels behind them) are bound to the loop they were first used
+on. Sync callers (Streamlit, scripts) therefore go through
+gemini_scheduler.default_scheduler() (generate / stream / submit), which runs
+every request on its own persistent loop thread; only code already running on
+that loop calls generate_async() / generate_many() / stream_async() directly.
+
+Model handles come from a pluggable provider: "gemini" (google.generativeai),
+"standin" (offline, deterministic; see standin_gemini.py), or "record" /
+"replay" (cassettes for reproducible runs; see cassette.py), chosen with
+F1_GEMINI_PROVIDER or use_provider(). A provider is any factory
+model_name -> object with generate_content_async(prompt, stream=False).
+
+Every successful call is logged with its prompt / response token counts and
+latency (usage_stats()), so latency per token can be tracked across prompt
+formats. Counts come from the response's usage_metadata when the provider
+reports it, else from the approx_tokens estimate.
+"""
+
+import asyncio
+import math
+import random
+import statistics
+import threading
+import time
+from collections import deque
+
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+
+from config import (
+    API_KEY,
+    CASSETTE_SOURCE,
+    GEMINI_BACKOFF_BASE,
+    GEMINI_CONCURRENCY,
+    GEMINI_MAX_RETRIES,
+    GEMINI_PROVIDER,
+    GEMINI_TIMEOUT,
+)
+from modules.cassette import RecordingModel, ReplayModel, open_cassette
+from modules.standin_gemini import StandInModel
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+# Backoff never waits longer than this between attempts
+MAX_BACKOFF = 30.0
+# Rough size of a token for estimates (Gemini averages about 4 characters)
+CHARS_PER_TOKEN = 4
+# Calls kept for the token usage statistics
+USAGE_SAMPLES = 1000
+
+# Errors worth retrying: quota / rate limits, server-side failures, deadlines
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    asyncio.TimeoutError,
+    ConnectionError,
+)
+# Retryable errors that mean the quota is exhausted (reported to on_rate_limit)
+RATE_LIMIT_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+
+_models = {}
+_configured = False
+_provider = GEMINI_PROVIDER
+_lock = threading.Lock()
+_usage = deque(maxlen=USAGE_SAMPLES)
+_usage_lock = threading.Lock()
+
+
+class GeminiError(RuntimeError):
+    """A Gemini request failed (missing key, non-retryable error or retries exhausted)."""
+
+
+def _gemini_model(model_name):
+    """google.generativeai model (configures the API key on first use)."""
+    global _configured
+    if not _configured:
+        if not API_KEY:
+            raise GeminiError("Missing Gemini API key. Please set it in your .env file as GEMINI_API_KEY=your_key_here.")
+        genai.configure(api_key=API_KEY)
+        _configured = True
+    return genai.GenerativeModel(model_name)
+
+
+def _recording_model(model_name):
+    """Model of F1_CASSETTE_SOURCE whose answers are appended to the cassette."""
+    return RecordingModel(model_name, PROVIDERS[CASSETTE_SOURCE](model_name), open_cassette())
+
+
+def _replay_model(model_name):
+    """Answers served from the cassette (no network)."""
+    return ReplayModel(model_name, open_cassette())
+
+
+PROVIDERS = {
+    "gemini": _gemini_model,
+    "standin": StandInModel,
+    "record": _recording_model,
+    "replay": _replay_model,
+}
+
+
+def register_provider(name, factory):
+    """Make a model factory (model_name -> model) selectable by name."""
+    PROVIDERS[name] = factory
+
+
+def use_provider(name):
+    """Switch every later request to another provider (drops cached model handles)."""
+    global _provider
+    if name not in PROVIDERS:
+        raise GeminiError(f"Unknown Gemini provider: {name}")
+    with _lock:
+        _provider = name
+        _models.clear()
+
+
+def get_model(model_name=DEFAULT_MODEL):
+    """
+    Shared model handle of the active provider, created on first use.
+
+    Raises:
+        GeminiError: Unknown provider, or GEMINI_API_KEY is not set for "gemini"
+    """
+    with _lock:
+        model = _models.get(model_name)
+        if model is None:
+            factory = PROVIDERS.get(_provider)
+            if factory is None:
+                raise GeminiError(f"Unknown Gemini provider: {_provider}")
+            model = _models[model_name] = factory(model_name)
+        return model
+
+
+def approx_tokens(text):
+    """Estimated token count of a text (CHARS_PER_TOKEN characters per token)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _record_usage(model_name, prompt, text, response, started):
+    """Internal: log the token counts and latency of one successful call."""
+    latency_ms = (time.perf_counter() - started) * 1000
+    metadata = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(metadata, "prompt_token_count", None)
+    response_tokens = getattr(metadata, "candidates_token_count", None)
+    estimated = not (prompt_tokens and response_tokens)
+    if estimated:
+        prompt_tokens, response_tokens = approx_tokens(prompt), approx_tokens(text)
+    with _usage_lock:
+        _usage.append({
+            "model": model_name,
+            "prompt_tokens": prompt_tokens,
+            "response_tokens": response_tokens,
+            "latency_ms": round(latency_ms, 1),
+            "ms_per_response_token": round(latency_ms / max(1, response_tokens), 3),
+            "estimated": estimated,
+        })
+
+
+def usage_log():
+    """The most recent calls (up to USAGE_SAMPLES), oldest first."""
+    with _usage_lock:
+        return list(_usage)
+
+
+def usage_stats():
+    """
+    Token and latency summary of the logged calls.
+
+    Returns:
+        dict: calls, mean prompt / response tokens, latency and ms per response
+              token (mean and p95), share of estimated counts
+    """
+    calls = usage_log()
+    if not calls:
+        return {"calls": 0}
+    per_token = sorted(c["ms_per_response_token"] for c in calls)
+    return {
+        "calls": len(calls),
+        "prompt_tokens_mean": round(statistics.fmean(c["prompt_tokens"] for c in calls), 1),
+        "response_tokens_mean": round(statistics.fmean(c["response_tokens"] for c in calls), 1),
+        "latency_ms_mean": round(statistics.fmean(c["latency_ms"] for c in calls), 1),
+        "ms_per_response_token_mean": round(statistics.fmean(per_token), 3),
+        "ms_per_response_token_p95": per_token[min(len(per_token) - 1, int(0.95 * len(per_token)))],
+        "estimated_share": round(sum(c["estimated"] for c in calls) / len(calls), 2),
+    }
+
+
+def clear_usage():
+    with _usage_lock:
+        _usage.clear()
+
+
+def backoff_delay(attempt, base=GEMINI_BACKOFF_BASE):
+    """Full-jitter exponential backoff: uniform in [0, base * 2**(attempt - 1)], capped."""
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** (attempt - 1)))
+
+
+async def generate_async(prompt, model_name=DEFAULT_MODEL, timeout=GEMINI_TIMEOUT,
+                         max_retries=GEMINI_MAX_RETRIES, on_rate_limit=None):
+    """
+    Generate a response with a per-attempt deadline and retries.
+
+    Args:
+        prompt (str): Prompt text
+        model_name (str): Gemini model
+        timeout (float): Deadline of one attempt in seconds
+        max_retries (int): Retries after the first attempt on transient errors
+        on_rate_limit (callable): Called with each quota error (see gemini_scheduler.py)
+
+    Returns:
+        str: Stripped response text
+
+    Raises:
+        GeminiError: Non-retryable error, empty response, or retries exhausted
+    """
+    model = get_model(model_name)
+    for attempt in range(1, max_retries + 2):
+        try:
+            started = time.perf_counter()
+            response = await asyncio.wait_for(model.generate_content_async(prompt), timeout)
+            text = response.text.strip() if response else ""
+            if not text:
+                raise GeminiError("Empty or invalid response from Gemini.")
+            _record_usage(model_name, prompt, text, response, started)
+            return text
+
+        except RETRYABLE_ERRORS as e:
+            if on_rate_limit and isinstance(e, RATE_LIMIT_ERRORS):
+                on_rate_limit(e)
+            if attempt > max_retries:
+                raise GeminiError(f"Gemini request failed after {attempt} attempts: {e!r}") from e
+            delay = backoff_delay(attempt)
+            print(f"[WARN] Gemini {type(e).__name__} (attempt {attempt}/{max_retries + 1}). "
+                  f"Retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+        except GeminiError:
+            raise
+        except Exception as e:
+            raise GeminiError(f"Gemini request failed: {e}") from e
+
+
+async def generate_many(prompts, model_name=DEFAULT_MODEL, concurrency=GEMINI_CONCURRENCY, **kwargs):
+    """
+    Generate responses for many prompts concurrently.
+
+    Args:
+        prompts (list[str]): Prompts
+        model_name (str): Gemini model
+        concurrency (int): Maximum requests in flight
+        **kwargs: timeout / max_retries (see generate_async)
+
+    Returns:
+        list[str | GeminiError]: One entry per prompt, in order; failures are
+        returned as the exception instead of cancelling the batch
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(prompt):
+        async with semaphore:
+            return await generate_async(prompt, model_name, **kwargs)
+
+    return await asyncio.gather(*(one(p) for p in prompts), return_exceptions=True)
+
+
+async def stream_async(prompt, model_name=DEFAULT_MODEL, timeout=GEMINI_TIMEOUT,
+                       max_retries=GEMINI_MAX_RETRIES, on_rate_limit=None):
+    """
+    Stream the response text chunk by chunk.
+
+    The request is retried like generate_async until the first chunk
+    arrives; once text has been yielded a failure is raised instead (a retry
+    would repeat output). timeout applies to the wait for each chunk.
+
+    Yields:
+        str: Response text chunks (unstripped)
+
+    Raises:
+        GeminiError: Non-retryable error, retries exhausted, or the stream broke
+    """
+    model = get_model(model_name)
+    for attempt in range(1, max_retries + 2):
+        started = False
+        try:
+            requested = time.perf_counter()
+            response = await asyncio.wait_for(model.generate_content_async(prompt, stream=True), timeout)
+            chunks = response.__aiter__()
+            received = []
+            chunk = None
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                text = chunk.text
+                if text:
+                    started = True
+                    received.append(text)
+                    yield text
+            if not started:
+                raise GeminiError("Empty or invalid response from Gemini.")
+            # The last chunk carries the usage metadata of the whole answer
+            _record_usage(model_name, prompt, "".join(received), chunk, requested)
+            return
+
+        except RETRYABLE_ERRORS as e:
+            if on_rate_limit and isinstance(e, RATE_LIMIT_ERRORS):
+                on_rate_limit(e)
+            if started:
+                raise GeminiError(f"Gemini stream interrupted: {e!r}") from e
+            if attempt > max_retries:
+                raise GeminiError(f"Gemini request failed after {attempt} attempts: {e!r}") from e
+            delay = backoff_delay(attempt)
+            print(f"[WARN] Gemini {type(e).__name__} (attempt {attempt}/{max_retries + 1}). "
+                  f"Retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+        except GeminiError:
+            raise
+        except Exception as e:
+            raise GeminiError(f"Gemini request failed: {e}") from e
@@ -62,68 +62,221 @@ def create_prediction_prompt(context, target_laps=15):
 
     return prompt
 
-import time
-import google.generativeai as genai
-from config import API_KEY
+from config import BATCH_TOKEN_BUDGET, PROMPT_TOKEN_BUDGET
+from modules import gemini_client
+from modules.data_processor import current_stint_summary
+from modules.gemini_client import GeminiError, approx_tokens
+from modules.gemini_scheduler import BATCH, INTERACTIVE, default_scheduler
+from modules.response_cache import default_response_cache
 
+GEMINI_MODEL = gemini_client.DEFAULT_MODEL
+# Lap table rows a compact prompt keeps whatever its token budget
+MIN_TABLE_ROWS = 4
+# Expected answer size of one forecast lap in the compact array format ("[36,95.812,0.85],")
+RESPONSE_TOKENS_PER_LAP = 6
 
-def get_prediction(prompt):
+
+def _stint_block(summary, budget=None, overhead=""):
+    """
+    Internal: "Stint: ..." statistics line, "lap,time_s" header and table rows
+    of one stint, truncated so that they plus overhead fit the token budget
+    (oldest rows first down to MIN_TABLE_ROWS, then the optional statistics).
+
+    Returns:
+        list[str]: Lines of the block
+    """
+    laps = summary["laps"]
+    rows = [f"{lap},{t:.3f}" for lap, t in zip(laps["LapNumber"].astype(int), laps["LapTime_seconds"])]
+
+    stats = [f"{summary['compound']} age {summary['age']}"]
+    if summary["slope"] is not None:
+        stats.append(f"slope {summary['slope']:+.3f}s/lap sd {summary['spread']:.3f}s")
+    stats.append(f"last {summary['last']:.3f}")
+    optional = [f"best {summary['best']:.3f}"]
+    if summary["track_temp"] is not None:
+        optional.append(f"track {summary['track_temp']:.1f}C")
+
+    def render():
+        return ["Stint: " + ", ".join(stats + optional), "lap,time_s", *rows]
+
+    def over():
+        return budget and approx_tokens(overhead + "\n".join(lines)) > budget
+
+    lines = render()
+    while over() and len(rows) > MIN_TABLE_ROWS:
+        rows.pop(0)
+        lines = render()
+    if over() and optional:
+        optional = []
+        lines = render()
+    return lines
+
+
+def create_compact_prediction_prompt(df, current_lap, target_laps=15, total_laps=None,
+                                     track_name=None, budget=PROMPT_TOKEN_BUDGET, driver=None):
+    """
+    Build a token-budgeted prompt: the current stint as a dense lap table,
+    its summary statistics, and a compact array answer format.
+
+    Over the budget (gemini_client.approx_tokens), the prompt is truncated by
+    these rules, in order:
+    1. Drop the oldest lap table rows, down to MIN_TABLE_ROWS
+    2. Drop the optional statistics (best lap, track temperature)
+    3. Send it anyway, with a warning
+
+    Args:
+        df (pandas.DataFrame): One driver's laps in the canonical schema, in lap order
+        current_lap (int): Current lap number (predictions start at the next lap)
+        target_laps (int): Number of future laps to predict
+        total_laps (int): Race distance (default: last lap in df)
+        track_name (str): Track shown in the header
+        budget (int): Token budget of the prompt (None: unlimited)
+        driver (str): Driver shown in the header (e.g. "Lewis HAMILTON"); omitted if None
+
+    Returns:
+        str | None: Prompt text asking for {"p": [[lap, time_s, confidence], ...], "r": str},
+                    None if there are no laps up to current_lap
+    """
+    summary = current_stint_summary(df, current_lap)
+    if summary is None:
+        print(f"[ERROR] No laps up to lap {current_lap} for a compact prompt.")
+        return None
+
+    total_laps = int(total_laps or df["LapNumber"].max())
+    first, last = current_lap + 1, min(current_lap + target_laps, total_laps)
+    header = (f"F1 {track_name + ' ' if track_name else ''}lap {current_lap}/{total_laps}"
+              f"{', ' + driver if driver else ''}. "
+              "Forecast lap times of the current tire stint.")
+    footer = [
+        f"Predict laps {first}-{last}, never past lap {total_laps}; times rise with tire wear.",
+        'Reply JSON only: {"p":[[lap,time_s,confidence 0-1],...],"r":"reasoning, max 25 words"}',
+    ]
+
+    block = _stint_block(summary, budget, overhead="\n".join([header, *footer]) + "\n")
+    prompt = "\n".join([header, *block, *footer])
+    if budget and approx_tokens(prompt) > budget:
+        print(f"[WARN] Compact prompt is ~{approx_tokens(prompt)} tokens, over the budget of {budget}.")
+    return prompt
+
+
+def create_batch_prediction_prompts(items, target_laps=15, total_laps=None, track_name=None,
+                                    budget=BATCH_TOKEN_BUDGET, section_budget=PROMPT_TOKEN_BUDGET):
+    """
+    Pack many (driver, lap) forecasts into as few prompts as the token budget allows.
+
+    Every item becomes one keyed block (compact stint table, truncated to
+    section_budget like create_compact_prediction_prompt). Blocks are packed
+    in order while the prompt plus the expected answer (RESPONSE_TOKENS_PER_LAP
+    per forecast lap) stays within budget; a block too large on its own still
+    gets a prompt of its own. The answer is keyed per block:
+    {"b": {key: [[lap, time_s, confidence], ...], ...}, "r": str}.
+
+    Args:
+        items (list[dict]): {"key": str, "df": laps DataFrame, "current_lap": int}
+        target_laps (int): Number of future laps to predict per item
+        total_laps (int): Race distance
+        track_name (str): Track shown in the header
+        budget (int): Token budget of one request (prompt + expected answer)
+        section_budget (int): Token budget of one item's block
+
+    Returns:
+        list[tuple[str, list[str]]]: (prompt, keys in it); items without laps
+        up to their current lap are left out
+    """
+    header = (f"F1 {track_name + ' ' if track_name else ''}race"
+              f"{f', {total_laps} laps' if total_laps else ''}. "
+              "Forecast lap times of each block's current tire stint; times rise with tire wear.")
+    footer = ('Reply JSON only, one entry per block key: '
+              '{"b":{"<key>":[[lap,time_s,confidence 0-1],...],...},"r":"reasoning, max 30 words"}')
+    fixed = approx_tokens(header) + approx_tokens(footer)
+
+    blocks = []
+    for item in items:
+        summary = current_stint_summary(item["df"], item["current_lap"])
+        if summary is None:
+            print(f"[WARN] No laps up to lap {item['current_lap']} for {item['key']}; left out of the batch.")
+            continue
+        current_lap = int(item["current_lap"])
+        last_lap = int(total_laps or item["df"]["LapNumber"].max())
+        first, last = current_lap + 1, min(current_lap + target_laps, last_lap)
+        title = f"[{item['key']}] predict laps {first}-{last}"
+        text = "\n".join([title, *_stint_block(summary, section_budget, overhead=title + "\n")])
+        cost = approx_tokens(text) + RESPONSE_TOKENS_PER_LAP * max(0, last - first + 1) + approx_tokens(item["key"])
+        blocks.append((item["key"], text, cost))
+
+    batches = []
+    keys, texts, used = [], [], fixed
+    for key, text, cost in blocks:
+        if keys and used + cost > budget:
+            batches.append(("\n".join([header, *texts, footer]), keys))
+            keys, texts, used = [], [], fixed
+        keys.append(key)
+        texts.append(text)
+        used += cost
+    if keys:
+        batches.append(("\n".join([header, *texts, footer]), keys))
+    return batches
+
+
+def get_prediction(prompt, bypass_cache=False, priority=INTERACTIVE, model_name=GEMINI_MODEL):
     """
     Send prompt to Gemini and get response
-    
+
+    Identical prompts are answered from the on-disk response cache
+    (see response_cache.py); errors are never cached. Requests go through the
+    process-wide scheduler (gemini_scheduler.py): quota-aware, prioritized,
+    and identical in-flight prompts share one call.
+
     Args:
         prompt (str): The prediction prompt
+        bypass_cache (bool): Always call Gemini (the fresh answer still refreshes the cache)
+        priority (int): INTERACTIVE (default) or BATCH
+        model_name (str): Gemini model to ask (the cache is keyed per model)
         
     Returns:
         str: AI response text or error message
     """
-    # ---------------------------------------------------------------------
-    # 1. Check for API key
-    # ---------------------------------------------------------------------
-    if not API_KEY:
-        return "[ERROR] Missing Gemini API key. Please set it in your .env file as GEMINI_API_KEY=your_key_here."
+    return get_predictions([prompt], bypass_cache=bypass_cache, priority=priority, model_name=model_name)[0]
 
-    # ---------------------------------------------------------------------
-    # 2. Initialize Gemini model
-    # ---------------------------------------------------------------------
-    try:
-        genai.configure(api_key=API_KEY)
-        model = genai.GenerativeModel("gemini-2.5-flash")
-    except Exception as e:
-        return f"[ERROR] Failed to initialize Gemini model: {e}"
 
-    # ---------------------------------------------------------------------
-    # 3. Attempt generation with retry logic
-    # ---------------------------------------------------------------------
-    max_retries = 3
-    for attempt in range(1, max_retries + 1):
-        try:
-            response = model.generate_content(prompt)
-            if not response or not response.text:
-                raise ValueError("Empty or invalid response from Gemini.")
-            return response.text.strip()
-
-        except Exception as e:
-            err_msg = str(e).lower()
-
-            # Network or quota related
-            if "rate limit" in err_msg or "quota" in err_msg:
-                print(f"[WARN] Rate limit reached (attempt {attempt}/{max_retries}). Retrying in 2s...")
-                time.sleep(2)
-            elif "network" in err_msg or "timeout" in err_msg:
-                print(f"[WARN] Network issue (attempt {attempt}/{max_retries}). Retrying in 2s...")
-                time.sleep(2)
-            else:
-                print(f"[ERROR] Unexpected error (attempt {attempt}/{max_retries}): {e}")
-                break
+def get_predictions(prompts, bypass_cache=False, priority=BATCH, model_name=GEMINI_MODEL):
+    """
+    Responses for many prompts: cache hits first, misses sent concurrently.
 
-    # ---------------------------------------------------------------------
-    # 4. If all retries failed
-    # ---------------------------------------------------------------------
-    return "[ERROR] Failed to get response from Gemini after multiple attempts."
+    Args:
+        prompts (list[str]): Prediction prompts
+        bypass_cache (bool): Always call Gemini
+        priority (int): Scheduler priority (BATCH by default)
+        model_name (str): Gemini model to ask (the cache is keyed per model)
+
+    Returns:
+        list[str]: One response or "[ERROR] ..." message per prompt, in order
+    """
+    cache = default_response_cache()
+    results = [None if bypass_cache else cache.get(model_name, p) for p in prompts]
+    # Each distinct missing prompt is requested once
+    missing = list(dict.fromkeys(p for p, r in zip(prompts, results) if r is None))
+    if not missing:
+        return results
+
+    scheduler = default_scheduler()
+    futures = {p: scheduler.submit(p, model_name, priority) for p in missing}
+
+    answers = {}
+    for prompt, future in futures.items():
+        try:
+            response = future.result()
+        except GeminiError as e:
+            print(f"[ERROR] {e}")
+            answers[prompt] = f"[ERROR] {e}"
+        else:
+            cache.put(model_name, prompt, response)
+            answers[prompt] = response
+    return [answers[p] if r is None else r for p, r in zip(prompts, results)]
 
 import json
 import re
+from math import isfinite
 
 
 def parse_prediction_response(response_text):
@@ -146,49 +299,94 @@ def parse_prediction_response(response_text):
         print("[ERROR] Invalid response_text: empty or non-string")
         return None
 
-    data = None
-
     # ---------------------------------------------------------------------
-    # 1. Try parsing as pure JSON directly
+    # 1. Single scan for the first JSON object with a "predictions" key
+    #    (bare JSON, ```json fences and surrounding prose all work)
     # ---------------------------------------------------------------------
-    try:
-        data = json.loads(response_text)
-        if isinstance(data, dict):
-            return _validate_prediction_json(data)
-    except Exception:
-        pass
+    data = extract_prediction_json(response_text)
+    if data is not None:
+        return _validate_prediction_json(data)
 
     # ---------------------------------------------------------------------
-    # 2. Extract JSON from Markdown code block ```json ... ```
+    # 2. Complete failure
     # ---------------------------------------------------------------------
-    try:
-        match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response_text, re.DOTALL | re.IGNORECASE)
-        if match:
-            json_text = match.group(1)
-            data = json.loads(json_text)
-            return _validate_prediction_json(data)
-    except Exception:
-        pass
+    print("[ERROR] Failed to parse Gemini response as JSON.")
+    return None
 
-    # ---------------------------------------------------------------------
-    # 3. Fallback: extract JSON-like content using regex (first {...})
-    # ---------------------------------------------------------------------
-    try:
-        match = re.search(r"(\{[\s\S]*\})", response_text)
-        if match:
-            json_text = match.group(1)
-            data = json.loads(json_text)
-            return _validate_prediction_json(data)
-    except Exception:
-        pass
 
-    # ---------------------------------------------------------------------
-    # 4. Complete failure
-    # ---------------------------------------------------------------------
-    print("[ERROR] Failed to parse Gemini response as JSON.")
+# NaN / Infinity literals decode as None, so they fail validation like null
+_DECODER = json.JSONDecoder(parse_constant=lambda name: None)
+_NUMBER = re.compile(r"\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*")
+
+
+def extract_prediction_json(text, keys=("predictions", "p")):
+    """
+    First JSON object in text that has one of keys ("predictions", or "p"
+    of the compact format, by default), in one forward scan.
+
+    Each "{" is decoded in place with the C scanner (raw_decode, brace and
+    string aware). A valid object without those keys is skipped as a whole;
+    a "{" that does not start valid JSON (prose, fences) is skipped by one
+    character. Bare JSON, ```json fences and surrounding prose all work.
+
+    Args:
+        text (str): Raw model response
+        keys (tuple[str]): Top-level keys that identify the answer object
+
+    Returns:
+        dict | None: The decoded object
+    """
+    pos = text.find("{")
+    while pos != -1:
+        try:
+            data, end = _DECODER.raw_decode(text, pos)
+        except ValueError:
+            pos = text.find("{", pos + 1)
+            continue
+        if isinstance(data, dict) and any(k in data for k in keys):
+            return data
+        pos = text.find("{", end)
     return None
 
 
+def parse_batch_response(response_text, keys=None):
+    """
+    Split a batched answer (create_batch_prediction_prompts) into per-key predictions.
+
+    Args:
+        response_text (str): Raw AI response, {"b": {key: [[lap, time, conf], ...]}, "r": str}
+        keys (list[str]): Keys the batch asked for (default: every key in the answer)
+
+    Returns:
+        dict | None: {"predictions": {key: [prediction, ...]}, "reasoning": str};
+                     keys that are missing or have no valid entry are left out.
+                     None if no batch object is found.
+    """
+    if not response_text or not isinstance(response_text, str):
+        print("[ERROR] Invalid response_text: empty or non-string")
+        return None
+
+    data = extract_prediction_json(response_text, keys=("b",))
+    if data is None or not isinstance(data.get("b"), dict):
+        print("[ERROR] No batch JSON object found in Gemini response.")
+        return None
+
+    answers = data["b"]
+    predictions = {}
+    for key in (keys if keys is not None else list(answers)):
+        entries = answers.get(key)
+        if not isinstance(entries, list):
+            continue
+        cleaned = [c for c in map(_clean_prediction, entries) if c is not None]
+        if cleaned:
+            predictions[key] = cleaned
+
+    reasoning = data.get("r")
+    if not reasoning or not isinstance(reasoning, str):
+        reasoning = "No reasoning provided."
+    return {"predictions": predictions, "reasoning": reasoning}
+
+
 def _validate_prediction_json(data):
     """
     Internal: validate and normalize the parsed JSON.
@@ -197,8 +395,9 @@ def _validate_prediction_json(data):
         print("[ERROR] Parsed data is not a dict.")
         return None
 
-    predictions = data.get("predictions")
-    reasoning = data.get("reasoning")
+    # Compact answers (create_compact_prediction_prompt) use "p" / "r"
+    predictions = data.get("predictions", data.get("p"))
+    reasoning = data.get("reasoning", data.get("r"))
 
     if not predictions or not isinstance(predictions, list):
         print("[ERROR] Missing or invalid 'predictions' list.")
@@ -207,19 +406,167 @@ def _validate_prediction_json(data):
     if not reasoning or not isinstance(reasoning, str):
         reasoning = "No reasoning provided."
 
-    cleaned_predictions = []
-    for p in predictions:
-        try:
-            cleaned_predictions.append({
-                "lap": int(p.get("lap")),
-                "predicted_time": float(p.get("predicted_time")),
-                "confidence": float(p.get("confidence")),
-            })
-        except Exception:
-            continue
+    cleaned_predictions = [c for c in map(_clean_prediction, predictions) if c is not None]
 
     if not cleaned_predictions:
         print("[ERROR] No valid prediction entries found.")
         return None
 
     return {"predictions": cleaned_predictions, "reasoning": reasoning}
+
+
+def _clean_prediction(p):
+    """
+    Internal: normalize one prediction entry, None if it is malformed.
+
+    Entries are objects or compact [lap, predicted_time, confidence] arrays.
+    Checks types instead of catching conversion errors, so malformed entries
+    cost no exception. The usual shape (int lap, float time and confidence)
+    takes the fast path; NaN / Infinity never get here (decoded as None).
+    """
+    if type(p) is dict:
+        lap = p.get("lap")
+        predicted_time = p.get("predicted_time")
+        confidence = p.get("confidence")
+    elif type(p) is list and len(p) == 3:
+        lap, predicted_time, confidence = p
+    else:
+        return None
+    if type(lap) is int and type(predicted_time) is float and type(confidence) is float:
+        return {"lap": lap, "predicted_time": predicted_time, "confidence": confidence}
+
+    lap, predicted_time, confidence = _number(lap), _number(predicted_time), _number(confidence)
+    if lap is None or predicted_time is None or confidence is None:
+        return None
+    return {"lap": int(lap), "predicted_time": predicted_time, "confidence": confidence}
+
+
+def _number(value):
+    """
+    Internal: finite float from a JSON number or numeric string, else None.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return value if isfinite(value) else None
+    if isinstance(value, str) and _NUMBER.fullmatch(value):
+        return float(value)
+    return None
+
+
+_PREDICTIONS_ARRAY = re.compile(r'"(?:predictions|p)"\s*:\s*\[')
+
+
+class PredictionStreamParser:
+    """
+    Incremental parser for the "predictions" array of a streamed response.
+
+    feed() scans only the newly arrived text (tracking strings, escapes and
+    bracket depth) and returns each prediction entry (object, or compact
+    array of the "p" format) as soon as its closing bracket arrives. Markdown fences and prose around the JSON are ignored.
+    finish() parses the complete text like parse_prediction_response.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._in_array = False
+        self._closed = False
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        """
+        Add a chunk of response text.
+
+        Args:
+            chunk (str): Next piece of the streamed response
+
+        Returns:
+            list[dict]: Predictions completed by this chunk (possibly empty)
+        """
+        self.text += chunk
+        if self._closed:
+            return []
+
+        if not self._in_array:
+            match = _PREDICTIONS_ARRAY.search(self.text)
+            if not match:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c == "{" or c == "[":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif (c == "}" or c == "]") and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        prediction = _clean_prediction(_DECODER.decode(text[self._start:i + 1]))
+                    except ValueError:
+                        prediction = None
+                    if prediction is not None:
+                        completed.append(prediction)
+            elif c == "]" and self._depth == 0:
+                self._closed = True
+                break
+        self._pos = len(text)
+        return completed
+
+    def finish(self):
+        """
+        Parse the complete response (predictions and reasoning).
+
+        Returns:
+            dict | None: Same as parse_prediction_response
+        """
+        return parse_prediction_response(self.text)
+
+
+def stream_prediction(prompt, model_name=GEMINI_MODEL, bypass_cache=False, priority=INTERACTIVE):
+    """
+    Stream a Gemini response, caching the complete text once it has arrived.
+
+    A cached response is replayed as a single chunk.
+
+    Args:
+        prompt (str): The prediction prompt
+        model_name (str): Gemini model
+        bypass_cache (bool): Always call Gemini (the fresh answer still refreshes the cache)
+        priority (int): Scheduler priority
+
+    Yields:
+        str: Response text chunks
+
+    Raises:
+        GeminiError: The request failed
+    """
+    cache = default_response_cache()
+    cached = None if bypass_cache else cache.get(model_name, prompt)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    for chunk in default_scheduler().stream(prompt, model_name, priority):
+        chunks.append(chunk)
+        yield chunk
+    cache.put(model_name, prompt, "".join(chunks).strip())
@@ -0,0 +1,341 @@
+"""
+Process-wide scheduler in front of every Gemini call.
+
+All Streamlit sessions and batch jobs submit through one scheduler running on
+its own event loop thread:
+
+- Two token buckets keep the process under the requests/minute and
+  tokens/minute quotas (prompt tokens are estimated from the text length plus
+  an allowance for the answer). A quota error from the API drains both
+  buckets, so queued requests back off together.
+- Transient failures are retried by the scheduler, not inside the client:
+  a failed job goes back into the queue after a full-jitter backoff and
+  takes request and token budget again before every attempt, so retries
+  stay within the quotas too.
+- Pending requests wait in a priority queue: INTERACTIVE requests are
+  dispatched before BATCH ones, FIFO within a priority.
+- Single-flight coalescing: an identical (model, normalized prompt) request
+  that is already queued or running is shared instead of sent again.
+
+metrics() reports queue depth per priority, requests in flight and queue
+wait times.
+"""
+
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+
+from config import GEMINI_CONCURRENCY, GEMINI_MAX_RETRIES, GEMINI_RPM, GEMINI_TPM
+from modules import gemini_client
+from modules.response_cache import cache_key
+
+INTERACTIVE = 0
+BATCH = 10
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Token estimate: the prompt (gemini_client.approx_tokens) plus room for the JSON answer
+OUTPUT_TOKEN_ESTIMATE = 1024
+# Queue waits kept for the wait-time metrics
+WAIT_SAMPLES = 1000
+
+
+def estimate_tokens(prompt):
+    """Rough token cost of one request (prompt + expected answer)."""
+    return gemini_client.approx_tokens(prompt) + OUTPUT_TOKEN_ESTIMATE
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at per_minute / 60 tokens per second."""
+
+    def __init__(self, per_minute, burst=None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or per_minute)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount=1):
+        """Seconds until amount tokens are available (requests above capacity wait for a full bucket)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else (0.0 if missing <= 0 else float("inf"))
+
+    def take(self, amount=1):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        """Empty the bucket (after a quota error from the API)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+    @property
+    def available(self):
+        self._refill()
+        return self.tokens
+
+
+class _Job:
+    __slots__ = ("key", "prompt", "model_name", "priority", "tokens", "enqueued",
+                 "future", "chunks", "dispatched", "attempts")
+
+    def __init__(self, key, prompt, model_name, priority, chunks=None):
+        self.key = key
+        self.prompt = prompt
+        self.model_name = model_name
+        self.priority = priority
+        self.tokens = estimate_tokens(prompt)
+        self.enqueued = time.monotonic()
+        self.future = concurrent.futures.Future()
+        self.chunks = chunks
+        self.dispatched = False
+        self.attempts = 0
+
+
+class GeminiScheduler:
+    """
+    Rate-limited, prioritized, coalescing dispatcher for Gemini requests.
+
+    Safe to call from any thread; requests run on the scheduler's own event loop.
+    """
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, concurrency=GEMINI_CONCURRENCY,
+                 max_retries=GEMINI_MAX_RETRIES):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._running = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._counters = {"submitted": 0, "coalesced": 0, "completed": 0, "failed": 0, "rate_limited": 0,
+                          "retried": 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = asyncio.Event()
+        threading.Thread(target=self._run_loop, name="gemini-scheduler", daemon=True).start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.create_task(self._dispatch())
+        self._loop.run_forever()
+
+    # -----------------------------------------------------------------
+    # Submission (any thread)
+    # -----------------------------------------------------------------
+    def submit(self, prompt, model_name=gemini_client.DEFAULT_MODEL, priority=INTERACTIVE):
+        """
+        Queue a generation request, sharing an identical one already in flight.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the response text or raises GeminiError
+        """
+        key = cache_key(model_name, prompt)
+        with self._lock:
+            self._counters["submitted"] += 1
+            job = self._inflight.get(key)
+            if job is not None:
+                self._counters["coalesced"] += 1
+                if priority < job.priority:
+                    self._loop.call_soon_threadsafe(self._push, job, priority)
+                return job.future
+            job = self._inflight[key] = _Job(key, prompt, model_name, priority)
+        self._loop.call_soon_threadsafe(self._push, job, priority)
+        return job.future
+
+    def generate(self, prompt, model_name=gemini_client.DEFAULT_MODEL, priority=INTERACTIVE):
+        """Blocking submit (see there)."""
+        return self.submit(prompt, model_name, priority).result()
+
+    async def agenerate(self, prompt, model_name=gemini_client.DEFAULT_MODEL, priority=INTERACTIVE):
+        """Awaitable submit for coroutines on any event loop."""
+        return await asyncio.wrap_future(self.submit(prompt, model_name, priority))
+
+    def stream(self, prompt, model_name=gemini_client.DEFAULT_MODEL, priority=INTERACTIVE):
+        """
+        Stream a response through the scheduler (rate limited, not coalesced).
+
+        Yields:
+            str: Response text chunks as they arrive
+        """
+        job = _Job(None, prompt, model_name, priority, chunks=queue.Queue())
+        with self._lock:
+            self._counters["submitted"] += 1
+        self._loop.call_soon_threadsafe(self._push, job, priority)
+        while True:
+            item = job.chunks.get()
+            if item is None:
+                break
+            yield item
+        job.future.result()  # re-raise a failed stream
+
+    # -----------------------------------------------------------------
+    # Dispatch (scheduler loop)
+    # -----------------------------------------------------------------
+    def _push(self, job, priority):
+        if job.dispatched:
+            return
+        # Promotion pushes a second entry; the stale one is skipped when popped
+        job.priority = min(job.priority, priority)
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+
+    def _peek(self):
+        while self._heap:
+            priority, _, job = self._heap[0]
+            if job.dispatched or priority != job.priority:
+                heapq.heappop(self._heap)
+                continue
+            return job
+        return None
+
+    async def _dispatch(self):
+        while True:
+            job = self._peek()
+            if job is None or self._running >= self.concurrency:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(job.tokens))
+            if wait > 0:
+                # Sleep until the buckets refill, or re-plan when a new request arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self.requests.take(1)
+            self.tokens.take(job.tokens)
+            job.dispatched = True
+            self._running += 1
+            self._waits.append(time.monotonic() - job.enqueued)
+            self._loop.create_task(self._execute(job))
+
+    async def _execute(self, job):
+        job.attempts += 1
+        result, error, streamed = None, None, False
+        try:
+            # One attempt per dispatch: retries come back through the queue (see _retry)
+            if job.chunks is not None:
+                async for text in gemini_client.stream_async(job.prompt, job.model_name, max_retries=0,
+                                                             on_rate_limit=self._rate_limited):
+                    streamed = True
+                    job.chunks.put(text)
+            else:
+                result = await gemini_client.generate_async(job.prompt, job.model_name, max_retries=0,
+                                                            on_rate_limit=self._rate_limited)
+        except Exception as e:
+            error = e
+        finally:
+            self._running -= 1
+            self._wakeup.set()
+
+        transient = error is not None and isinstance(error.__cause__, gemini_client.RETRYABLE_ERRORS)
+        # A stream that already yielded text is not retried (it would repeat output)
+        if transient and not streamed and job.attempts <= self.max_retries:
+            self._retry(job, error.__cause__)
+            return
+        if transient and job.attempts > 1:
+            error = gemini_client.GeminiError(
+                f"Gemini request failed after {job.attempts} attempts: {error.__cause__!r}")
+        self._finish(job, result=result, error=error)
+        if job.chunks is not None:
+            job.chunks.put(None)
+
+    def _retry(self, job, cause):
+        """Re-queue a job after a transient failure, once its backoff has passed."""
+        delay = gemini_client.backoff_delay(job.attempts)
+        print(f"[WARN] Gemini {type(cause).__name__} (attempt {job.attempts}/{self.max_retries + 1}). "
+              f"Retrying in {delay:.1f}s...")
+        with self._lock:
+            self._counters["retried"] += 1
+
+        def requeue():
+            job.dispatched = False
+            job.enqueued = time.monotonic()
+            self._push(job, job.priority)
+
+        # Still marked dispatched while waiting, so a promotion can't skip the backoff
+        self._loop.call_later(delay, requeue)
+
+    def _finish(self, job, result=None, error=None):
+        with self._lock:
+            if job.key is not None:
+                self._inflight.pop(job.key, None)
+            self._counters["failed" if error else "completed"] += 1
+        if error:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _rate_limited(self, error):
+        """Quota error from the API: hold every queued request until both buckets refill."""
+        with self._lock:
+            self._counters["rate_limited"] += 1
+        self.requests.drain()
+        self.tokens.drain()
+
+    # -----------------------------------------------------------------
+    # Metrics
+    # -----------------------------------------------------------------
+    def metrics(self):
+        """
+        Scheduler statistics.
+
+        Returns:
+            dict: queue depth per priority, in-flight requests, counters,
+                  queue wait times (ms) and the bucket levels
+        """
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, job in list(self._heap):
+            if not job.dispatched and priority == job.priority:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                depth[name] = depth.get(name, 0) + 1
+
+        waits = sorted(self._waits)
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "queued": depth,
+            "in_flight": self._running,
+            **counters,
+            "wait_ms": {
+                "mean": round(statistics.mean(waits) * 1000, 1) if waits else None,
+                "p95": round(waits[int(0.95 * (len(waits) - 1))] * 1000, 1) if waits else None,
+                "max": round(waits[-1] * 1000, 1) if waits else None,
+            },
+            "requests_available": round(self.requests.available, 2),
+            "tokens_available": int(self.tokens.available),
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """The process-wide GeminiScheduler (started on first use)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = GeminiScheduler()
+        return _default
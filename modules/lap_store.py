@@ -0,0 +1,234 @@
+"""
+Partitioned columnar lap store.
+
+Laps are stored as Parquet files partitioned by season / event / session / driver
+(hive layout), e.g.:
+
+    data/laps/season=2024/event=bahrain/session=R/driver=hamilton/part-0.parquet
+
+Columns are typed (int16 lap/age, float64 seconds, dictionary-encoded compound),
+optionally followed by the weather at the end of each lap (see weather.py),
+and every file is sorted by lap number with small row groups, so a query like
+"laps 1..N for driver X at event Y" only touches one directory and only the
+row groups covering those laps (partition pruning + predicate pushdown).
+"""
+
+import glob
+import os
+import re
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = ds = pq = None
+
+STORE_DIR = "data/laps"
+
+# Laps per Parquet row group; small groups let lap-range filters skip bytes
+ROW_GROUP_SIZE = 16
+
+LAP_COLUMNS = ["lap_number", "lap_time", "tire_compound", "tire_age"]
+WEATHER_COLUMNS = ["track_temp", "air_temp", "humidity", "rainfall"]
+PARTITION_KEYS = ["season", "event", "session", "driver"]
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the lap store. Run: pip install pyarrow")
+
+
+def lap_schema(weather=False):
+    """
+    Arrow schema of the lap columns stored in each partition file.
+
+    Args:
+        weather (bool): Include the weather columns
+    """
+    _require_pyarrow()
+    fields = [
+        ("lap_number", pa.int16()),
+        ("lap_time", pa.float64()),
+        ("tire_compound", pa.dictionary(pa.int8(), pa.string())),
+        ("tire_age", pa.int16()),
+    ]
+    if weather:
+        fields += [
+            ("track_temp", pa.float32()),
+            ("air_temp", pa.float32()),
+            ("humidity", pa.float32()),
+            ("rainfall", pa.bool_()),
+        ]
+    return pa.schema(fields)
+
+
+def partition_schema():
+    """Arrow schema of the hive partition keys."""
+    _require_pyarrow()
+    return pa.schema([
+        ("season", pa.int16()),
+        ("event", pa.string()),
+        ("session", pa.string()),
+        ("driver", pa.string()),
+    ])
+
+
+def partition_path(season, event, driver, session="R", store_dir=STORE_DIR):
+    """Directory holding the laps of one driver in one session."""
+    return os.path.join(
+        store_dir,
+        f"season={int(season)}",
+        f"event={event}",
+        f"session={session}",
+        f"driver={driver}",
+    )
+
+
+def write_laps(df, season, event, driver, session="R", store_dir=STORE_DIR):
+    """
+    Write one driver's laps for one session into the store (replacing any
+    existing partition).
+
+    Args:
+        df (pandas.DataFrame): Laps with lap_number, lap_time, tire_compound, tire_age,
+                               and optionally track_temp, air_temp, humidity, rainfall
+        season (int): Season year
+        event (str): Event key (e.g. "bahrain")
+        driver (str): Driver key (e.g. "hamilton")
+        session (str): Session identifier (default "R")
+        store_dir (str): Root directory of the store
+
+    Returns:
+        str: Path of the written Parquet file
+    """
+    _require_pyarrow()
+
+    weather = all(col in df.columns for col in WEATHER_COLUMNS)
+    columns = LAP_COLUMNS + (WEATHER_COLUMNS if weather else [])
+    laps = df[columns].dropna(subset=["lap_number"]).sort_values("lap_number")
+    laps = laps.astype({"tire_compound": "string"})
+    table = pa.Table.from_pandas(laps, schema=lap_schema(weather), preserve_index=False, safe=False)
+
+    out_dir = partition_path(season, event, driver, session, store_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, "*.parquet")):
+        os.remove(old)
+
+    out_path = os.path.join(out_dir, "part-0.parquet")
+    pq.write_table(table, out_path, row_group_size=ROW_GROUP_SIZE)
+    return out_path
+
+
+def _dataset(store_dir=STORE_DIR):
+    _require_pyarrow()
+    # Explicit schema: partitions written without weather read it back as nulls
+    schema = pa.unify_schemas([lap_schema(weather=True), partition_schema()])
+    return ds.dataset(
+        store_dir,
+        format="parquet",
+        schema=schema,
+        partitioning=ds.partitioning(partition_schema(), flavor="hive"),
+    )
+
+
+def read_laps(season=None, event=None, driver=None, session=None,
+              lap_range=None, columns=None, store_dir=STORE_DIR):
+    """
+    Read laps from the store with partition pruning, predicate pushdown and
+    column projection.
+
+    Args:
+        season (int): Only this season
+        event (str): Only this event key
+        driver (str): Only this driver key
+        session (str): Only this session
+        lap_range (tuple): (first_lap, last_lap), inclusive; either end may be None
+        columns (list): Columns to return (lap, weather and/or partition columns).
+                        Defaults to the lap columns.
+        store_dir (str): Root directory of the store
+
+    Returns:
+        pandas.DataFrame: Matching laps sorted by lap number (empty if none)
+    """
+    if not os.path.isdir(store_dir):
+        return pd.DataFrame(columns=columns or LAP_COLUMNS)
+
+    expr = None
+    for name, value in (("season", season), ("event", event),
+                        ("session", session), ("driver", driver)):
+        if value is not None:
+            term = ds.field(name) == value
+            expr = term if expr is None else expr & term
+
+    if lap_range is not None:
+        first, last = lap_range
+        if first is not None:
+            term = ds.field("lap_number") >= first
+            expr = term if expr is None else expr & term
+        if last is not None:
+            term = ds.field("lap_number") <= last
+            expr = term if expr is None else expr & term
+
+    table = _dataset(store_dir).to_table(columns=columns or LAP_COLUMNS, filter=expr)
+    df = table.to_pandas()
+    if "lap_number" in df.columns:
+        df = df.sort_values("lap_number", kind="stable").reset_index(drop=True)
+    return df
+
+
+def list_partitions(store_dir=STORE_DIR):
+    """
+    List every (season, event, session, driver) partition in the store.
+
+    Returns:
+        list[dict]: One dict per partition with the four keys and its path
+    """
+    pattern = os.path.join(store_dir, "season=*", "event=*", "session=*", "driver=*")
+    partitions = []
+    for path in sorted(glob.glob(pattern)):
+        parts = dict(p.split("=", 1) for p in os.path.relpath(path, store_dir).split(os.sep))
+        parts["season"] = int(parts["season"])
+        parts["path"] = path
+        partitions.append(parts)
+    return partitions
+
+
+# Legacy CSV names: <event>_<season>_<driver>.csv (e.g. bahrain_2024_hamilton.csv);
+# the season anchors the split, so events and drivers may contain "_" (de_vries)
+_CSV_NAME = re.compile(r"^(?P<event>.+?)_(?P<season>\d{4})_(?P<driver>.+)\.csv$")
+
+
+def import_csv(csv_path, store_dir=STORE_DIR):
+    """
+    Import one legacy per-driver CSV into the store; partition keys are taken
+    from the file name.
+
+    Returns:
+        str | None: Path of the written Parquet file, or None if the name doesn't match
+    """
+    match = _CSV_NAME.match(os.path.basename(csv_path))
+    if not match:
+        print(f"[WARN] Skipping {csv_path}: name is not <event>_<season>_<driver>.csv")
+        return None
+
+    df = pd.read_csv(csv_path)
+    return write_laps(
+        df,
+        season=int(match["season"]),
+        event=match["event"],
+        driver=match["driver"],
+        store_dir=store_dir,
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python -m modules.lap_store data/*.csv
+    for path in sys.argv[1:]:
+        written = import_csv(path)
+        if written:
+            print(f"✅ {path} → {written}")
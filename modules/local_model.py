@@ -0,0 +1,218 @@
+"""
+Local numeric tire degradation model (fast path next to Gemini).
+
+Degradation curves are fit with NumPy least squares on stint-aware lap
+history (see degradation.stint_degradation): fuel-corrected lap time against
+tire age, with one intercept per stint so only the wear trend is shared.
+Curves are kept per (track, compound). A forecast anchors the curve on the
+latest clean laps of the current stint and projects it forward.
+
+predict_local returns the same {"predictions": [...], "reasoning": str} shape
+as the Gemini path, so recommend_pit_stop and the charts work unchanged.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from modules import lap_store
+from modules.degradation import FUEL_EFFECT_S_PER_LAP, stint_degradation
+
+# Fewer clean laps than this in the current stint -> lean on the track/compound curve
+MIN_STINT_LAPS = 4
+# Clean laps of the current stint used to anchor the forecast
+ANCHOR_LAPS = 5
+
+# Track curves per event, reused while the lap store partitions are unchanged
+_curve_cache = {}
+_curve_cache_lock = threading.Lock()
+
+
+def fit_curves(laps, fuel_effect=FUEL_EFFECT_S_PER_LAP):
+    """
+    Fit one linear degradation curve per compound.
+
+    Within each stint, fuel-corrected lap time and tire age are demeaned
+    (one intercept per stint), then the shared slope is solved by least squares.
+
+    Args:
+        laps (DataFrame): Output of stint_degradation (or raw laps, which are
+                          run through it first)
+        fuel_effect (float): Fuel correction used when laps are raw
+
+    Returns:
+        dict: {compound: {"slope": s/lap, "residual_std": s, "laps": int, "stints": int}}
+    """
+    if "excluded" not in laps.columns:
+        laps = stint_degradation(laps, fuel_effect=fuel_effect)
+    # Lap 1 (standing start) is never representative of tire wear
+    clean = laps[~laps["excluded"] & laps["fuel_corrected_lap_time"].notna() & (laps["lap_number"] > 1)]
+    if clean.empty:
+        return {}
+
+    keys = [k for k in ("season", "event", "session", "driver") if k in clean.columns] + ["stint"]
+    x = clean["tire_age"].to_numpy(dtype=float)
+    y = clean["fuel_corrected_lap_time"].to_numpy(dtype=float)
+    stint_id = clean.groupby(keys, sort=False, observed=True).ngroup().to_numpy()
+    compounds = clean["tire_compound"].astype(str).to_numpy()
+
+    curves = {}
+    for compound in np.unique(compounds):
+        mask = compounds == compound
+        sid = stint_id[mask]
+        counts = np.bincount(sid)
+        seen = counts[sid]
+        # Demean within stint (stints with a single lap carry no slope information)
+        xd = x[mask] - (np.bincount(sid, weights=x[mask]) / np.maximum(counts, 1))[sid]
+        yd = y[mask] - (np.bincount(sid, weights=y[mask]) / np.maximum(counts, 1))[sid]
+        keep = seen > 1
+        if keep.sum() < 2 or not np.any(xd[keep]):
+            continue
+
+        solution, _, _, _ = np.linalg.lstsq(xd[keep, None], yd[keep], rcond=None)
+        slope = float(solution[0])
+        residuals = yd[keep] - slope * xd[keep]
+        curves[compound] = {
+            "slope": slope,
+            "residual_std": float(np.std(residuals)),
+            "laps": int(keep.sum()),
+            "stints": int(len(np.unique(sid[keep]))),
+        }
+    return curves
+
+
+def track_curves(event, season=None, store_dir=lap_store.STORE_DIR):
+    """
+    Degradation curves of one track from every driver in the lap store.
+
+    Cached per event until the event's partitions change.
+
+    Returns:
+        dict: {compound: curve}, empty if the store has no laps for the event
+    """
+    partitions = [p for p in lap_store.list_partitions(store_dir)
+                  if p["event"] == event and (season is None or p["season"] == season)]
+    version = tuple(sorted((p["path"], _partition_mtime(p["path"])) for p in partitions))
+    key = (store_dir, event, season)
+
+    with _curve_cache_lock:
+        cached = _curve_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    curves = {}
+    if partitions:
+        laps = lap_store.read_laps(
+            season=season, event=event,
+            columns=["season", "event", "session", "driver"] + lap_store.LAP_COLUMNS,
+            store_dir=store_dir,
+        )
+        curves = fit_curves(laps)
+
+    with _curve_cache_lock:
+        _curve_cache[key] = (version, curves)
+    return curves
+
+
+def _partition_mtime(path):
+    """Newest mtime of the files in one lap store partition."""
+    with os.scandir(path) as entries:
+        return max((e.stat().st_mtime_ns for e in entries), default=0)
+
+
+def predict_local(df, current_lap, target_laps=15, total_laps=None, prior=None,
+                  fuel_effect=FUEL_EFFECT_S_PER_LAP):
+    """
+    Forecast the next laps of the current stint with the local model.
+
+    Args:
+        df (DataFrame): One driver's laps in the canonical schema
+                        (LapNumber, LapTime_seconds, Compound, TyreLife)
+        current_lap (int): Current lap number (only laps up to it are used)
+        target_laps (int): Number of laps to forecast
+        total_laps (int): Race distance; forecasts stop at the last lap
+        prior (dict): Track curves {compound: curve} (see track_curves), used
+                      when the current stint is too short to fit on its own
+        fuel_effect (float): Seconds per lap of fuel load
+
+    Returns:
+        dict | None: {"predictions": [{"lap", "predicted_time", "confidence"}], "reasoning": str},
+                     None if there is no usable history
+    """
+    # Plain NumPy on one driver's arrays keeps a forecast well under a millisecond
+    lap_number = df["LapNumber"].to_numpy(dtype=int)
+    upto = lap_number <= current_lap
+    if not upto.any():
+        return None
+    lap_number = lap_number[upto]
+    lap_time = df["LapTime_seconds"].to_numpy(dtype=float)[upto]
+    compounds = df["Compound"].to_numpy(dtype=object)[upto]
+    tire_age = df["TyreLife"].to_numpy(dtype=float)[upto]
+
+    total_laps = int(total_laps or lap_number.max())
+    target_laps = max(0, min(int(target_laps), total_laps - int(current_lap)))
+    if target_laps == 0:
+        return None
+
+    # Current stint: after the last compound change / tire age reset (as in stint_degradation)
+    boundary = np.flatnonzero((compounds[1:] != compounds[:-1]) | (tire_age[1:] <= tire_age[:-1]))
+    start = int(boundary[-1]) + 1 if len(boundary) else 0
+    compound = str(compounds[-1])
+    age = int(tire_age[-1])
+
+    # Clean laps: skip the out-lap and lap 1; fuel correction relative to the race distance
+    clean = np.arange(start + 1 if start > 0 else start, len(lap_number))
+    clean = clean[lap_number[clean] > 1]
+    x = tire_age[clean]
+    y = lap_time[clean] - fuel_effect * (total_laps - lap_number[clean])
+
+    # ---------------------------------------------------------------------
+    # 1. Slope: current stint fit, shrunk towards the track curve when short
+    # ---------------------------------------------------------------------
+    own = None
+    if len(clean) >= 2 and np.ptp(x) > 0:
+        xd, yd = x - x.mean(), y - y.mean()
+        own_slope = float(xd @ yd / (xd @ xd))
+        own = {"slope": own_slope, "residual_std": float(np.std(yd - own_slope * xd)), "laps": len(clean)}
+
+    track = (prior or {}).get(compound)
+    if own and (own["laps"] >= MIN_STINT_LAPS or not track):
+        slope, spread, source = own["slope"], own["residual_std"], f"current stint ({own['laps']} laps)"
+        if track and own["laps"] < 2 * MIN_STINT_LAPS:
+            w = own["laps"] / (2 * MIN_STINT_LAPS)
+            slope = w * own["slope"] + (1 - w) * track["slope"]
+            source += f" blended with {track['laps']} track laps"
+    elif track:
+        slope, spread, source = track["slope"], track["residual_std"], f"{track['laps']} {compound} laps at this track"
+    else:
+        slope, spread, source = 0.0, 0.5, "no usable stint history (flat forecast)"
+    # Fuel-corrected tires don't get faster with age; treat negative fits as noise
+    slope = max(slope, 0.0)
+
+    # ---------------------------------------------------------------------
+    # 2. Anchor on the latest clean laps, project forward, add fuel back
+    # ---------------------------------------------------------------------
+    if len(clean):
+        anchor_x, anchor_y = x[-ANCHOR_LAPS:], y[-ANCHOR_LAPS:]
+    else:
+        anchor_x = tire_age[-1:]
+        anchor_y = lap_time[-1:] - fuel_effect * (total_laps - lap_number[-1:])
+    base = float(np.mean(anchor_y - slope * anchor_x))
+
+    future = np.arange(1, target_laps + 1)
+    lap_numbers = int(current_lap) + future
+    ages = age + future
+    predicted = base + slope * ages + fuel_effect * (total_laps - lap_numbers)
+    confidence = np.clip(0.95 - 0.02 * future - 0.1 * min(spread, 2.0), 0.3, 0.95)
+
+    predictions = [
+        {"lap": int(lap), "predicted_time": round(float(t), 3), "confidence": round(float(c), 2)}
+        for lap, t, c in zip(lap_numbers, predicted, confidence)
+    ]
+    reasoning = (
+        f"Local model: {compound} tires at {age} laps old, degrading {slope:+.3f} s/lap "
+        f"(fuel-corrected, fit on {source}). Forecast anchored on the last {len(anchor_x)} "
+        f"clean laps of the stint, with {fuel_effect:.2f} s/lap of fuel burn added back."
+    )
+    return {"predictions": predictions, "reasoning": reasoning}
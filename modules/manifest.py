@@ -0,0 +1,116 @@
+"""
+Download manifest for incremental ingestion.
+
+The manifest records, for every (season, event, session, driver) partition we
+have written, the hash of the FastF1 cache files it was built from and its row
+count. Downloaders check it before loading a session so reruns skip rounds that
+are already up to date and only fetch new ones.
+"""
+
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+MANIFEST_PATH = "data/laps/_manifest.json"
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Load the manifest from disk.
+
+    Returns:
+        dict: {partition_key: entry}; empty if the file is missing or unreadable
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[WARN] Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Atomically write the manifest to disk."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def partition_key(season, event, session, driver):
+    """Manifest key of one partition, e.g. "2024/bahrain/R/hamilton"."""
+    return f"{int(season)}/{event}/{session}/{driver}"
+
+
+def source_cache_hash(session_cache_dir):
+    """
+    Hash the FastF1 cache files of one session.
+
+    Args:
+        session_cache_dir (str): Directory holding the session's .ff1pkl files
+
+    Returns:
+        str | None: SHA-1 hex digest, or None if nothing is cached yet
+    """
+    files = sorted(glob.glob(os.path.join(session_cache_dir, "*.ff1pkl")))
+    if not files:
+        return None
+
+    digest = hashlib.sha1()
+    for path in files:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_partition(manifest, season, event, session, driver, source_hash, row_count):
+    """Add or update the manifest entry of one written partition."""
+    manifest[partition_key(season, event, session, driver)] = {
+        "season": int(season),
+        "event": event,
+        "session": session,
+        "driver": driver,
+        "source_hash": source_hash,
+        "row_count": int(row_count),
+        "updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def session_entries(manifest, season, event, session):
+    """All manifest entries belonging to one session."""
+    prefix = f"{int(season)}/{event}/{session}/"
+    return [entry for key, entry in manifest.items() if key.startswith(prefix)]
+
+
+def is_up_to_date(manifest, season, event, session, source_hash, driver=None):
+    """
+    Check whether a session (or one driver of it) was already ingested from
+    exactly this cache content.
+
+    Args:
+        manifest (dict): Loaded manifest
+        season (int): Season year
+        event (str): Event key
+        session (str): Session identifier
+        source_hash (str | None): Current hash of the session's cache files
+        driver (str): Only check this driver's partition
+
+    Returns:
+        bool: True if every matching entry was built from source_hash
+    """
+    if source_hash is None:
+        return False
+
+    if driver is not None:
+        entry = manifest.get(partition_key(season, event, session, driver))
+        return bool(entry) and entry.get("source_hash") == source_hash
+
+    entries = session_entries(manifest, season, event, session)
+    return bool(entries) and all(e.get("source_hash") == source_hash for e in entries)
@@ -0,0 +1,424 @@
+"""
+Staged tire degradation prediction pipeline.
+
+A prediction is one pass of named stages over a shared state dict:
+
+    load -> enrich -> context -> prompt -> infer -> parse -> postprocess
+
+Each stage reads what earlier stages stored and returns the keys it adds, or
+{"status": "error", "error": ...} to stop the run. Every stage is timed and a
+stage with a cache key is memoized across runs. The infer stage belongs to a
+swappable backend: GeminiBackend (prompt -> response text) or LocalBackend
+(NumPy model in local_model.py, which skips context, prompt and parse).
+
+With prompt_mode="compact" the context and prompt stages become one
+token-budgeted compact prompt (gemini_handler.create_compact_prediction_prompt):
+
+    load -> prompt -> infer -> parse -> postprocess
+
+Every result carries the per-stage latency breakdown in "timings" (ms) and,
+for Gemini, the estimated prompt / response size in "tokens".
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from config import PROMPT_MODE, PROMPT_TOKEN_BUDGET
+from modules import catalog
+from modules.data_processor import calculate_degradation, create_ai_context, load_driver_laps
+from modules.gemini_client import approx_tokens
+from modules.gemini_handler import (
+    PredictionStreamParser,
+    create_compact_prediction_prompt,
+    parse_prediction_response,
+    stream_prediction,
+)
+from modules.gemini_scheduler import INTERACTIVE, default_scheduler
+from modules.local_model import predict_local, track_curves
+from modules.response_cache import cached_generate
+
+PREDICTION_MODEL = "gemini-2.0-flash-exp"
+STAGE_NAMES = ["load", "enrich", "context", "prompt", "infer", "parse", "postprocess"]
+PROMPT_MODES = ("verbose", "compact")
+
+# Memoized stage outputs shared by every pipeline in the process
+STAGE_CACHE_SIZE = 256
+_stage_cache = OrderedDict()
+_stage_cache_lock = threading.Lock()
+
+
+class Stage:
+    """
+    One named pipeline step.
+
+    Args:
+        name (str): Stage name (key of the timings breakdown)
+        fn (callable): fn(state) -> dict of new state keys, or an error dict
+        key (callable): key(state) -> hashable; outputs are memoized per key (None: not cached,
+                        and a key function returning None, e.g. an unknown dataset version,
+                        runs the stage uncached)
+        error (str): Prefix of the error message when fn raises
+    """
+
+    def __init__(self, name, fn, key=None, error="Failed to load data"):
+        self.name = name
+        self.fn = fn
+        self.key = key
+        self.error = error
+
+
+# ---------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------
+def load_stage(state):
+    """
+    Race catalog entry and the driver's laps up to the current lap.
+
+    Laps come from the converted session when it is cached (with weather and
+    track status flags), else from the race CSV (see data_processor.load_driver_laps).
+    """
+    track_name, current_lap = state["track_name"], state["current_lap"]
+    race = catalog.find_race(track_name)
+    if race is None:
+        return {"status": "error", "error": f"Data file not found for {track_name}"}
+
+    df, version = load_driver_laps(race, catalog.DEFAULT_DRIVER)
+    if df.empty:
+        return {"status": "error", "error": f"No valid laps for {track_name}"}
+
+    history = df[df["LapNumber"] <= current_lap]
+    if history.empty:
+        return {"status": "error", "error": "Not enough historical data"}
+
+    # Scheduled distance from the catalog when known; never predict past it
+    total_laps = int(race.get("total_laps") or df["LapNumber"].max())
+    return {
+        "race": race,
+        "version": version,
+        "df": df,
+        "last_lap_num": int(history["LapNumber"].iloc[-1]),
+        "total_laps": total_laps,
+        "target_laps": min(state["target_laps"], total_laps - current_lap),
+    }
+
+
+def enrich_stage(state):
+    """Degradation metrics (see data_processor.calculate_degradation)."""
+    return {"enriched": calculate_degradation(state["df"])}
+
+
+def context_stage(state):
+    """Recent tire performance text (cached per dataset version / lap in data_processor)."""
+    context = create_ai_context(
+        state["enriched"], state["last_lap_num"],
+        version=state["version"], driver=catalog.DEFAULT_DRIVER,
+    )
+    return {"context": context}
+
+
+def prompt_stage(state):
+    """Gemini prompt for the next target_laps laps."""
+    return {"prompt": build_race_prompt(
+        state["track_name"], state["current_lap"], state["total_laps"],
+        state["target_laps"], state["context"],
+    )}
+
+
+def compact_prompt_stage(state):
+    """Token-budgeted compact prompt straight from the laps (no enrich / context)."""
+    driver = next((d["name"] for d in state["race"].get("drivers") or []
+                   if d["key"] == catalog.DEFAULT_DRIVER), None)
+    prompt = create_compact_prediction_prompt(
+        state["df"], state["current_lap"], state["target_laps"], state["total_laps"],
+        track_name=state["track_name"], budget=PROMPT_TOKEN_BUDGET, driver=driver,
+    )
+    if not prompt:
+        return {"status": "error", "error": "Not enough historical data"}
+    return {"prompt": prompt}
+
+
+def parse_stage(state):
+    """Structured predictions from the raw response text."""
+    parsed = parse_prediction_response(state["text"])
+    if not parsed:
+        return {"status": "error", "error": "No valid JSON found in response"}
+    return parsed
+
+
+def postprocess_stage(state):
+    """Keep one prediction per lap within the race distance, in lap order."""
+    by_lap = {}
+    for p in state.get("predictions") or []:
+        if p.get("lap", 999) <= state["total_laps"]:
+            by_lap.setdefault(p["lap"], p)
+    if not by_lap:
+        return {"status": "error", "error": "No valid predictions generated"}
+    return {"predictions": [by_lap[lap] for lap in sorted(by_lap)]}
+
+
+def build_race_prompt(track_name, current_lap, total_laps, target_laps, context):
+    """
+    Prompt asking Gemini for the next laps of the current stint.
+
+    Returns:
+        str: Prompt text
+    """
+    remaining_laps = total_laps - current_lap
+    return f"""
+You are an F1 race strategist analyzing {track_name} for Lewis Hamilton.
+
+RACE CONTEXT:
+- Current lap: {current_lap}
+- Total race laps: {total_laps}
+- Remaining laps: {remaining_laps}
+- Predict next: {target_laps} laps
+
+RECENT TIRE PERFORMANCE:
+{context}
+
+TASK:
+Predict lap times for laps {current_lap + 1} through {current_lap + target_laps}.
+Consider tire degradation patterns shown in the data.
+
+IMPORTANT RULES:
+- Lap numbers must be sequential starting from {current_lap + 1}
+- Do NOT exceed lap {total_laps}
+- Lap times should increase gradually (degradation)
+- Base predictions on the pattern shown in recent laps
+
+Return ONLY valid JSON with this exact structure:
+{{
+    "predictions": [
+        {{"lap": {current_lap + 1}, "predicted_time": 95.5, "confidence": 0.85}},
+        {{"lap": {current_lap + 2}, "predicted_time": 95.7, "confidence": 0.83}},
+        ...
+    ],
+    "reasoning": "Your explanation of degradation pattern and pit strategy recommendation here"
+}}
+"""
+
+
+# ---------------------------------------------------------------------
+# Inference backends
+# ---------------------------------------------------------------------
+class GeminiBackend:
+    """Gemini through the response cache and the process-wide scheduler."""
+
+    name = "gemini"
+    skip = ()
+    error = "Gemini API call failed"
+
+    def __init__(self, model_name=PREDICTION_MODEL, bypass_cache=False, priority=INTERACTIVE):
+        self.model_name = model_name
+        self.bypass_cache = bypass_cache
+        self.priority = priority
+
+    def infer(self, state):
+        prompt = state["prompt"]
+        text = cached_generate(
+            self.model_name, prompt,
+            lambda: default_scheduler().generate(prompt, self.model_name, self.priority),
+            bypass=self.bypass_cache,
+        )
+        return {"text": text}
+
+    def stream(self, state):
+        """Response text chunks as they arrive."""
+        return stream_prediction(state["prompt"], self.model_name,
+                                 bypass_cache=self.bypass_cache, priority=self.priority)
+
+
+class LocalBackend:
+    """NumPy degradation model (local_model.py); produces predictions directly."""
+
+    name = "local"
+    skip = ("enrich", "context", "prompt", "parse")
+    error = "Failed to load data"
+
+    def infer(self, state):
+        race = state["race"]
+        local = predict_local(state["df"], state["current_lap"], state["target_laps"], state["total_laps"],
+                              prior=track_curves(race["key"], season=race["season"]))
+        if not local:
+            return {"status": "error", "error": "No valid predictions generated"}
+        return local
+
+
+BACKENDS = {"gemini": GeminiBackend, "local": LocalBackend}
+
+
+# ---------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------
+def default_stages(backend, prompt_mode="verbose"):
+    """The standard stage list around a backend's infer step."""
+    if prompt_mode == "compact":
+        return [
+            Stage("load", load_stage),
+            Stage("prompt", compact_prompt_stage),
+            Stage("infer", backend.infer, error=backend.error),
+            Stage("parse", parse_stage, error="Failed to parse JSON"),
+            Stage("postprocess", postprocess_stage),
+        ]
+    return [
+        Stage("load", load_stage),
+        Stage("enrich", enrich_stage, key=lambda s: s["version"]),
+        Stage("context", context_stage),
+        Stage("prompt", prompt_stage),
+        Stage("infer", backend.infer, error=backend.error),
+        Stage("parse", parse_stage, error="Failed to parse JSON"),
+        Stage("postprocess", postprocess_stage),
+    ]
+
+
+class Pipeline:
+    """
+    Ordered stages around one inference backend.
+
+    Args:
+        backend: GeminiBackend, LocalBackend or any object with name / skip /
+                 error / infer(state) (and optionally stream(state))
+        stages (list[Stage]): Custom stage list (default: default_stages(backend, prompt_mode))
+        prompt_mode (str): "verbose" or "compact" (see PROMPT_MODES)
+    """
+
+    def __init__(self, backend, stages=None, prompt_mode=PROMPT_MODE):
+        if prompt_mode not in PROMPT_MODES:
+            raise ValueError(f"Unknown prompt mode: {prompt_mode}")
+        self.backend = backend
+        self.prompt_mode = prompt_mode
+        self.stages = stages if stages is not None else default_stages(backend, prompt_mode)
+
+    def replace(self, name, stage):
+        """Swap the stage called name for another one (returns self)."""
+        self.stages = [stage if s.name == name else s for s in self.stages]
+        return self
+
+    def _active(self, names=None):
+        return [s for s in self.stages
+                if s.name not in self.backend.skip and (names is None or s.name in names)]
+
+    def _run_stage(self, stage, state, timings):
+        """Run (or recall) one stage; returns an error dict or None."""
+        started = time.perf_counter()
+        stage_key = stage.key(state) if stage.key else None
+        # No key (e.g. the data file couldn't be stat'ed): never share the output
+        key = (stage.name, stage.fn, stage_key) if stage_key is not None else None
+        try:
+            with _stage_cache_lock:
+                output = _stage_cache.get(key) if key else None
+                if output is not None:
+                    _stage_cache.move_to_end(key)
+                    state.setdefault("cached_stages", []).append(stage.name)
+            if output is None:
+                output = stage.fn(state) or {}
+                if key and output.get("status") != "error":
+                    with _stage_cache_lock:
+                        _stage_cache[key] = output
+                        while len(_stage_cache) > STAGE_CACHE_SIZE:
+                            _stage_cache.popitem(last=False)
+        except Exception as e:
+            output = {"status": "error", "error": f"{stage.error}: {e}"}
+        timings[stage.name] = round((time.perf_counter() - started) * 1000, 3)
+
+        if output.get("status") == "error":
+            return output
+        state.update(output)
+        return None
+
+    def _result(self, state, timings, error=None):
+        result = error or {
+            "status": "success",
+            "engine": self.backend.name,
+            "predictions": state["predictions"],
+            "reasoning": state.get("reasoning") or "No reasoning provided",
+        }
+        result = {**result, "timings": timings, "cached_stages": state.get("cached_stages", [])}
+        if "prompt" in state:
+            result["tokens"] = {"prompt": approx_tokens(state["prompt"]),
+                                "response": approx_tokens(state.get("text") or "")}
+        return result
+
+    def _new_state(self, track_name, current_lap, target_laps):
+        return {"track_name": track_name, "current_lap": int(current_lap), "target_laps": int(target_laps)}
+
+    def run(self, track_name, current_lap=10, target_laps=15):
+        """
+        Run every stage for one prediction.
+
+        Returns:
+            dict: {"status", "engine", "predictions", "reasoning", "timings": {stage: ms},
+                   "cached_stages", "tokens": {"prompt", "response"} (Gemini only)}
+                  or {"status": "error", "error", "timings", ...}
+        """
+        state = self._new_state(track_name, current_lap, target_laps)
+        timings = {}
+        for stage in self._active():
+            error = self._run_stage(stage, state, timings)
+            if error:
+                return self._result(state, timings, error)
+        return self._result(state, timings)
+
+    def stream(self, track_name, current_lap=10, target_laps=15):
+        """
+        Run the pipeline, yielding predictions as the backend streams them.
+
+        Yields:
+            dict: {"type": "prediction", "prediction": {...}, "predictions": [...so far]}
+                  for every completed prediction, then {"type": "done", **result}
+                  (same result as run())
+        """
+        if not hasattr(self.backend, "stream"):
+            result = self.run(track_name, current_lap, target_laps)
+            for i, prediction in enumerate(result.get("predictions") or []):
+                yield {"type": "prediction", "prediction": prediction,
+                       "predictions": result["predictions"][:i + 1]}
+            yield {"type": "done", **result}
+            return
+
+        state = self._new_state(track_name, current_lap, target_laps)
+        timings = {}
+        names = [s.name for s in self._active()]
+        before, after = names[:names.index("infer")], names[names.index("infer") + 1:]
+
+        for stage in self._active(before):
+            error = self._run_stage(stage, state, timings)
+            if error:
+                yield {"type": "done", **self._result(state, timings, error)}
+                return
+
+        started = time.perf_counter()
+        parser = PredictionStreamParser()
+        received = []
+        try:
+            for chunk in self.backend.stream(state):
+                for prediction in parser.feed(chunk):
+                    if prediction["lap"] <= state["total_laps"]:
+                        received.append(prediction)
+                        yield {"type": "prediction", "prediction": prediction, "predictions": list(received)}
+        except Exception as e:
+            timings["infer"] = round((time.perf_counter() - started) * 1000, 3)
+            error = {"status": "error", "error": f"{self.backend.error}: {e}"}
+            yield {"type": "done", **self._result(state, timings, error)}
+            return
+        timings["infer"] = round((time.perf_counter() - started) * 1000, 3)
+        state["text"] = parser.text.strip()
+
+        for stage in self._active(after):
+            error = self._run_stage(stage, state, timings)
+            if error:
+                yield {"type": "done", **self._result(state, timings, error)}
+                return
+        yield {"type": "done", **self._result(state, timings)}
+
+
+def stage_cache_info():
+    """Entries in the shared stage cache."""
+    with _stage_cache_lock:
+        return {"entries": len(_stage_cache), "max_entries": STAGE_CACHE_SIZE}
+
+
+def clear_stage_cache():
+    with _stage_cache_lock:
+        _stage_cache.clear()
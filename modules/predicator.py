@@ -183,128 +183,169 @@
 # modules/predictor.py
 import os
 import random
+import time
 import pandas as pd
-import google.generativeai as genai
-from modules.data_processor import load_race_data, calculate_degradation, create_ai_context
-from modules.gemini_handler import create_prediction_prompt, get_prediction, parse_prediction_response
+from modules import catalog
+from modules.data_processor import get_race_data, calculate_degradation, load_driver_laps
+from config import PROMPT_MODE
+from modules.gemini_client import approx_tokens
+from modules.gemini_handler import create_batch_prediction_prompts, get_predictions, parse_batch_response
+from modules.pipeline import (PREDICTION_MODEL, BACKENDS, PROMPT_MODES, GeminiBackend, LocalBackend, Pipeline,
+                              postprocess_stage)
+
+# Prediction engines selectable per call
+ENGINES = tuple(BACKENDS)
+
 
 # Existing functions above ...
-def predict_tire_degradation(track_name: str, current_lap: int = 10, target_laps: int = 15):
+def predict_tire_degradation(track_name: str, current_lap: int = 10, target_laps: int = 15,
+                             engine: str = "gemini", bypass_cache: bool = False, prompt_mode: str = PROMPT_MODE):
     """
-    Predict tire degradation using Gemini API based on selected track.
+    Predict tire degradation based on selected track.
+
+    Runs the staged pipeline in pipeline.py (load -> enrich -> context ->
+    prompt -> infer -> parse -> postprocess). engine="gemini" asks Gemini
+    (seconds per call); engine="local" uses the NumPy degradation model in
+    local_model.py (sub-millisecond). Both return the same predictions /
+    reasoning shape plus a per-stage "timings" breakdown in ms.
+
+    Gemini answers are cached on disk per model + prompt (response_cache.py);
+    bypass_cache=True forces a fresh call. prompt_mode="compact" sends the
+    token-budgeted compact prompt instead of the verbose one (F1_PROMPT_MODE).
     """
-    TRACK_FILE_MAP = {
-        "Bahrain GP 2024": "data/bahrain_2024_hamilton.csv",
-        "Monaco GP 2024": "data/monaco_2024_hamilton.csv",
-        "British GP 2024 (Silverstone)": "data/silverstone_2024_hamilton.csv",
-    }
+    if engine not in ENGINES:
+        return {"status": "error", "error": f"Unknown prediction engine: {engine}"}
+    if prompt_mode not in PROMPT_MODES:
+        return {"status": "error", "error": f"Unknown prompt mode: {prompt_mode}"}
+    return _pipeline(engine, bypass_cache, prompt_mode).run(track_name, current_lap, target_laps)
 
-    csv_file = TRACK_FILE_MAP.get(track_name)
-    if not csv_file or not os.path.exists(csv_file):
-        return {"status": "error", "error": f"Data file not found for {track_name}"}
 
-    try:
-        df = pd.read_csv(csv_file)
-        
-        # Filter data UP TO current lap
-        historical_data = df[df['lap_number'] <= current_lap].tail(10)
-        
-        # Get most recent lap time
-        if len(historical_data) > 0:
-            last_lap_time = historical_data.iloc[-1]['lap_time']
-            last_lap_num = int(historical_data.iloc[-1]['lap_number'])
+def stream_tire_degradation(track_name: str, current_lap: int = 10, target_laps: int = 15,
+                            bypass_cache: bool = False, prompt_mode: str = PROMPT_MODE):
+    """
+    Streaming variant of predict_tire_degradation (Gemini engine).
+
+    Predictions are parsed out of the streamed response as each object
+    closes, so callers can render the first laps (and a provisional pit
+    recommendation) before the full answer has arrived.
+
+    Yields:
+        dict: {"type": "prediction", "prediction": {...}, "predictions": [...so far]}
+              for every completed prediction, then one final
+              {"type": "done", **result} with the same result as predict_tire_degradation
+    """
+    yield from _pipeline("gemini", bypass_cache, prompt_mode).stream(track_name, current_lap, target_laps)
+
+
+def _pipeline(engine, bypass_cache=False, prompt_mode=PROMPT_MODE):
+    backend = GeminiBackend(bypass_cache=bypass_cache) if engine == "gemini" else LocalBackend()
+    return Pipeline(backend, prompt_mode=prompt_mode)
+
+
+def predict_batch(track_name: str, requests, target_laps: int = 15, bypass_cache: bool = False,
+                  model_name: str = PREDICTION_MODEL):
+    """
+    Gemini forecasts for many (driver, lap) pairs in as few requests as possible.
+
+    The pairs are packed into keyed compact prompts bounded by the batch
+    token budget (gemini_handler.create_batch_prediction_prompts,
+    F1_BATCH_TOKEN_BUDGET), sent concurrently through the response cache and
+    the scheduler, and every answer is split back per key. A full grid at
+    one lap fits in a single request with the default budget.
+
+    Args:
+        track_name (str): Race label or key
+        requests (list[tuple[str, int]]): (driver code, current lap) pairs, e.g. [("VER", 20), ("HAM", 20)]
+        target_laps (int): Laps to forecast per pair
+        bypass_cache (bool): Always call Gemini
+        model_name (str): Gemini model, the single-lap pipeline's PREDICTION_MODEL by default
+
+    Returns:
+        dict: {"status", "results": {(driver, lap): {"status": "success", "predictions"}
+               or {"status": "error", "error"}}, "requests": Gemini requests sent,
+               "reasoning": [one per request], "timings": {stage: ms}, "tokens": {"prompt", "response"}}
+    """
+    timings = {}
+    started = time.perf_counter()
+    race = catalog.find_race(track_name)
+    if race is None:
+        return {"status": "error", "error": f"Unknown race: {track_name}"}
+    total_laps = int(race.get("total_laps") or 0) or None
+
+    results, items, pairs = {}, [], {}
+    laps_by_driver = {}
+    for driver, lap in dict.fromkeys((d, int(l)) for d, l in requests):
+        if driver not in laps_by_driver:
+            laps_by_driver[driver] = _driver_laps(race, driver)
+        df = laps_by_driver[driver]
+        if df.empty or not (df["LapNumber"] <= lap).any():
+            results[(driver, lap)] = {"status": "error", "error": "Not enough historical data"}
+        elif total_laps and lap >= total_laps:
+            results[(driver, lap)] = {"status": "error", "error": "No laps left to predict"}
         else:
-            return {"status": "error", "error": "Not enough historical data"}
-        
-        # Calculate total race laps
-        total_laps = int(df['lap_number'].max())
-        remaining_laps = total_laps - current_lap
-        
-        # Limit predictions to remaining laps
-        target_laps = min(target_laps, remaining_laps)
-        
-    except Exception as e:
-        return {"status": "error", "error": f"Failed to load data: {e}"}
-
-    # --- Build Improved Prompt ---
-    prompt = f"""
-You are an F1 race strategist analyzing {track_name} for Lewis Hamilton.
-
-RACE CONTEXT:
-- Current lap: {current_lap}
-- Total race laps: {total_laps}
-- Remaining laps: {remaining_laps}
-- Predict next: {target_laps} laps
-
-RECENT LAP TIMES (last 10 laps):
-{historical_data[['lap_number', 'lap_time', 'tire_compound', 'tire_age']].to_string(index=False)}
-
-TASK:
-Predict lap times for laps {current_lap + 1} through {current_lap + target_laps}.
-Consider tire degradation patterns shown in the data.
-
-IMPORTANT RULES:
-- Lap numbers must be sequential starting from {current_lap + 1}
-- Do NOT exceed lap {total_laps}
-- Lap times should increase gradually (degradation)
-- Base predictions on the pattern shown in recent laps
-
-Return ONLY valid JSON with this exact structure:
-{{
-    "predictions": [
-        {{"lap": {current_lap + 1}, "predicted_time": 95.5, "confidence": 0.85}},
-        {{"lap": {current_lap + 2}, "predicted_time": 95.7, "confidence": 0.83}},
-        ...
-    ],
-    "reasoning": "Your explanation of degradation pattern and pit strategy recommendation here"
-}}
-"""
+            key = f"{driver}@{lap}"
+            pairs[key] = (driver, lap)
+            items.append({"key": key, "df": df, "current_lap": lap})
+    timings["load"] = round((time.perf_counter() - started) * 1000, 3)
+
+    started = time.perf_counter()
+    batches = create_batch_prediction_prompts(items, target_laps, total_laps, track_name=race["label"])
+    timings["prompt"] = round((time.perf_counter() - started) * 1000, 3)
+
+    started = time.perf_counter()
+    texts = get_predictions([prompt for prompt, _ in batches], bypass_cache=bypass_cache, model_name=model_name)
+    timings["infer"] = round((time.perf_counter() - started) * 1000, 3)
+
+    started = time.perf_counter()
+    reasoning = []
+    for (_, keys), text in zip(batches, texts):
+        parsed = None if text.startswith("[ERROR]") else parse_batch_response(text, keys)
+        reasoning.append(parsed["reasoning"] if parsed else text)
+        for key in keys:
+            driver, lap = pairs[key]
+            if parsed is None:
+                results[(driver, lap)] = {"status": "error", "error": text if text.startswith("[ERROR]")
+                                          else "No valid JSON found in response"}
+                continue
+            predictions = [p for p in parsed["predictions"].get(key, []) if p["lap"] > lap]
+            cleaned = postprocess_stage({"predictions": predictions, "total_laps": total_laps or 999})
+            results[(driver, lap)] = cleaned if cleaned.get("status") == "error" else {"status": "success", **cleaned}
+    timings["parse"] = round((time.perf_counter() - started) * 1000, 3)
+
+    succeeded = sum(r["status"] == "success" for r in results.values())
+    return {
+        "status": "success" if succeeded else "error",
+        **({} if succeeded else {"error": "No valid predictions generated"}),
+        "results": results,
+        "requests": len(batches),
+        "reasoning": reasoning,
+        "timings": timings,
+        "tokens": {"prompt": sum(approx_tokens(prompt) for prompt, _ in batches),
+                   "response": sum(approx_tokens(text) for text in texts)},
+    }
 
-    try:
-        model = genai.GenerativeModel("gemini-2.0-flash-exp")
-        response = model.generate_content(prompt)
-        text = response.text.strip()
 
-        # --- Parse JSON safely ---
-        import json
-        import re
-        
-        # Remove markdown code blocks if present
-        text = re.sub(r'```json\s*', '', text)
-        text = re.sub(r'```\s*', '', text)
-        
-        # Find JSON object
-        start = text.find("{")
-        end = text.rfind("}") + 1
-        
-        if start == -1 or end == 0:
-            return {"status": "error", "error": "No valid JSON found in response"}
-        
-        json_str = text[start:end]
-        parsed = json.loads(json_str)
+def predict_grid(track_name: str, current_lap: int, drivers=None, target_laps: int = 15,
+                 bypass_cache: bool = False, model_name: str = PREDICTION_MODEL):
+    """
+    Forecast every driver (or the given driver codes) at one lap with predict_batch.
 
-        # Validate predictions
-        predictions = parsed.get("predictions", [])
-        
-        # Filter out invalid laps (beyond race end)
-        valid_predictions = [
-            p for p in predictions 
-            if p.get("lap", 999) <= total_laps
-        ]
-        
-        if not valid_predictions:
-            return {"status": "error", "error": "No valid predictions generated"}
+    Returns:
+        dict: Same as predict_batch, with "results" keyed by driver code
+    """
+    race = catalog.find_race(track_name)
+    if race is None:
+        return {"status": "error", "error": f"Unknown race: {track_name}"}
+    drivers = drivers or [d["code"] for d in race.get("drivers") or []]
+    result = predict_batch(track_name, [(d, current_lap) for d in drivers], target_laps, bypass_cache, model_name)
+    if "results" in result:
+        result["results"] = {driver: r for (driver, _), r in result["results"].items()}
+    return result
 
-        return {
-            "status": "success",
-            "predictions": valid_predictions,
-            "reasoning": parsed.get("reasoning", "No reasoning provided"),
-        }
 
-    except json.JSONDecodeError as e:
-        return {"status": "error", "error": f"Failed to parse JSON: {e}"}
-    except Exception as e:
-        return {"status": "error", "error": f"Gemini API call failed: {e}"}
+def _driver_laps(race, driver):
+    """One driver's laps: the cached FastF1 session (with weather) when there is one, else the race CSV."""
+    return load_driver_laps(race, driver)[0]
 
 def recommend_pit_stop(predictions, threshold=2.0):
     """Simple pit stop recommendation logic."""
@@ -325,7 +366,8 @@ def recommend_pit_stop(predictions, threshold=2.0):
     return {
         "recommended_lap": predictions[-1]["lap"],
         "reasoning": "Tire degradation within safe limits; extend current stint.",
-        "window": (predictions[-2]["lap"], predictions[-1]["lap"]),
+        # A single (e.g. first streamed) prediction gives a one-lap window
+        "window": (predictions[max(0, len(predictions) - 2)]["lap"], predictions[-1]["lap"]),
         "time_lost": 0.0,
     }
 
@@ -352,11 +394,11 @@ def compare_strategies(csv_file, current_lap):
     """
     try:
         # Load and process data
-        df = load_race_data(csv_file)
+        df = get_race_data(csv_file)
         df = calculate_degradation(df)
 
         # Simple heuristic simulation
-        total_laps = int(df["lap_number"].max() or 57)
+        total_laps = int(df["LapNumber"].max() or 57)
         remaining_laps = total_laps - current_lap
 
         # Simulated degradation per lap (average from data)
@@ -365,7 +407,7 @@ def compare_strategies(csv_file, current_lap):
             avg_deg = 0.12  # fallback if missing data
 
         # Base lap time (most recent)
-        base_time = df[df["lap_number"] == current_lap]["lap_time"].values
+        base_time = df[df["LapNumber"] == current_lap]["LapTime_seconds"].values
         base_time = base_time[0] if len(base_time) > 0 else 90.0
 
         # --- Strategy 1: One-stop (around lap 25)
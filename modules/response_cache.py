@@ -0,0 +1,230 @@
+"""
+Persistent cache of Gemini responses.
+
+Identical prompts (Streamlit reruns, repeated demos, the same track / lap /
+horizon) are answered from an SQLite file instead of the API. Entries are
+keyed by SHA-256 of the model name plus the whitespace-normalized prompt,
+expire after a TTL, and the least recently used ones are evicted beyond a
+byte budget. Hit/miss/eviction counters are kept in the same file.
+
+CLI:
+    python -m modules.response_cache stats
+    python -m modules.response_cache prune
+    python -m modules.response_cache clear
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from config import RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL
+
+
+def normalize_prompt(prompt):
+    """Collapse all whitespace runs so formatting-only differences share an entry."""
+    return " ".join(prompt.split())
+
+
+def cache_key(model, prompt):
+    """SHA-256 of the model name plus the normalized prompt."""
+    return hashlib.sha256(f"{model}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL and an LRU byte budget."""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # Shared by Streamlit's script threads; access is serialized by the lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+
+    def _bump(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    # -----------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------
+    def get(self, model, prompt):
+        """
+        Cached response for a prompt.
+
+        Returns:
+            str | None: The response text, or None on a miss or an expired entry
+        """
+        key = cache_key(model, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._bump("expired")
+                self._bump("misses")
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._bump("hits")
+            return row[0]
+
+    def put(self, model, prompt, response):
+        """Store a response and evict the least recently used entries beyond the budget."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key(model, prompt), model, response, len(response.encode("utf-8")), now, now),
+            )
+        self.prune()
+
+    def prune(self, max_bytes=None):
+        """
+        Drop expired entries, then least recently used ones until under max_bytes.
+
+        Returns:
+            int: Number of entries removed
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        removed = 0
+        with self._lock:
+            if self.ttl:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)
+                ).rowcount
+
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > max_bytes:
+                for key, size in self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_access"
+                ).fetchall():
+                    if total <= max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+                    self._bump("evictions")
+        return removed
+
+    def clear(self):
+        """Remove every cached response (counters are kept)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """
+        Cache statistics.
+
+        Returns:
+            dict: entries, bytes, budget, TTL and hit/miss/eviction counters
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": int(size),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "expired": counters.get("expired", 0),
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_response_cache():
+    """Process-wide ResponseCache for config.RESPONSE_CACHE_PATH."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ResponseCache()
+        return _default
+
+
+def cached_generate(model, prompt, generate, bypass=False, cache=None):
+    """
+    Return the cached response for (model, prompt), or call generate() and cache it.
+
+    Args:
+        model (str): Model name (part of the cache key)
+        prompt (str): Prompt text
+        generate (callable): Produces the response text on a miss
+        bypass (bool): Skip the lookup and always call generate() (the fresh
+                       response still replaces the cached one)
+        cache (ResponseCache): Cache to use (default: the process-wide one)
+
+    Returns:
+        str: Response text
+    """
+    cache = cache or default_response_cache()
+    if not bypass:
+        cached = cache.get(model, prompt)
+        if cached is not None:
+            return cached
+
+    response = generate()
+    # Never cache failures; they should be retried on the next call
+    if response and not response.startswith("[ERROR]"):
+        cache.put(model, prompt, response)
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune the Gemini response cache.")
+    parser.add_argument("--path", default=RESPONSE_CACHE_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Show size and hit/miss/eviction statistics")
+    sub.add_parser("prune", help="Drop expired and least recently used responses")
+    sub.add_parser("clear", help="Remove every cached response")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.path)
+    if args.command == "prune":
+        print(f"🧹 Removed {cache.prune()} responses")
+    elif args.command == "clear":
+        cache.clear()
+        print("🧹 Cleared the response cache")
+
+    for name, value in cache.stats().items():
+        print(f"{name:>10}: {value}")
+
+
+if __name__ == "__main__":
+    main()
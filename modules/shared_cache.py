@@ -0,0 +1,440 @@
+"""
+Shared, size-bounded, content-addressed cache.
+
+One cache directory (``config.CACHE_DIR``) is used by every downloader and
+reader. FastF1 keeps writing its usual tree into it (``<year>/<event>/<session>/``);
+``sync()`` then moves every file's bytes into a content-addressed object store
+(``.objects/<sha256>``) and hard-links the tree path to the object, so identical
+files (duplicate trees, other checkouts pointing at the same F1_CACHE_DIR) are
+stored once.
+
+An SQLite index tracks size and last access per session directory. When the
+cache goes over its byte budget, the least recently used sessions are evicted
+(FastF1 simply re-downloads them on the next load). Hit/miss/eviction counters
+are kept in the index as well. Reads don't write to the index: last-access
+times and hit/miss counts are buffered in memory and written at most every
+ACCESS_FLUSH_INTERVAL seconds (and before pruning, stats and at exit).
+
+One SharedCache may be used from several threads (Streamlit runs every rerun
+on its own script thread); every index statement is serialized by a lock.
+
+Because deduplicated files share an inode, anything that rewrites cache files
+in place (FastF1 does) must call ``unshare(session_dir)`` first; ``sync()``
+deduplicates them again afterwards.
+
+CLI:
+    python -m modules.shared_cache stats
+    python -m modules.shared_cache sync
+    python -m modules.shared_cache prune [--max-bytes N]
+    python -m modules.shared_cache import <dir>
+"""
+
+import argparse
+import atexit
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from config import CACHE_DIR, CACHE_MAX_BYTES
+
+OBJECTS_DIR = ".objects"
+# Kept inside the object store so index writes never touch the tree's mtimes
+INDEX_NAME = "index.sqlite"
+# Buffered last-access times and hit/miss counts are written at most this often (seconds)
+ACCESS_FLUSH_INTERVAL = 30.0
+
+
+class SharedCache:
+    """Content-addressed cache rooted at one directory with an LRU byte budget."""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, OBJECTS_DIR)
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        # Shared by Streamlit's script threads; access is serialized by the lock
+        # (re-entrant: put / sync / import_tree call prune and _adopt)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.objects_dir, INDEX_NAME), timeout=30,
+                                     isolation_level=None, check_same_thread=False)
+        # Pending index updates from reads: group -> last access, counter -> increment
+        self._accessed = {}
+        self._counts = {}
+        self._flushed = time.monotonic()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                grp TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_grp ON entries (grp);
+            CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+
+    # -----------------------------------------------------------------
+    # Internal helpers
+    # -----------------------------------------------------------------
+    def _bump(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def _flush_access(self):
+        """Write the buffered last-access times and hit/miss counts (lock held)."""
+        self._flushed = time.monotonic()
+        if not self._accessed and not self._counts:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "UPDATE entries SET last_access = MAX(last_access, ?) WHERE grp = ?",
+                [(when, group) for group, when in self._accessed.items()],
+            )
+            for name, amount in self._counts.items():
+                self._bump(name, amount)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._accessed.clear()
+        self._counts.clear()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _link(src, dst):
+        """Hard-link src to dst, falling back to a copy across filesystems."""
+        tmp = f"{dst}.tmp{os.getpid()}"
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    def _adopt(self, key, path, group):
+        """Move one tree file into the object store and index it."""
+        digest = self._hash_file(path)
+        obj = self._object_path(digest)
+        if os.path.exists(obj):
+            # Same content already stored: point the tree path at it
+            if not os.path.samefile(obj, path):
+                self._link(obj, path)
+        else:
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            self._link(path, obj)
+
+        stat = os.stat(path)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (key, grp, digest, size, mtime_ns, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, group, digest, stat.st_size, stat.st_mtime_ns, time.time()),
+        )
+        return digest
+
+    def _drop_unreferenced(self, digests):
+        for digest in digests:
+            used = self._conn.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+            if not used:
+                try:
+                    os.remove(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+
+    # -----------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------
+    def put(self, key, data, group=None):
+        """
+        Store bytes under a key (a "/"-separated path relative to the cache root).
+
+        Returns:
+            str: SHA-256 digest of the stored content
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self._lock:
+            os.replace(tmp, path)
+            digest = self._adopt(key, path, group or key.rsplit("/", 1)[0])
+            self.prune()
+        return digest
+
+    def get_path(self, key):
+        """
+        Look a key up and mark its group as recently used.
+
+        Returns:
+            str | None: Path of the cached file, or None on a miss
+        """
+        path = self._path(key)
+        with self._lock:
+            row = self._conn.execute("SELECT grp FROM entries WHERE key = ?", (key,)).fetchone()
+            hit = row is not None and os.path.exists(path)
+            if hit:
+                self._accessed[row[0]] = time.time()
+            counter = "hits" if hit else "misses"
+            self._counts[counter] = self._counts.get(counter, 0) + 1
+            if time.monotonic() - self._flushed >= ACCESS_FLUSH_INTERVAL:
+                self._flush_access()
+        return path if hit else None
+
+    def get(self, key):
+        """
+        Read the bytes stored under a key.
+
+        Returns:
+            bytes | None: Cached content, or None on a miss
+        """
+        path = self.get_path(key)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def touch_path(self, path):
+        """Record an access to a file inside the cache tree (hit or miss)."""
+        key = os.path.relpath(path, self.root).replace(os.sep, "/")
+        if key.startswith(".."):
+            return None
+        return self.get_path(key)
+
+    def sync(self):
+        """
+        Index files written directly into the tree (e.g. by FastF1), deduplicate
+        them into the object store, forget deleted files, then enforce the budget.
+
+        Returns:
+            int: Number of files (re)indexed
+        """
+        with self._lock:
+            known = {
+                key: (size, mtime_ns)
+                for key, size, mtime_ns in self._conn.execute("SELECT key, size, mtime_ns FROM entries")
+            }
+            seen = set()
+            adopted = 0
+
+            self._conn.execute("BEGIN")
+            try:
+                for dirpath, dirnames, filenames in os.walk(self.root):
+                    dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                    # Only session files are managed; root-level files (e.g. FastF1's
+                    # HTTP cache database) are rewritten in place and stay private
+                    if os.path.samefile(dirpath, self.root):
+                        continue
+                    for name in filenames:
+                        if name.startswith(".") or ".tmp" in name:
+                            continue
+                        path = os.path.join(dirpath, name)
+                        key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                        seen.add(key)
+                        stat = os.stat(path)
+                        if known.get(key) == (stat.st_size, stat.st_mtime_ns):
+                            continue
+                        self._adopt(key, path, os.path.dirname(key).replace(os.sep, "/"))
+                        adopted += 1
+
+                gone = [key for key in known if key not in seen]
+                digests = set()
+                for key in gone:
+                    row = self._conn.execute("SELECT digest FROM entries WHERE key = ?", (key,)).fetchone()
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    digests.add(row[0])
+                self._drop_unreferenced(digests)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            self.prune()
+            return adopted
+
+    def import_tree(self, src_dir):
+        """
+        Copy another cache tree (e.g. an old per-checkout cache) into this one,
+        deduplicating identical files.
+
+        Returns:
+            int: Number of files imported
+        """
+        imported = 0
+        for dirpath, dirnames, filenames in os.walk(src_dir):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                src = os.path.join(dirpath, name)
+                key = os.path.relpath(src, src_dir).replace(os.sep, "/")
+                dst = self._path(key)
+                if os.path.exists(dst) and self._hash_file(dst) == self._hash_file(src):
+                    continue
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                # Never write through an existing (possibly shared) inode
+                tmp = f"{dst}.tmp{os.getpid()}"
+                shutil.copy2(src, tmp)
+                os.replace(tmp, dst)
+                imported += 1
+        self.sync()
+        return imported
+
+    def unshare(self, session_dir):
+        """
+        Give every file of a session directory its own inode again, so a writer
+        (FastF1) can rewrite them in place without touching the shared objects.
+
+        Returns:
+            int: Number of files copied
+        """
+        copied = 0
+        if not os.path.isdir(session_dir):
+            return copied
+        for name in os.listdir(session_dir):
+            path = os.path.join(session_dir, name)
+            if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+                tmp = f"{path}.tmp{os.getpid()}"
+                shutil.copy2(path, tmp)
+                os.replace(tmp, path)
+                copied += 1
+        return copied
+
+    def stored_bytes(self):
+        """Bytes actually on disk (each distinct object counted once)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT digest, MAX(size) AS size FROM entries GROUP BY digest)"
+            ).fetchone()
+            return int(row[0])
+
+    def prune(self, max_bytes=None):
+        """
+        Evict least recently used session groups until the cache fits its budget.
+
+        Returns:
+            list[str]: Evicted groups
+        """
+        with self._lock:
+            self._flush_access()
+            budget = self.max_bytes if max_bytes is None else max_bytes
+            evicted = []
+            while self.stored_bytes() > budget:
+                row = self._conn.execute(
+                    "SELECT grp FROM entries GROUP BY grp ORDER BY MAX(last_access) ASC LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    break
+                group = row[0]
+                rows = self._conn.execute("SELECT key, digest FROM entries WHERE grp = ?", (group,)).fetchall()
+                for key, _ in rows:
+                    try:
+                        os.remove(self._path(key))
+                    except FileNotFoundError:
+                        pass
+                self._conn.execute("DELETE FROM entries WHERE grp = ?", (group,))
+                self._drop_unreferenced({digest for _, digest in rows})
+                self._bump("evictions", len(rows))
+                evicted.append(group)
+            return evicted
+
+    def stats(self):
+        """
+        Cache statistics.
+
+        Returns:
+            dict: entries, groups, stored/logical bytes, budget and hit/miss/eviction counters
+        """
+        with self._lock:
+            self._flush_access()
+            entries, groups, logical = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT grp), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+            return {
+                "root": self.root,
+                "entries": entries,
+                "groups": groups,
+                "stored_bytes": self.stored_bytes(),
+                "logical_bytes": int(logical),
+                "max_bytes": self.max_bytes,
+                "hits": hits,
+                "misses": misses,
+                "evictions": counters.get("evictions", 0),
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+
+    def flush(self):
+        """Write buffered last-access times and hit/miss counts to the index now."""
+        with self._lock:
+            self._flush_access()
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """Process-wide SharedCache for config.CACHE_DIR (buffered accesses are flushed at exit)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SharedCache()
+            atexit.register(_default.flush)
+        return _default
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune the shared F1 cache.")
+    parser.add_argument("--root", default=CACHE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Show size and hit/miss/eviction statistics")
+    sub.add_parser("sync", help="Index and deduplicate files written by FastF1")
+    prune = sub.add_parser("prune", help="Evict least recently used sessions")
+    prune.add_argument("--max-bytes", type=int, default=None)
+    imp = sub.add_parser("import", help="Merge another cache tree into the shared cache")
+    imp.add_argument("src")
+    args = parser.parse_args()
+
+    cache = SharedCache(args.root)
+    if args.command == "sync":
+        print(f"✅ Indexed {cache.sync()} files")
+    elif args.command == "prune":
+        evicted = cache.prune(args.max_bytes)
+        print(f"🧹 Evicted {len(evicted)} sessions" + "".join(f"\n  - {g}" for g in evicted))
+    elif args.command == "import":
+        print(f"✅ Imported {cache.import_tree(args.src)} files from {args.src}")
+
+    for name, value in cache.stats().items():
+        print(f"{name:>14}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Deterministic offline stand-in for a Gemini model.
+
+StandInModel implements the part of genai.GenerativeModel the client uses
+(generate_content_async, plain and streamed), so the whole prediction path
+(response cache, scheduler, retries, pipeline, Streamlit app) can be load
+tested without a network or a quota. Select it with F1_GEMINI_PROVIDER=standin
+(see gemini_client.py).
+
+Answers are schema-valid prediction JSON built from the prompt itself: the
+"Lap NN: time=..s" lines of the context (or the "lap,time_s" rows of a
+compact prompt) are fitted with a least-squares trend and projected over the
+requested laps. Compact prompts get the compact {"p", "r"} answer, batch
+prompts one keyed forecast per block ({"b", "r"}). The same prompt always
+gets the same answer. Latency (log-normal), injected errors (quota /
+unavailable) and response size (reasoning padding) are configurable, and
+drawn from a seeded RNG so a run is reproducible for a given call order.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+
+from google.api_core import exceptions as api_exceptions
+
+from config import (
+    STANDIN_ERROR_RATE,
+    STANDIN_LATENCY_MS,
+    STANDIN_LATENCY_SIGMA,
+    STANDIN_REASONING_CHARS,
+    STANDIN_SEED,
+)
+
+# Streamed answers are cut into chunks of this many characters
+CHUNK_CHARS = 64
+# Share of the latency spent before the first streamed chunk
+FIRST_CHUNK_SHARE = 0.3
+
+_LAP_LINE = re.compile(r"Lap\s+(\d+): time=([\d.]+)s")
+_TABLE_ROW = re.compile(r"^(\d+),(\d+\.\d+)$", re.MULTILINE)
+_LAP_RANGE = re.compile(r"laps (\d+)(?: through |-)(\d+)")
+_NEXT_LAPS = re.compile(r"next:? (\d+) lap")
+_LAST_LAP = re.compile(r"(?:Do NOT exceed|never past) lap (\d+)")
+_COMPACT_ANSWER = '{"p":[['
+_BATCH_ANSWER = '{"b":{'
+_BATCH_BLOCK = re.compile(r"^\[(\S+)\] predict laps (\d+)-(\d+)$", re.MULTILINE)
+# Reasoning cap of compact answers (the prompt asks for at most 25 words)
+COMPACT_REASONING_CHARS = 160
+
+
+class _Response:
+    """Just enough of a genai response: the text."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _trend(history, first, last, rng):
+    """Least-squares trend over (lap, time) pairs projected over laps first..last (flat 90 s without any)."""
+    last_lap = history[-1][0] if history else 0
+    if len(history) >= 2:
+        xs, ys = zip(*history)
+        mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+        sxx = sum((x - mx) ** 2 for x in xs)
+        slope = max(0.0, sum((x - mx) * (y - my) for x, y in history) / sxx) if sxx else 0.0
+        base = history[-1][1] - slope * last_lap
+    else:
+        slope, base = 0.05, (history[0][1] if history else 90.0) - 0.05 * last_lap
+
+    predictions = [
+        {
+            "lap": lap,
+            "predicted_time": round(base + slope * lap + rng.uniform(-0.05, 0.05), 3),
+            "confidence": round(max(0.3, 0.92 - 0.02 * (lap - first)), 2),
+        }
+        for lap in range(first, last + 1)
+    ]
+    return predictions, slope
+
+
+def forecast_from_prompt(prompt, reasoning_chars=STANDIN_REASONING_CHARS):
+    """
+    Prediction JSON for a prompt, derived from the lap lines it contains.
+
+    Args:
+        prompt (str): Prediction prompt (pipeline.build_race_prompt,
+                      gemini_handler.create_prediction_prompt, create_compact_prediction_prompt
+                      or create_batch_prediction_prompts)
+        reasoning_chars (int): Minimum length of the reasoning text (response size knob)
+
+    Returns:
+        str: JSON text with "predictions" and "reasoning" (compact prompts:
+             minified {"p": [[lap, time, confidence], ...], "r": reasoning};
+             batch prompts: {"b": {key: [[lap, time, confidence], ...]}, "r": reasoning})
+    """
+    # Small deterministic noise per prompt
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+
+    if _BATCH_ANSWER in prompt:
+        titles = list(_BATCH_BLOCK.finditer(prompt))
+        answers = {}
+        for i, title in enumerate(titles):
+            block = prompt[title.end():titles[i + 1].start() if i + 1 < len(titles) else len(prompt)]
+            history = [(int(lap), float(t)) for lap, t in _TABLE_ROW.findall(block)]
+            predictions, _ = _trend(history, int(title.group(2)), int(title.group(3)), rng)
+            answers[title.group(1)] = [[p["lap"], p["predicted_time"], p["confidence"]] for p in predictions]
+        reasoning = f"Stand-in forecast: linear trend per block for {len(answers)} blocks."
+        return json.dumps({"b": answers, "r": reasoning}, separators=(",", ":"))
+
+    compact = _COMPACT_ANSWER in prompt
+    lines = _TABLE_ROW.findall(prompt) if compact else _LAP_LINE.findall(prompt)
+    history = [(int(lap), float(t)) for lap, t in lines]
+    last_lap = history[-1][0] if history else 0
+
+    lap_range = _LAP_RANGE.search(prompt)
+    if lap_range:
+        first, last = int(lap_range.group(1)), int(lap_range.group(2))
+    else:
+        count = _NEXT_LAPS.search(prompt)
+        first = last_lap + 1
+        last = last_lap + (int(count.group(1)) if count else 15)
+    cap = _LAST_LAP.search(prompt)
+    if cap:
+        last = min(last, int(cap.group(1)))
+
+    predictions, slope = _trend(history, first, last, rng)
+
+    reasoning = (f"Stand-in forecast: linear trend of {slope:+.3f} s/lap fitted on "
+                 f"{len(history)} laps from the prompt.")
+    if len(reasoning) < reasoning_chars:
+        reasoning += " " + "Degradation stable." * math.ceil((reasoning_chars - len(reasoning)) / 19)
+        reasoning = reasoning[:reasoning_chars]
+    if compact:
+        return json.dumps({
+            "p": [[p["lap"], p["predicted_time"], p["confidence"]] for p in predictions],
+            "r": reasoning[:COMPACT_REASONING_CHARS],
+        }, separators=(",", ":"))
+    return json.dumps({"predictions": predictions, "reasoning": reasoning}, indent=2)
+
+
+class StandInModel:
+    """
+    Offline GenerativeModel look-alike with configurable latency and errors.
+
+    Args:
+        model_name (str): Reported model name (does not change the answers)
+        latency_ms (float): Median latency of one call
+        latency_sigma (float): Log-normal shape; p99 is about median * exp(2.33 * sigma)
+        error_rate (float): Share of calls that fail (half quota, half unavailable)
+        reasoning_chars (int): Minimum reasoning length (response size)
+        seed (int): Seed of the latency / error draws
+    """
+
+    def __init__(self, model_name="standin", latency_ms=STANDIN_LATENCY_MS, latency_sigma=STANDIN_LATENCY_SIGMA,
+                 error_rate=STANDIN_ERROR_RATE, reasoning_chars=STANDIN_REASONING_CHARS, seed=STANDIN_SEED):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.reasoning_chars = reasoning_chars
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _draw(self):
+        """Latency (s) and injected error of the next call."""
+        with self._lock:
+            self.calls += 1
+            latency = self.latency_ms / 1000 * math.exp(self._rng.gauss(0, self.latency_sigma))
+            failure = self._rng.random() < self.error_rate
+            quota = self._rng.random() < 0.5
+        if not failure:
+            return latency, None
+        if quota:
+            return latency * 0.1, api_exceptions.ResourceExhausted("429 Stand-in quota exceeded")
+        return latency, api_exceptions.ServiceUnavailable("503 Stand-in unavailable")
+
+    async def generate_content_async(self, prompt, stream=False):
+        latency, error = self._draw()
+        text = forecast_from_prompt(prompt, self.reasoning_chars)
+
+        if not stream:
+            await asyncio.sleep(latency)
+            if error:
+                raise error
+            return _Response(text)
+
+        await asyncio.sleep(latency * FIRST_CHUNK_SHARE)
+        if error:
+            raise error
+        return self._stream(text, latency * (1 - FIRST_CHUNK_SHARE))
+
+    async def _stream(self, text, duration):
+        chunks = [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+        for chunk in chunks:
+            yield _Response(chunk)
+            await asyncio.sleep(duration / len(chunks))
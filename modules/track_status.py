@@ -0,0 +1,101 @@
+"""
+Track status and pit flags per lap.
+
+Safety car, VSC, red flag and pit laps are not representative of tire
+degradation. tag_laps joins the cached track_status feed onto the lap
+intervals (lap start -> lap end) of every driver at once and adds flag
+columns, including ``exclude_from_fit`` which the degradation engines use to
+leave those laps out.
+
+The join is vectorized: each lap's interval is mapped to a range of status
+rows with two searchsorted calls, and "was status X active during the lap"
+becomes a difference of per-status prefix counts over that range.
+"""
+
+import numpy as np
+import pandas as pd
+
+# FastF1 track status codes
+STATUS_GREEN = "1"
+STATUS_YELLOW = "2"
+STATUS_SC = "4"
+STATUS_RED = "5"
+STATUS_VSC = "6"
+STATUS_VSC_ENDING = "7"
+STATUS_CODES = ["1", "2", "3", "4", "5", "6", "7"]
+
+# Laps that saw any of these are left out of degradation fitting
+NEUTRALISED_CODES = [STATUS_SC, STATUS_RED, STATUS_VSC, STATUS_VSC_ENDING]
+
+FLAG_COLUMNS = ["track_status", "is_yellow", "is_sc", "is_vsc", "is_red",
+                "pit_in", "pit_out", "exclude_from_fit"]
+
+
+def tag_laps(laps, track_status):
+    """
+    Tag every lap with the track statuses active during it and its pit flags.
+
+    Args:
+        laps (DataFrame): Converted session laps (see columnar_sessions.py) with
+                          lap_number, time (lap end), lap_start_time, pit_in_time,
+                          pit_out_time; any number of drivers
+        track_status (DataFrame): time, status (code as string)
+
+    Returns:
+        DataFrame: laps with added columns
+        - track_status: codes active during the lap, e.g. "1", "124" (FastF1 style)
+        - is_yellow / is_sc / is_vsc / is_red: status seen during the lap
+        - pit_in / pit_out: the lap ends in / starts from the pit lane
+        - exclude_from_fit: pit lap or neutralised (SC, VSC, red flag) lap
+    """
+    laps = laps.copy()
+    n = len(laps)
+
+    # ---------------------------------------------------------------------
+    # 1. Interval join: status rows active between lap start and lap end
+    # ---------------------------------------------------------------------
+    end = laps["time"].to_numpy(dtype=float)
+    start = laps["lap_start_time"].to_numpy(dtype=float)
+    start = np.where(np.isnan(start), end, start)  # lap 1 without a start: status at its end
+
+    if track_status is None or track_status.empty:
+        active = {code: np.zeros(n, dtype=bool) for code in STATUS_CODES}
+        active[STATUS_GREEN] = np.ones(n, dtype=bool)
+    else:
+        status = track_status.sort_values("time", kind="stable")
+        times = status["time"].to_numpy(dtype=float)
+        codes = status["status"].astype(str).to_numpy()
+
+        # Status in force at the lap start, up to the last change before the lap end
+        first = np.searchsorted(times, start, side="right") - 1
+        last = np.searchsorted(times, end, side="right") - 1
+        before_feed = first < 0  # laps before the first status message count as green
+        first = np.maximum(first, 0)
+
+        active = {}
+        for code in STATUS_CODES:
+            counts = np.r_[0, np.cumsum(codes == code)]
+            seen = counts[np.maximum(last, -1) + 1] - counts[first] > 0
+            active[code] = seen & (last >= 0)
+        active[STATUS_GREEN] |= before_feed
+
+    combined = np.full(n, "", dtype="<U7")
+    for code in STATUS_CODES:
+        combined = np.char.add(combined, np.where(active[code], code, ""))
+    laps["track_status"] = pd.Series(combined, index=laps.index, dtype="string")
+    laps["is_yellow"] = active[STATUS_YELLOW]
+    laps["is_sc"] = active[STATUS_SC]
+    laps["is_vsc"] = active[STATUS_VSC] | active[STATUS_VSC_ENDING]
+    laps["is_red"] = active[STATUS_RED]
+
+    # ---------------------------------------------------------------------
+    # 2. Pit flags (lap 1 always has a pit-out time from leaving the garage)
+    # ---------------------------------------------------------------------
+    laps["pit_in"] = laps["pit_in_time"].notna().to_numpy()
+    laps["pit_out"] = laps["pit_out_time"].notna().to_numpy() & (laps["lap_number"].to_numpy() > 1)
+
+    neutralised = np.zeros(n, dtype=bool)
+    for code in NEUTRALISED_CODES:
+        neutralised |= active[code]
+    laps["exclude_from_fit"] = neutralised | laps["pit_in"].to_numpy() | laps["pit_out"].to_numpy()
+    return laps
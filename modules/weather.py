@@ -0,0 +1,88 @@
+"""
+Weather samples joined onto laps.
+
+FastF1 records weather roughly once a minute (weather_data.ff1pkl). merge_weather
+attaches the latest sample at or before each lap's end to every lap of every
+driver with one sorted as-of merge, so track temperature, air temperature,
+humidity and rainfall become lap columns that can be persisted with the laps.
+"""
+
+import pandas as pd
+
+WEATHER_COLUMNS = ["track_temp", "air_temp", "humidity", "rainfall"]
+
+# FastF1 weather_data columns -> lap store names
+FASTF1_WEATHER_MAP = {
+    "TrackTemp": "track_temp",
+    "AirTemp": "air_temp",
+    "Humidity": "humidity",
+    "Rainfall": "rainfall",
+}
+
+
+def weather_frame(weather):
+    """
+    Normalize weather samples to time (seconds of session time) + WEATHER_COLUMNS.
+
+    Args:
+        weather (DataFrame): FastF1 ``session.weather_data`` (Time as timedelta,
+                             TrackTemp, ...) or a converted weather table
+                             (time in seconds, track_temp, ...)
+
+    Returns:
+        DataFrame sorted by time
+    """
+    if weather is None or len(weather) == 0:
+        return pd.DataFrame({"time": pd.Series(dtype=float),
+                             **{col: pd.Series(dtype=float) for col in WEATHER_COLUMNS}})
+
+    df = weather.rename(columns={"Time": "time", **FASTF1_WEATHER_MAP})
+    if pd.api.types.is_timedelta64_dtype(df["time"]):
+        df = df.assign(time=df["time"].dt.total_seconds())
+
+    df = df[["time"] + WEATHER_COLUMNS].dropna(subset=["time"])
+    df = df.astype({"time": float, "track_temp": float, "air_temp": float, "humidity": float})
+    df["rainfall"] = df["rainfall"].astype(bool)
+    return df.sort_values("time", kind="stable").reset_index(drop=True)
+
+
+def merge_weather(laps, weather, time_column="time"):
+    """
+    As-of merge of weather samples onto laps (all drivers in one pass).
+
+    Each lap gets the most recent sample at or before its end time; laps that
+    end before the first sample get the first sample.
+
+    Args:
+        laps (DataFrame): Laps with a lap end time in seconds of session time
+        weather (DataFrame): Weather samples (see weather_frame)
+        time_column (str): Lap end time column
+
+    Returns:
+        DataFrame: laps (same order and index) with WEATHER_COLUMNS added
+    """
+    samples = weather_frame(weather)
+    laps = laps.drop(columns=[c for c in WEATHER_COLUMNS if c in laps.columns])
+    if samples.empty:
+        return laps.assign(**{col: float("nan") for col in WEATHER_COLUMNS})
+
+    keys = pd.DataFrame({"_time": laps[time_column].astype(float).to_numpy(),
+                         "_row": range(len(laps))})
+    valid = keys["_time"].notna()
+    merged = pd.merge_asof(
+        keys[valid].sort_values("_time", kind="stable"),
+        samples.rename(columns={"time": "_time"}),
+        on="_time",
+        direction="backward",
+    )
+    first = samples.iloc[0]
+    early = merged["track_temp"].isna()
+    for col in WEATHER_COLUMNS:
+        merged.loc[early, col] = first[col]
+
+    # Back to the original lap order
+    merged = merged.set_index("_row").reindex(range(len(laps)))
+    for col in WEATHER_COLUMNS:
+        laps[col] = merged[col].to_numpy()
+    laps["rainfall"] = laps["rainfall"].astype("boolean")
+    return laps
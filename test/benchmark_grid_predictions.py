@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+benchmark_grid_predictions.py
+
+Full-grid forecast at one lap, offline against the stand-in model
+(modules/standin_gemini.py):
+1. One compact prompt per driver, sent one after another (one round trip each)
+2. predict_grid: every driver packed into keyed batch prompts bounded by
+   F1_BATCH_TOKEN_BUDGET (one round trip for a 20-car grid by default)
+Reports wall time, Gemini requests, estimated tokens and whether both paths
+forecast the same laps for every driver.
+
+Example:
+    PYTHONPATH=. python test/benchmark_grid_predictions.py --lap 20 --latency-ms 800
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Before the project imports: offline provider, throwaway response cache, generous quota
+os.environ.setdefault("F1_GEMINI_PROVIDER", "standin")
+os.environ.setdefault("F1_RESPONSE_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "responses.sqlite"))
+os.environ.setdefault("F1_GEMINI_RPM", "100000")
+
+from modules import catalog, gemini_client  # noqa: E402
+from modules.gemini_handler import (  # noqa: E402
+    create_compact_prediction_prompt,
+    get_prediction,
+    parse_prediction_response,
+)
+from modules.pipeline import PREDICTION_MODEL  # noqa: E402
+from modules.predicator import _driver_laps, predict_grid  # noqa: E402
+from modules.standin_gemini import StandInModel  # noqa: E402
+
+TRACK = "Bahrain GP 2024"
+
+
+def per_driver(race, lap, target_laps):
+    """Baseline: one compact prompt and one round trip per driver."""
+    laps, prompt_tokens, response_tokens = {}, 0, 0
+    for driver in race["drivers"]:
+        df = _driver_laps(race, driver["code"])
+        if df.empty:
+            continue
+        prompt = create_compact_prediction_prompt(df, lap, target_laps, race["total_laps"], race["label"],
+                                                  driver=driver["name"])
+        if not prompt:
+            continue
+        text = get_prediction(prompt, bypass_cache=True, model_name=PREDICTION_MODEL)
+        parsed = parse_prediction_response(text)
+        prompt_tokens += gemini_client.approx_tokens(prompt)
+        response_tokens += gemini_client.approx_tokens(text)
+        if parsed:
+            laps[driver["code"]] = [p["lap"] for p in parsed["predictions"]]
+    return laps, prompt_tokens, response_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched vs per-driver grid forecasts.")
+    parser.add_argument("--track", default=TRACK)
+    parser.add_argument("--lap", type=int, default=20)
+    parser.add_argument("--target-laps", type=int, default=15)
+    parser.add_argument("--latency-ms", type=float, default=None, help="Stand-in median latency")
+    args = parser.parse_args()
+
+    if gemini_client.PROVIDERS.get("standin") is StandInModel and args.latency_ms is not None:
+        gemini_client.register_provider("standin", lambda name: StandInModel(name, latency_ms=args.latency_ms,
+                                                                             latency_sigma=0.0))
+        gemini_client.use_provider("standin")
+
+    race = catalog.find_race(args.track)
+    if race is None:
+        print(f"❌ Unknown race: {args.track}")
+        return 1
+    print(f"🏁 {race['label']}: {len(race['drivers'])} drivers at lap {args.lap}, "
+          f"provider {os.environ['F1_GEMINI_PROVIDER']}")
+
+    gemini_client.clear_usage()
+    started = time.perf_counter()
+    single_laps, single_prompt, single_response = per_driver(race, args.lap, args.target_laps)
+    single_elapsed = time.perf_counter() - started
+    single_calls = gemini_client.usage_stats()["calls"]
+    print(f"\n1️⃣ Per driver: {single_elapsed:.2f} s, {single_calls} requests, "
+          f"~{single_prompt} prompt / ~{single_response} response tokens")
+
+    gemini_client.clear_usage()
+    started = time.perf_counter()
+    result = predict_grid(args.track, args.lap, target_laps=args.target_laps, bypass_cache=True)
+    batch_elapsed = time.perf_counter() - started
+    if result["status"] != "success":
+        print(f"❌ Batch failed: {result.get('error')}")
+        return 1
+    print(f"📦 Batched: {batch_elapsed:.2f} s, {result['requests']} requests, "
+          f"~{result['tokens']['prompt']} prompt / ~{result['tokens']['response']} response tokens")
+    print(f"   stages (ms): {result['timings']}")
+    print(f"   {single_elapsed / batch_elapsed:.1f}x faster")
+
+    batch_laps = {d: [p["lap"] for p in r.get("predictions", [])] for d, r in result["results"].items()
+                  if r["status"] == "success"}
+    same = batch_laps == single_laps
+    print(f"\n{'✅' if same else '❌'} Same forecast laps for {len(batch_laps)} drivers")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
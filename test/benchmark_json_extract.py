@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+benchmark_json_extract.py
+
+Micro-benchmark of parse_prediction_response on large Gemini-style responses:
+1. Checks the single-scan extractor against tricky inputs (fences, prose with
+   braces, braces and escaped quotes inside strings, malformed entries, the
+   compact array format), next to what the previous parser returned
+2. Times it against the previous three-attempt parser (full json.loads, fenced
+   regex, greedy regex, try/except per entry) on bare, fenced, chatty,
+   unfenced-in-prose and half-malformed responses
+"""
+
+import contextlib
+import io
+import json
+import re
+import statistics
+import time
+
+from modules.gemini_handler import parse_prediction_response
+
+ENTRIES = 2000
+RUNS = 50
+
+
+def legacy_validate(data):
+    """The previous entry validation: one try/except per entry."""
+    if not isinstance(data, dict) or not isinstance(data.get("predictions"), list):
+        return None
+    cleaned = []
+    for p in data["predictions"]:
+        try:
+            cleaned.append({
+                "lap": int(p.get("lap")),
+                "predicted_time": float(p.get("predicted_time")),
+                "confidence": float(p.get("confidence")),
+            })
+        except Exception:
+            continue
+    return {"predictions": cleaned, "reasoning": data.get("reasoning")} if cleaned else None
+
+
+def legacy_parse(response_text):
+    """The previous parser: up to three full parses of the text."""
+    try:
+        data = json.loads(response_text)
+        if isinstance(data, dict):
+            return legacy_validate(data)
+    except Exception:
+        pass
+    try:
+        match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response_text, re.DOTALL | re.IGNORECASE)
+        if match:
+            return legacy_validate(json.loads(match.group(1)))
+    except Exception:
+        pass
+    try:
+        match = re.search(r"(\{[\s\S]*\})", response_text)
+        if match:
+            return legacy_validate(json.loads(match.group(1)))
+    except Exception:
+        pass
+    return None
+
+
+def make_payload(entries, malformed_every=0):
+    return json.dumps({
+        "predictions": [
+            {"lap": 16 + i, "predicted_time": round(95.0 + i * 0.05, 3),
+             "confidence": None if malformed_every and i % malformed_every == 0 else 0.85}
+            for i in range(entries)
+        ],
+        "reasoning": 'Degradation is stable; the "undercut" window {laps 20-24} stays open.',
+    }, indent=2)
+
+
+def make_responses(entries):
+    payload = make_payload(entries)
+    prose = "Looking at the stint data, tire wear looks linear. " * 200
+    return {
+        "bare": payload,
+        "fenced": f"```json\n{payload}\n```",
+        "chatty": f"{prose}Here is my forecast {{see below}}:\n```json\n{payload}\n```\n{prose}"
+                  "Let me know if you need {more} detail.",
+        "unfenced": f"{prose}\n{payload}\n{prose}",
+        "malformed": make_payload(entries, malformed_every=2),
+    }
+
+
+def check_correctness():
+    payload = make_payload(3)
+    cases = {
+        "bare": payload,
+        "fenced": f"```json\n{payload}\n```",
+        "prose braces": f"Using {{a simple model}}: {payload} Hope this helps {{:",
+        "unclosed prose brace": f"Note {{unfinished thought\n{payload}",
+        "escaped quotes": payload.replace("undercut", 'under\\"cut\\\\'),
+        "malformed entry": payload.replace('"confidence": 0.85', '"confidence": null', 1),
+        "object before": f'{{"note": "not it"}} then {payload}',
+        "trailing prose braces": f"{payload}\nAn alternative {{two-stop}} plan is possible.",
+        "compact arrays": '{"p":[[16,95.0,0.85],[17,95.05,0.85],[18,95.1,0.85]],"r":"Stable [no cliff]."}',
+    }
+    expected_laps = {"malformed entry": [17, 18]}
+    for name, text in cases.items():
+        parsed = parse_prediction_response(text)
+        laps = [p["lap"] for p in parsed["predictions"]] if parsed else None
+        want = expected_laps.get(name, [16, 17, 18])
+        with contextlib.redirect_stdout(io.StringIO()):
+            legacy = legacy_parse(text)
+        legacy_laps = [p["lap"] for p in legacy["predictions"]] if legacy else None
+        print(f"   {'✅' if laps == want else '❌'} {name}: {laps} (legacy: {legacy_laps})")
+
+
+def timed(fn, text):
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    print("🔎 Correctness:")
+    check_correctness()
+
+    print(f"\n⏱️ {ENTRIES} predictions per response, median of {RUNS} runs:")
+    for name, text in make_responses(ENTRIES).items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            new_ms = timed(parse_prediction_response, text)
+            old_ms = timed(legacy_parse, text)
+        print(f"   {name:>7} ({len(text) / 1024:.0f} KB): single scan {new_ms:.2f} ms, "
+              f"legacy {old_ms:.2f} ms ({old_ms / new_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+benchmark_predictors.py
+
+Benchmarks the local degradation model against the Gemini path:
+1. Latency of predict_tire_degradation(engine="local") over many calls
+2. Latency of one engine="gemini" call (skipped without GEMINI_API_KEY unless
+   replaying a cassette), bypassing the response cache
+3. Mean absolute error of both against the real lap times of the race
+4. Pit-stop recommendation and chart timings on the Gemini predictions
+
+For reproducible runs, record the Gemini traffic once and replay it
+(modules/cassette.py):
+    F1_GEMINI_PROVIDER=record PYTHONPATH=. python test/benchmark_predictors.py
+    F1_GEMINI_PROVIDER=replay PYTHONPATH=. python test/benchmark_predictors.py
+"""
+
+import statistics
+import sys
+import time
+
+from config import API_KEY, CASSETTE_SOURCE, GEMINI_PROVIDER
+from modules import catalog
+from modules.data_processor import get_race_data
+from modules.predicator import predict_tire_degradation, recommend_pit_stop
+
+TRACK = "Bahrain GP 2024"
+CURRENT_LAP = 15
+TARGET_LAPS = 15
+LOCAL_RUNS = 200
+
+
+def mean_abs_error(predictions, actual):
+    errors = [abs(p["predicted_time"] - actual[p["lap"]]) for p in predictions if p["lap"] in actual]
+    return statistics.mean(errors) if errors else float("nan")
+
+
+def timed(track, engine):
+    started = time.perf_counter()
+    result = predict_tire_degradation(track, current_lap=CURRENT_LAP, target_laps=TARGET_LAPS, engine=engine,
+                                      bypass_cache=engine == "gemini")
+    return result, time.perf_counter() - started
+
+
+def time_downstream(predictions, runs=LOCAL_RUNS):
+    """Median ms of the pit-stop recommendation and the degradation chart."""
+    started = time.perf_counter()
+    for _ in range(runs):
+        recommend_pit_stop(predictions, threshold=2.0)
+    pit_ms = (time.perf_counter() - started) / runs * 1000
+    print(f"   pit-stop recommendation: {pit_ms:.3f} ms")
+
+    try:
+        from modules.visualizer import create_degradation_chart
+    except ImportError as e:
+        print(f"   chart: skipped ({e})")
+        return
+    started = time.perf_counter()
+    for _ in range(10):
+        create_degradation_chart(predictions)
+    print(f"   degradation chart: {(time.perf_counter() - started) / 10 * 1000:.1f} ms")
+
+
+def main():
+    track = sys.argv[1] if len(sys.argv) > 1 else TRACK
+    df = get_race_data(catalog.race_file(track))
+    actual = dict(zip(df["LapNumber"], df["LapTime_seconds"]))
+
+    # -----------------------------------------------------------------
+    # 1. Local model
+    # -----------------------------------------------------------------
+    timed(track, "local")  # warm caches (CSV parse, track curves)
+    timings = []
+    for _ in range(LOCAL_RUNS):
+        result, elapsed = timed(track, "local")
+        timings.append(elapsed)
+
+    print(f"⚡ Local model ({LOCAL_RUNS} calls):")
+    print(f"   median {statistics.median(timings) * 1000:.3f} ms, max {max(timings) * 1000:.3f} ms")
+    if result["status"] == "success":
+        print(f"   MAE vs actual: {mean_abs_error(result['predictions'], actual):.3f} s")
+        print(f"   stages (ms): {result['timings']}")
+        print(f"   {result['reasoning']}")
+    else:
+        print(f"   ❌ {result['error']}")
+
+    # -----------------------------------------------------------------
+    # 2. Gemini
+    # -----------------------------------------------------------------
+    uses_api = GEMINI_PROVIDER == "gemini" or (GEMINI_PROVIDER == "record" and CASSETTE_SOURCE == "gemini")
+    if uses_api and not API_KEY:
+        print("\n⚠️ GEMINI_API_KEY not set — skipping the Gemini benchmark.")
+        return
+
+    result, elapsed = timed(track, "gemini")
+    print(f"\n🤖 Gemini (1 call, provider {GEMINI_PROVIDER}):")
+    print(f"   {elapsed * 1000:.0f} ms")
+    if result["status"] == "success":
+        print(f"   MAE vs actual: {mean_abs_error(result['predictions'], actual):.3f} s")
+        print(f"   stages (ms): {result['timings']}")
+        print(f"   Local model is {elapsed / statistics.median(timings):.0f}x faster")
+        time_downstream(result["predictions"])
+    else:
+        print(f"   ❌ {result['error']}")
+
+
+if __name__ == "__main__":
+    main()
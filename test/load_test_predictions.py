@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+load_test_predictions.py
+
+Offline load test of the whole Gemini prediction path (pipeline, response
+cache, scheduler, client retries) against the deterministic stand-in model
+(modules/standin_gemini.py):
+1. Fires --requests predictions from --concurrency threads (one per simulated
+   app session), bypassing the response cache so every request goes upstream
+2. Reports throughput, latency percentiles, errors, scheduler metrics and
+   prompt / response token usage (run with and without --compact to compare
+   latency per token of the two prompt formats)
+
+Example:
+    PYTHONPATH=. python test/load_test_predictions.py --requests 500 --concurrency 200 --latency-ms 300
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Before the project imports: offline provider, throwaway response cache, generous quota
+os.environ.setdefault("F1_GEMINI_PROVIDER", "standin")
+os.environ.setdefault("F1_RESPONSE_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "responses.sqlite"))
+os.environ.setdefault("F1_GEMINI_RPM", "100000")
+
+from modules import gemini_client  # noqa: E402
+from modules.gemini_scheduler import default_scheduler  # noqa: E402
+from modules.predicator import predict_tire_degradation, stream_tire_degradation  # noqa: E402
+from modules.standin_gemini import StandInModel  # noqa: E402
+
+TRACK = "Bahrain GP 2024"
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def one_request(track, lap, stream, prompt_mode):
+    started = time.perf_counter()
+    first = None
+    if stream:
+        for event in stream_tire_degradation(track, current_lap=lap, bypass_cache=True, prompt_mode=prompt_mode):
+            if event["type"] == "prediction" and first is None:
+                first = time.perf_counter() - started
+            if event["type"] == "done":
+                result = event
+    else:
+        result = predict_tire_degradation(track, current_lap=lap, bypass_cache=True, prompt_mode=prompt_mode)
+    return result, time.perf_counter() - started, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the Gemini prediction path.")
+    parser.add_argument("--track", default=TRACK)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=100, help="Concurrent simulated sessions")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Stand-in median latency")
+    parser.add_argument("--sigma", type=float, default=None, help="Stand-in log-normal latency shape")
+    parser.add_argument("--error-rate", type=float, default=None, help="Stand-in error rate")
+    parser.add_argument("--reasoning-chars", type=int, default=None, help="Stand-in response size")
+    parser.add_argument("--same-lap", action="store_true", help="Every request asks for the same lap (coalescing)")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming path")
+    parser.add_argument("--compact", action="store_true", help="Send the compact prompt")
+    args = parser.parse_args()
+
+    options = {k: v for k, v in {
+        "latency_ms": args.latency_ms, "latency_sigma": args.sigma,
+        "error_rate": args.error_rate, "reasoning_chars": args.reasoning_chars,
+    }.items() if v is not None}
+    if gemini_client.PROVIDERS.get("standin") is StandInModel and options:
+        gemini_client.register_provider("standin", lambda name: StandInModel(name, **options))
+        gemini_client.use_provider("standin")
+
+    prompt_mode = "compact" if args.compact else "verbose"
+    laps = [20 if args.same_lap else 5 + i % 40 for i in range(args.requests)]
+    print(f"🚦 {args.requests} requests, {args.concurrency} concurrent, provider "
+          f"{os.environ['F1_GEMINI_PROVIDER']}, {prompt_mode} prompt{' (streaming)' if args.stream else ''}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(lambda lap: one_request(args.track, lap, args.stream, prompt_mode), laps))
+    elapsed = time.perf_counter() - started
+
+    latencies = [o[1] for o in outcomes]
+    firsts = [o[2] for o in outcomes if o[2] is not None]
+    errors = [o[0].get("error") for o in outcomes if o[0].get("status") != "success"]
+
+    print(f"\n⏱️ {elapsed:.2f} s total, {len(outcomes) / elapsed:.1f} predictions/s")
+    print(f"   latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms")
+    if firsts:
+        print(f"   first prediction p50 {statistics.median(firsts) * 1000:.0f} ms")
+    print(f"   errors: {len(errors)}" + (f" (e.g. {errors[0]})" if errors else ""))
+
+    print("\n📊 Scheduler:")
+    for name, value in default_scheduler().metrics().items():
+        print(f"   {name:>18}: {value}")
+
+    print("\n🔢 Token usage per call:")
+    for name, value in gemini_client.usage_stats().items():
+        print(f"   {name:>26}: {value}")
+    return 1 if len(errors) == len(outcomes) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
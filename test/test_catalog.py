@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+test_catalog.py
+
+Tests:
+1. build_catalog() lists every cached race
+2. Per-driver CSVs are attached to their race, including last names written
+   with underscores (bahrain_2024_de_vries.csv, as download_all_data.driver_keys
+   names them)
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+from modules import catalog
+
+CSV_NAMES = ["bahrain_2024_hamilton.csv", "bahrain_2024_de_vries.csv"]
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    try:
+        for name in CSV_NAMES:
+            shutil.copyfile(os.path.join("data", "bahrain_2024_hamilton.csv"), os.path.join(tmp, name))
+        built = catalog.build_catalog(data_dir=tmp, store_dir=os.path.join(tmp, "store"))
+    finally:
+        shutil.rmtree(tmp)
+
+    races = {r["key"]: r for r in built["races"]}
+    ok = "bahrain" in races and {"hamilton", "de_vries"} <= set(races["bahrain"]["files"])
+    print(f"{'✅' if ok else '❌'} {len(races)} races; Bahrain files: "
+          f"{sorted(races['bahrain']['files']) if 'bahrain' in races else None}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
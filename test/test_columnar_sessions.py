@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+test_columnar_sessions.py
+
+Tests:
+1. Converts (or reuses) the columnar copy of every cataloged race session
+2. Compares the converted tyre_life / compound of Hamilton's laps with the
+   shipped CSVs (FastF1 TyreLife / Compound), including stints after pit stops
+3. The laps served for predictions (load_driver_laps) carry the weather
+   joined at conversion (TrackTemp on every lap)
+"""
+
+import sys
+
+import pandas as pd
+
+from modules import catalog, columnar_sessions
+from modules.data_processor import load_driver_laps
+
+
+def main():
+    failures = 0
+    for race in catalog.load_catalog()["races"]:
+        csv_file = race["files"].get(catalog.DEFAULT_DRIVER)
+        if not csv_file or not race.get("cache_dir"):
+            continue
+
+        laps = columnar_sessions.read_table(race["cache_dir"], "laps", driver="HAM")
+        csv = pd.read_csv(csv_file).dropna(subset=["tire_age"])
+        merged = csv.merge(laps, on="lap_number", how="inner")
+
+        age_mismatch = merged[merged["tire_age"].astype(int) != merged["tyre_life"].astype(int)]
+        compound_mismatch = merged[merged["tire_compound"] != merged["compound"]]
+        ok = len(merged) == len(csv) and age_mismatch.empty and compound_mismatch.empty
+        failures += not ok
+
+        print(f"{'✅' if ok else '❌'} {race['label']}: {len(merged)}/{len(csv)} laps, "
+              f"{len(age_mismatch)} tyre_life and {len(compound_mismatch)} compound mismatches")
+        if not age_mismatch.empty:
+            print(age_mismatch[["lap_number", "tire_age", "tyre_life", "stint"]].head().to_string(index=False))
+
+        df, _ = load_driver_laps(race, catalog.DEFAULT_DRIVER)
+        ok = "TrackTemp" in df.columns and df["TrackTemp"].notna().all()
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {race['label']}: weather on {len(df)} prediction laps")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
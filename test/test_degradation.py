@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+test_degradation.py
+
+Tests:
+1. accumulate_degradation() matches calculate_degradation() exactly on a race CSV
+2. DegradationTracker fed lap by lap matches the batch result
+3. Pit in/out laps and SC/VSC laps are left out of calculate_degradation()
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from modules.data_processor import STORE_COLUMN_MAP, _clean_race_data, calculate_degradation
+from modules.degradation import DEGRADATION_COLUMNS, DegradationTracker, accumulate_degradation, lap_flags
+
+
+def check_batch(csv_path):
+    df = _clean_race_data(pd.read_csv(csv_path).rename(columns=STORE_COLUMN_MAP))
+    expected = calculate_degradation(df)[DEGRADATION_COLUMNS].to_numpy()
+    actual = accumulate_degradation(df)[DEGRADATION_COLUMNS].to_numpy()
+    assert np.array_equal(expected, actual, equal_nan=True), f"Batch mismatch for {csv_path}"
+    print(f"✅ {csv_path}: {len(df)} laps identical")
+
+
+def check_streaming(csv_path):
+    df = _clean_race_data(pd.read_csv(csv_path).rename(columns=STORE_COLUMN_MAP))
+    expected = calculate_degradation(df)
+    stints, excluded = lap_flags(df)
+
+    tracker = DegradationTracker()
+    for i, ((_, row), (_, exp)) in enumerate(zip(df.iterrows(), expected.iterrows())):
+        metrics = tracker.update("driver", row["LapTime_seconds"], stint=stints[i], excluded=excluded[i])
+        for col in DEGRADATION_COLUMNS:
+            same = metrics[col] == exp[col] or (np.isnan(metrics[col]) and np.isnan(exp[col]))
+            assert same, f"Lap {row['LapNumber']}: {col} differs"
+    print(f"✅ {csv_path}: streaming updates identical")
+
+
+def check_exclusions(csv_path):
+    df = _clean_race_data(pd.read_csv(csv_path).rename(columns=STORE_COLUMN_MAP))
+    # Flag two green-flag laps as if they ran behind the safety car
+    sc_laps = df["LapNumber"].isin([5, 6])
+    result = calculate_degradation(df.assign(exclude_from_fit=sc_laps))
+
+    # Out-laps start a new stint; in-laps are the laps before them
+    out_laps = (df["Compound"].ne(df["Compound"].shift()) | df["TyreLife"].le(df["TyreLife"].shift())) & (df.index > 0)
+    pit_laps = out_laps | out_laps.shift(-1, fill_value=False)
+    skipped = result["degradation"].isna()
+    assert skipped[pit_laps | sc_laps].all(), "Pit or SC lap kept in the metrics"
+    assert not skipped[~(pit_laps | sc_laps)].any(), "Clean lap left out of the metrics"
+
+    # Clean laps are compared with the previous clean lap of the same stint
+    lap7 = result.loc[result["LapNumber"] == 7].iloc[0]
+    lap4 = result.loc[result["LapNumber"] == 4].iloc[0]
+    assert lap7["degradation"] == lap7["LapTime_seconds"] - lap4["LapTime_seconds"]
+    assert result["degradation"].abs().max() < 5, "Pit stop still shows up as a lap-to-lap jump"
+    print(f"✅ {csv_path}: {int(pit_laps.sum())} pit and {int(sc_laps.sum())} SC laps excluded")
+
+
+def main():
+    csv_path = os.path.join("data", "bahrain_2024_hamilton.csv")
+    check_batch(csv_path)
+    check_streaming(csv_path)
+    check_exclusions(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,18 @@ the `google-generativeai` Python package.
 
 What it does:
 1. Loads GEMINI_API_KEY from a .env file
-2. Configures the google.generativeai client
-3. Initializes a Gemini Pro model (identifier used: "gemini-2.5-flash")
-4. Sends a short test prompt and prints the result
+2. Sends a short test prompt through the process-wide scheduler
+   (modules/gemini_scheduler.py), which runs the shared Gemini client
+   (modules/gemini_client.py) on its persistent event loop
+3. Uses the model identifier "gemini-2.5-flash"
+4. Sends the prompt twice (the second call reuses the cached model handle)
+   and prints the result
 5. Handles missing API key and runtime errors with clear messages
+
+The client's provider applies, so the call can be recorded to or replayed
+from a cassette (see modules/cassette.py):
+    F1_GEMINI_PROVIDER=record python test/test_gemini.py
+    F1_GEMINI_PROVIDER=replay F1_CASSETTE_LATENCY=zero python test/test_gemini.py
 """
 
 import os
@@ -33,23 +41,20 @@ except Exception as e:
 # Load .env into environment
 load_dotenv()
 
+from modules.gemini_scheduler import default_scheduler  # noqa: E402
+
 def main():
     # 1) Get API key from environment variable
     api_key = os.getenv("GEMINI_API_KEY")
 
-    # 2) Handle missing API key case
-    if not api_key:
+    # 2) Handle missing API key case (replaying a cassette needs no key)
+    uses_api = os.getenv("F1_GEMINI_PROVIDER", "gemini") in ("gemini", "record")
+    if uses_api and not api_key:
         print("ERROR: GEMINI_API_KEY not found in environment.")
         print("Please create a .env file with a line like:\n    GEMINI_API_KEY=your_google_gemini_api_key_here")
         sys.exit(1)
 
-    # 3) Configure the google.generativeai client with your key
-    try:
-        genai.configure(api_key=api_key)
-    except Exception as e:
-        print("ERROR: Failed to configure google.generativeai with the provided API key.")
-        print("Exception message:", str(e))
-        sys.exit(1)
+    # 3) The shared client configures google.generativeai with your key on first use
 
     # 4) Prepare the prompt
     prompt = "Explain F1 tire degradation in 2 sentences"
@@ -60,24 +65,15 @@ def main():
     model_name = "gemini-2.5-flash"
 
     try:
-        # Some SDK versions provide a GenerativeModel interface (model.generate_content)
-        # If your version uses another API surface, adapt accordingly.
-        model = genai.GenerativeModel(model_name)
-
-        # Generate content from the model
-        # Using .generate_content() as a commonly used method in some SDK releases.
-        response = model.generate_content(prompt)
-
-        # response may have different structure depending on SDK version;
-        # attempt to print the most common attributes.
-        if hasattr(response, "text"):
-            # Many SDKs expose the text as response.text
-            print("\n--- Gemini response (text) ---\n")
-            print(response.text)
-        else:
-            # Otherwise, print the whole response object for debugging
-            print("\n--- Gemini response (raw) ---\n")
-            print(response)
+        # Generate content through the scheduler (active provider: gemini / standin /
+        # record / replay). Every call runs on the scheduler's one event loop, so the
+        # cached model handle is reused safely by the second call.
+        scheduler = default_scheduler()
+        text = scheduler.generate(prompt, model_name)
+        scheduler.generate(prompt + " (again)", model_name)
+
+        print("\n--- Gemini response (text) ---\n")
+        print(text)
 
     except Exception as e:
         print("ERROR: A problem occurred while calling the Gemini model.")
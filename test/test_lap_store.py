@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+test_lap_store.py
+
+Tests:
+1. import_csv() takes the partition keys from <event>_<season>_<driver>.csv,
+   including multi-word events and last names written with underscores
+   (abu_dhabi_2024_de_vries.csv, as download_all_data.driver_keys names them)
+2. The imported laps read back from the store under those keys
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+from modules import lap_store
+
+CSV_PATH = os.path.join("data", "bahrain_2024_hamilton.csv")
+
+CASES = [
+    ("bahrain_2024_hamilton.csv", "bahrain", "hamilton"),
+    ("abu_dhabi_2024_de_vries.csv", "abu_dhabi", "de_vries"),
+]
+
+
+def main():
+    failures = 0
+    tmp = tempfile.mkdtemp()
+    try:
+        store_dir = os.path.join(tmp, "store")
+        for name, event, driver in CASES:
+            path = os.path.join(tmp, name)
+            shutil.copyfile(CSV_PATH, path)
+            written = lap_store.import_csv(path, store_dir=store_dir)
+            laps = lap_store.read_laps(season=2024, event=event, driver=driver, store_dir=store_dir) \
+                if written else None
+            ok = written is not None and laps is not None and len(laps) > 0
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {name} → event={event}, driver={driver}: "
+                  f"{0 if laps is None else len(laps)} laps")
+    finally:
+        shutil.rmtree(tmp)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
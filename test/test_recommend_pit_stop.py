@@ -27,3 +27,10 @@ for th in thresholds:
     print("Pit window:", result["window"])
     print("Estimated time lost if no pit:", result["time_lost"], "s")
     print("Reasoning:", result["reasoning"])
+
+# A single prediction (the first lap of a streamed answer) must not fail
+result = recommend_pit_stop(sample_predictions[:1], threshold=2.0)
+assert result["recommended_lap"] == 16 and result["window"] == (16, 16), result
+print("\n--- Single prediction ---")
+print("Recommended lap:", result["recommended_lap"])
+print("Pit window:", result["window"])